@@ -0,0 +1,74 @@
+"""
+共享异步 HTTP 客户端
+基于 aiohttp，每个事件循环一个连接池，供 asyncio 下载引擎使用；默认 Cookie 与同步客户端共用
+"""
+import asyncio
+import urllib.parse
+import weakref
+import aiohttp
+from typing import Dict, Optional, Tuple
+from api.http_client import DEFAULT_HEADERS, HOST_POOL_SIZES, api_base_netloc, get_client
+
+ASYNC_CONNECTION_LIMIT = 256  # 单个事件循环的最大连接数
+
+
+class AsyncHttpClient:
+    """异步 HTTP 客户端，按主机限制并发，带默认请求头，发往网易云接口主机的请求携带同步客户端的默认 Cookie"""
+
+    def __init__(self, pool_sizes: Optional[Dict[str, int]] = None,
+                 headers: Optional[Dict[str, str]] = None,
+                 limit: int = ASYNC_CONNECTION_LIMIT):
+        self.session = aiohttp.ClientSession(
+            connector=aiohttp.TCPConnector(limit=limit),
+            headers=headers or DEFAULT_HEADERS,
+            # 不保存服务端下发的 Cookie，与同步客户端保持一致
+            cookie_jar=aiohttp.DummyCookieJar()
+        )
+        self.host_semaphores: Dict[str, asyncio.Semaphore] = {
+            host: asyncio.Semaphore(size) for host, size in (pool_sizes or HOST_POOL_SIZES).items()
+        }
+        if api_base_netloc():
+            self.host_semaphores[api_base_netloc()] = asyncio.Semaphore(max(HOST_POOL_SIZES.values()))
+
+    async def fetch(self, method: str, url: str, headers: Optional[Dict[str, str]] = None,
+                    cookies: Optional[Dict[str, str]] = None, timeout: float = 10,
+                    **kwargs) -> Tuple[aiohttp.ClientResponse, bytes]:
+        """发送请求并读取完整响应体，返回 (响应, 响应体)，由调用方检查状态码"""
+        semaphore = self.host_semaphores.get(urllib.parse.urlparse(url).netloc)
+        if semaphore is not None:
+            await semaphore.acquire()
+        try:
+            async with self.session.request(method, url, headers=headers, cookies=get_client().cookies_for(url, cookies),
+                                            timeout=aiohttp.ClientTimeout(total=timeout), **kwargs) as response:
+                return response, await response.read()
+        finally:
+            if semaphore is not None:
+                semaphore.release()
+
+    def stream(self, url: str, timeout: float = 10, **kwargs):
+        """以流式方式发起GET请求，返回 aiohttp 响应上下文，timeout 为连接和两次读取之间的超时"""
+        return self.session.get(url, timeout=aiohttp.ClientTimeout(sock_connect=timeout, sock_read=timeout), **kwargs)
+
+    async def close(self):
+        """关闭所有连接"""
+        await self.session.close()
+
+
+_clients: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, AsyncHttpClient]" = weakref.WeakKeyDictionary()
+
+
+def get_async_client() -> AsyncHttpClient:
+    """获取当前事件循环共享的异步 HTTP 客户端"""
+    loop = asyncio.get_running_loop()
+    client = _clients.get(loop)
+    if client is None:
+        client = AsyncHttpClient()
+        _clients[loop] = client
+    return client
+
+
+async def close_async_client():
+    """关闭当前事件循环的共享客户端"""
+    client = _clients.pop(asyncio.get_running_loop(), None)
+    if client is not None:
+        await client.close()
@@ -0,0 +1,207 @@
+"""
+网易云音乐 API 函数 - asyncio 版本
+接口与 api.netease_api 一一对应，供异步下载引擎使用；加密、请求参数和结果解析与同步版本共用
+"""
+import asyncio
+import json
+import logging
+import time
+import aiohttp
+from typing import Dict, Any, List, Tuple
+from api.async_http_client import get_async_client
+from api.http_client import interface_url, web_url
+from api.rate_limiter import (
+    get_rate_limiter, RESULT_OK, RESULT_THROTTLED, RESULT_ERROR, THROTTLE_STATUS, THROTTLE_CODES
+)
+from managers.song_cache import get_song_cache
+from managers.playlist_snapshot import get_playlist_snapshots
+from api.netease_api import (
+    PLAYER_URL_PATH, URL_BATCH_SIZE, SONG_DETAIL_PATH, DETAIL_BATCH_SIZE, DETAIL_MAX_WORKERS,
+    DETAIL_MAX_RETRIES, LYRIC_PATH, PLAYLIST_DETAIL_PATH, PLAYLIST_HEADERS,
+    _eapi_params, _url_payload, parse_url_item, _lyric_data, _build_track, _playlist_header
+)
+
+# 网络请求可能抛出的异常
+REQUEST_ERRORS = (aiohttp.ClientError, asyncio.TimeoutError)
+
+
+def _parse_json(body: bytes) -> Any:
+    """解析响应 JSON，不是 JSON 时返回 None"""
+    try:
+        return json.loads(body)
+    except ValueError:
+        return None
+
+
+async def _json_body(response: aiohttp.ClientResponse, body: Any) -> Any:
+    """返回 _limited_post 已解析的 JSON；响应不是 JSON 时抛出 ValueError"""
+    return body if body is not None else await response.json(content_type=None)
+
+
+async def _limited_post(url: str, **kwargs) -> Tuple[aiohttp.ClientResponse, Any]:
+    """
+    经自适应限速器发送POST请求，并把响应状态反馈给限速器
+    返回 (响应, 解析后的 JSON)，响应只解析一次，不是 JSON 时为 None
+    """
+    limiter = get_rate_limiter()
+    start = await limiter.acquire_async()
+    result = RESULT_ERROR
+    try:
+        response, raw = await get_async_client().fetch('POST', url, **kwargs)
+        body = _parse_json(raw)
+        code = body.get('code') if isinstance(body, dict) else None
+        throttled = response.status >= 500 or response.status in THROTTLE_STATUS or code in THROTTLE_CODES
+        result = RESULT_THROTTLED if throttled else RESULT_OK
+        return response, body
+    except asyncio.TimeoutError:
+        result = RESULT_THROTTLED
+        raise
+    finally:
+        limiter.release(start, result)
+
+
+async def post(url: str, params: str) -> Dict[str, Any]:
+    """发送POST请求并返回解析后的 JSON，用户 Cookie 由共享客户端的默认 Cookie 携带"""
+    headers = {'Referer': ''}
+    cookies = {'os': 'pc', 'appver': '', 'osver': '', 'deviceId': 'pyncm!'}
+    try:
+        response, body = await _limited_post(url, headers=headers, cookies=cookies, data={"params": params})
+        response.raise_for_status()
+        return await _json_body(response, body)
+    except REQUEST_ERRORS as e:
+        logging.error(f"POST 请求失败：{url}，错误：{str(e)}")
+        raise
+
+
+async def url_v1(id: str, level: str) -> Dict[str, Any]:
+    """获取歌曲下载链接"""
+    params = _eapi_params(PLAYER_URL_PATH, _url_payload([id], level))
+    return await post(interface_url(PLAYER_URL_PATH), params)
+
+
+async def url_v1_batch(ids: List[str], level: str, batch_size: int = URL_BATCH_SIZE) -> Dict[str, Dict[str, Any]]:
+    """
+    批量获取歌曲下载链接，各分片并发请求
+    返回: {歌曲ID: {'url', 'size', 'md5', 'type', 'expi', 'expires_at'}}
+    """
+    async def fetch_batch(batch_ids: List[str]) -> List[Dict[str, Any]]:
+        params = _eapi_params(PLAYER_URL_PATH, _url_payload(batch_ids, level))
+        return (await post(interface_url(PLAYER_URL_PATH), params)).get('data') or []
+
+    batches = [[str(sid) for sid in ids[i:i+batch_size]] for i in range(0, len(ids), batch_size)]
+    now = time.time()
+    result: Dict[str, Dict[str, Any]] = {}
+    for items in await asyncio.gather(*(fetch_batch(batch) for batch in batches)):
+        for item in items:
+            result[str(item['id'])] = parse_url_item(item, now)
+    return result
+
+
+async def name_v1(id: str) -> Dict[str, Any]:
+    """获取歌曲详细信息"""
+    data = {'c': json.dumps([{"id": id, "v": 0}])}
+    try:
+        response, body = await _limited_post(interface_url(SONG_DETAIL_PATH), data=data, timeout=5)
+        response.raise_for_status()
+        return await _json_body(response, body)
+    except REQUEST_ERRORS as e:
+        logging.error(f"获取歌曲信息失败：{id}，错误：{str(e)}")
+        raise
+
+
+async def lyric_v1(id: str) -> Dict[str, Any]:
+    """获取歌词"""
+    try:
+        response, body = await _limited_post(interface_url(LYRIC_PATH), data=_lyric_data(id), timeout=5)
+        response.raise_for_status()
+        return await _json_body(response, body)
+    except REQUEST_ERRORS as e:
+        logging.error(f"获取歌词失败：{id}，错误：{str(e)}")
+        raise
+
+
+async def _fetch_song_details(batch_ids: List[str], headers: Dict[str, str]) -> List[Dict[str, Any]]:
+    """获取一批歌曲详情，失败时按退避间隔重试"""
+    song_data = {'c': json.dumps([{'id': int(sid), 'v': 0} for sid in batch_ids])}
+    for attempt in range(DETAIL_MAX_RETRIES + 1):
+        try:
+            response, body = await _limited_post(interface_url(SONG_DETAIL_PATH), data=song_data, headers=headers)
+            response.raise_for_status()
+            return (await _json_body(response, body)).get('songs', [])
+        except REQUEST_ERRORS + (ValueError,) as e:
+            if attempt == DETAIL_MAX_RETRIES:
+                raise
+            logging.warning(f"获取歌曲详情失败，第 {attempt + 1} 次重试：{str(e)}")
+            await asyncio.sleep(2 ** attempt)
+
+
+async def _cached_song_details(batch_ids: List[str], headers: Dict[str, str]) -> List[Dict[str, Any]]:
+    """获取一批歌曲详情，只请求缓存中没有的歌曲，并把结果写回缓存"""
+    cache = get_song_cache()
+    cached = cache.get_many(batch_ids)
+    missing_ids = [sid for sid in batch_ids if sid not in cached]
+    if not missing_ids:
+        return list(cached.values())
+    fetched = await _fetch_song_details(missing_ids, headers)
+    cache.put_many(fetched)
+    return list(cached.values()) + fetched
+
+
+async def playlist_detail(playlist_id: str, incremental: bool = True) -> Dict[str, Any]:
+    """获取歌单详情，playlist 中的 added/removed 为相对上次解析新增和移除的歌曲ID"""
+    try:
+        response, body = await _limited_post(web_url(PLAYLIST_DETAIL_PATH), data={'id': playlist_id},
+                                             headers=PLAYLIST_HEADERS)
+        response.raise_for_status()
+        result = await _json_body(response, body)
+    except REQUEST_ERRORS as e:
+        logging.error(f"歌单解析失败：{playlist_id}，错误：{str(e)}")
+        return {'status': 500, 'msg': str(e)}
+    if result.get('code') != 200:
+        return {'status': result.get('code'), 'msg': '歌单解析失败'}
+
+    playlist = result.get('playlist', {})
+    track_ids = [str(t['id']) for t in playlist.get('trackIds', [])]
+    header, known, known_since = _playlist_header(playlist_id, playlist, track_ids, incremental)
+    info = {
+        'status': 200,
+        'playlist': {
+            'id': header['id'],
+            'name': header['name'],
+            'tracks': [],
+            'missing': [],  # 多次重试后仍获取失败的歌曲ID
+            'added': header['added'],
+            'removed': header['removed']
+        }
+    }
+    # 只为快照中没有的歌曲请求详情
+    fetch_ids = [sid for sid in track_ids if sid not in known]
+    batches = [fetch_ids[i:i+DETAIL_BATCH_SIZE] for i in range(0, len(fetch_ids), DETAIL_BATCH_SIZE)]
+    semaphore = asyncio.Semaphore(DETAIL_MAX_WORKERS)
+
+    async def fetch_batch(batch: List[str]) -> List[Dict[str, Any]]:
+        async with semaphore:
+            return await _cached_song_details(batch, PLAYLIST_HEADERS)
+
+    # 单批失败不影响已成功的批次，结果按 trackIds 原始顺序输出
+    fetched: Dict[str, Dict[str, Any]] = {}
+    failed = set()
+    results = await asyncio.gather(*(fetch_batch(batch) for batch in batches), return_exceptions=True)
+    for batch, songs in zip(batches, results):
+        if isinstance(songs, BaseException):
+            logging.error(f"歌曲详情批次获取失败（{len(batch)} 首）：{str(songs)}")
+            failed.update(batch)
+            continue
+        fetched.update((str(song['id']), song) for song in songs)
+
+    for sid in track_ids:
+        if sid in known:
+            info['playlist']['tracks'].append(known[sid])
+        elif sid in fetched:
+            info['playlist']['tracks'].append(_build_track(fetched[sid]))
+        elif sid in failed:
+            info['playlist']['missing'].append(sid)
+    # 获取失败的歌曲不写入快照，下次解析时作为新增歌曲重新获取
+    get_playlist_snapshots().save(playlist_id, header['name'], playlist.get('trackUpdateTime'),
+                                  info['playlist']['tracks'], known_since)
+    return info
@@ -0,0 +1,140 @@
+"""
+共享 HTTP 客户端
+所有模块通过同一个连接池访问网易云接口，复用 TCP/TLS 连接
+"""
+import os
+import socket
+import threading
+import urllib.parse
+import requests
+from http.cookiejar import DefaultCookiePolicy
+from typing import Dict, Optional
+from requests.adapters import HTTPAdapter, Retry
+
+DEFAULT_HEADERS = {
+    'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; WOW64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.164 NeteaseMusicDesktop/2.10.2.200154',
+}
+
+# 各主机的连接池大小，未列出的主机（如 CDN）使用默认连接池
+HOST_POOL_SIZES = {
+    'interface3.music.163.com': 16,
+    'music.163.com': 8,
+}
+DEFAULT_POOL_SIZE = 16
+
+# 接口地址，设置 DOWNLIST_API_BASE 环境变量或调用 set_api_base_url 可改用本地替身服务器
+INTERFACE_BASE_URL = 'https://interface3.music.163.com'
+WEB_BASE_URL = 'https://music.163.com'
+API_BASE_ENV = 'DOWNLIST_API_BASE'
+_api_base_url: Optional[str] = os.environ.get(API_BASE_ENV) or None
+
+
+def interface_url(path: str) -> str:
+    """interface3 主机上的接口地址"""
+    return (_api_base_url or INTERFACE_BASE_URL) + path
+
+
+def web_url(path: str) -> str:
+    """music.163.com 主机上的接口地址"""
+    return (_api_base_url or WEB_BASE_URL) + path
+
+
+def api_base_netloc() -> Optional[str]:
+    """自定义接口地址的主机（含端口），未设置时返回 None"""
+    return urllib.parse.urlparse(_api_base_url).netloc if _api_base_url else None
+
+
+class HttpClient:
+    """线程安全的 HTTP 客户端，带长连接、按主机划分的连接池、默认请求头和 Cookie"""
+
+    def __init__(self, pool_sizes: Optional[Dict[str, int]] = None,
+                 headers: Optional[Dict[str, str]] = None,
+                 cookies: Optional[Dict[str, str]] = None):
+        self.session = requests.Session()
+        self.session.headers.update(headers or DEFAULT_HEADERS)
+        # 不在会话中保存服务端下发的 Cookie，避免不同账号/请求之间串用
+        self.session.cookies.set_policy(DefaultCookiePolicy(allowed_domains=[]))
+        self.default_cookies: Dict[str, str] = dict(cookies or {})
+        self.cookie_hosts = set()
+        self.lock = threading.Lock()
+
+        # CDN 等其他主机：GET 请求遇到限流和服务端错误时自动重试
+        retries = Retry(total=3, backoff_factor=1, status_forcelist=[429, 500, 502, 503, 504])
+        for prefix in ('http://', 'https://'):
+            self.session.mount(prefix, HTTPAdapter(pool_maxsize=DEFAULT_POOL_SIZE, max_retries=retries))
+
+        for host, size in (pool_sizes or HOST_POOL_SIZES).items():
+            self.mount_host(host, size)
+        if api_base_netloc():
+            self.mount_host(api_base_netloc(), max(HOST_POOL_SIZES.values()))
+
+    def mount_host(self, host: str, pool_size: int):
+        """为指定主机（可带端口）设置独立连接池，默认 Cookie 只发往这些主机"""
+        self.cookie_hosts.add(host)
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size)
+        for scheme in ('http://', 'https://'):
+            self.session.mount(f"{scheme}{host}/", adapter)
+
+    def set_default_cookies(self, cookies: Dict[str, str]):
+        """设置发往网易云接口主机的请求默认携带的 Cookie"""
+        with self.lock:
+            self.default_cookies = dict(cookies)
+
+    def cookies_for(self, url: str, cookies: Optional[Dict[str, str]] = None) -> Dict[str, str]:
+        """发往 url 的 Cookie：网易云接口主机合并默认 Cookie 与本次请求的 Cookie"""
+        merged_cookies = dict(cookies or {})
+        if urllib.parse.urlparse(url).netloc in self.cookie_hosts:
+            with self.lock:
+                merged_cookies = {**self.default_cookies, **merged_cookies}
+        return merged_cookies
+
+    def request(self, method: str, url: str, headers: Optional[Dict[str, str]] = None,
+                cookies: Optional[Dict[str, str]] = None, **kwargs) -> requests.Response:
+        """发送请求，合并默认 Cookie 与本次请求的 Cookie"""
+        return self.session.request(method, url, headers=headers, cookies=self.cookies_for(url, cookies), **kwargs)
+
+    def get(self, url: str, **kwargs) -> requests.Response:
+        """发送GET请求"""
+        return self.request('GET', url, **kwargs)
+
+    def post(self, url: str, **kwargs) -> requests.Response:
+        """发送POST请求"""
+        return self.request('POST', url, **kwargs)
+
+    def close(self):
+        """关闭所有连接"""
+        self.session.close()
+
+
+def abort_response(response: requests.Response):
+    """从其他线程中断流式响应：关闭底层 socket，使阻塞中的读取立即返回"""
+    connection = getattr(response.raw, 'connection', None)
+    sock = getattr(connection, 'sock', None)
+    if sock is None:
+        return
+    try:
+        sock.shutdown(socket.SHUT_RDWR)
+    except OSError:
+        pass
+
+
+_client: Optional[HttpClient] = None
+_client_lock = threading.Lock()
+
+
+def set_api_base_url(base_url: Optional[str]):
+    """把所有网易云接口请求改发到 base_url（如 http://127.0.0.1:8163），传入 None 恢复官方地址"""
+    global _api_base_url
+    _api_base_url = base_url.rstrip('/') if base_url else None
+    if _client is not None and api_base_netloc():
+        _client.mount_host(api_base_netloc(), max(HOST_POOL_SIZES.values()))
+
+
+def get_client() -> HttpClient:
+    """获取全局共享的 HTTP 客户端"""
+    global _client
+    if _client is None:
+        with _client_lock:
+            if _client is None:
+                _client = HttpClient()
+    return _client
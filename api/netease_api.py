@@ -3,26 +3,79 @@
 """
 import json
 import logging
+import time
 import requests
 import urllib.parse
+from concurrent.futures import ThreadPoolExecutor
 from hashlib import md5
 from random import randrange
-from typing import Dict, Any
+from typing import Dict, Any, Iterator, List, Optional, Tuple
 from cryptography.hazmat.primitives import padding
 from cryptography.hazmat.primitives.ciphers import Cipher, algorithms, modes
+from api.http_client import get_client, interface_url, web_url
+from api.rate_limiter import (
+    get_rate_limiter, RESULT_OK, RESULT_THROTTLED, RESULT_ERROR, THROTTLE_STATUS, THROTTLE_CODES
+)
+from managers.song_cache import get_song_cache
+from managers.playlist_snapshot import get_playlist_snapshots
 
+EAPI_AES_KEY = b"e82ckenh8dichen8"
+PLAYER_URL_PATH = "/eapi/song/enhance/player/url/v1"
+URL_BATCH_SIZE = 200  # player/url/v1 单次请求的歌曲数上限
+SONG_DETAIL_PATH = "/api/v3/song/detail"
+DETAIL_BATCH_SIZE = 100  # v3/song/detail 单次请求的歌曲数
+DETAIL_MAX_WORKERS = 4  # 并发获取歌曲详情的线程数
+DETAIL_MAX_RETRIES = 2
+TRACK_QUALITY_FIELDS = ("l", "h", "sq", "hr")  # 歌曲详情中各音质的文件信息字段，与 core.scheduler.QUALITY_DETAIL_FIELDS 对应
+LYRIC_PATH = "/api/song/lyric"
+PLAYLIST_DETAIL_PATH = "/api/v6/playlist/detail"
+PLAYLIST_HEADERS = {'User-Agent': 'Mozilla/5.0', 'Referer': 'https://music.163.com/'}
 
-def post(url: str, params: str, cookies: Dict[str, str]) -> str:
-    """发送POST请求"""
-    headers = {
-        'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; WOW64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.164 NeteaseMusicDesktop/2.10.2.200154',
-        'Referer': '',
-    }
-    cookies = {'os': 'pc', 'appver': '', 'osver': '', 'deviceId': 'pyncm!', **cookies}
+
+def _parse_json(response: requests.Response) -> Any:
+    """解析响应 JSON，不是 JSON 时返回 None"""
     try:
-        response = requests.post(url, headers=headers, cookies=cookies, data={"params": params}, timeout=10)
+        return response.json()
+    except ValueError:
+        return None
+
+
+def _json_body(response: requests.Response, body: Any) -> Any:
+    """返回 _limited_post 已解析的 JSON；响应不是 JSON 时与 response.json() 一样抛出异常"""
+    return body if body is not None else response.json()
+
+
+def _limited_post(url: str, **kwargs) -> Tuple[requests.Response, Any]:
+    """
+    经自适应限速器发送POST请求，并把响应状态反馈给限速器
+    返回 (响应, 解析后的 JSON)，响应只解析一次，不是 JSON 时为 None
+    """
+    limiter = get_rate_limiter()
+    start = limiter.acquire()
+    result = RESULT_ERROR
+    try:
+        response = get_client().post(url, **kwargs)
+        body = _parse_json(response)
+        code = body.get('code') if isinstance(body, dict) else None
+        throttled = (response.status_code >= 500 or response.status_code in THROTTLE_STATUS
+                     or code in THROTTLE_CODES)
+        result = RESULT_THROTTLED if throttled else RESULT_OK
+        return response, body
+    except requests.Timeout:
+        result = RESULT_THROTTLED
+        raise
+    finally:
+        limiter.release(start, result)
+
+
+def post(url: str, params: str) -> Dict[str, Any]:
+    """发送POST请求并返回解析后的 JSON，用户 Cookie 由共享客户端的默认 Cookie 携带"""
+    headers = {'Referer': ''}
+    cookies = {'os': 'pc', 'appver': '', 'osver': '', 'deviceId': 'pyncm!'}
+    try:
+        response, body = _limited_post(url, headers=headers, cookies=cookies, data={"params": params}, timeout=10)
         response.raise_for_status()
-        return response.text
+        return _json_body(response, body)
     except requests.RequestException as e:
         logging.error(f"POST 请求失败：{url}，错误：{str(e)}")
         raise
@@ -33,88 +86,249 @@ def hash_hex_digest(text: str) -> str:
     return ''.join(hex(d)[2:].zfill(2) for d in md5(text.encode('utf-8')).digest())
 
 
-def url_v1(id: str, level: str, cookies: Dict[str, str]) -> Dict[str, Any]:
-    """获取歌曲下载链接"""
-    url = "https://interface3.music.163.com/eapi/song/enhance/player/url/v1"
-    AES_KEY = b"e82ckenh8dichen8"
-    config = {"os": "pc", "appver": "", "osver": "", "deviceId": "pyncm!", "requestId": str(randrange(20000000, 30000000))}
-    payload = {'ids': [id], 'level': level, 'encodeType': 'flac', 'header': json.dumps(config)}
-    if level == 'sky':
-        payload['immerseType'] = 'c51'
+def _eapi_params(url: str, payload: Dict[str, Any]) -> str:
+    """按 eapi 规则加密请求参数"""
     url2 = urllib.parse.urlparse(url).path.replace("/eapi/", "/api/")
     digest = hash_hex_digest(f"nobody{url2}use{json.dumps(payload)}md5forencrypt")
     params = f"{url2}-36cd479b6b5-{json.dumps(payload)}-36cd479b6b5-{digest}"
-    padder = padding.PKCS7(algorithms.AES(AES_KEY).block_size).padder()
+    padder = padding.PKCS7(algorithms.AES(EAPI_AES_KEY).block_size).padder()
     padded_data = padder.update(params.encode()) + padder.finalize()
-    cipher = Cipher(algorithms.AES(AES_KEY), modes.ECB())
+    cipher = Cipher(algorithms.AES(EAPI_AES_KEY), modes.ECB())
     encryptor = cipher.encryptor()
     enc = encryptor.update(padded_data) + encryptor.finalize()
-    params = ''.join(hex(d)[2:].zfill(2) for d in enc)
-    return json.loads(post(url, params, cookies))
+    return ''.join(hex(d)[2:].zfill(2) for d in enc)
+
+
+def _url_payload(ids: List[str], level: str) -> Dict[str, Any]:
+    """构建 player/url/v1 请求体"""
+    config = {"os": "pc", "appver": "", "osver": "", "deviceId": "pyncm!", "requestId": str(randrange(20000000, 30000000))}
+    payload = {'ids': ids, 'level': level, 'encodeType': 'flac', 'header': json.dumps(config)}
+    if level == 'sky':
+        payload['immerseType'] = 'c51'
+    return payload
+
+
+def url_v1(id: str, level: str) -> Dict[str, Any]:
+    """获取歌曲下载链接"""
+    params = _eapi_params(PLAYER_URL_PATH, _url_payload([id], level))
+    return post(interface_url(PLAYER_URL_PATH), params)
+
+
+def url_v1_batch(ids: List[str], level: str, batch_size: int = URL_BATCH_SIZE) -> Dict[str, Dict[str, Any]]:
+    """
+    批量获取歌曲下载链接
+    返回: {歌曲ID: {'url', 'size', 'md5', 'type', 'expi', 'expires_at'}}
+    """
+    result: Dict[str, Dict[str, Any]] = {}
+    for i in range(0, len(ids), batch_size):
+        batch_ids = [str(sid) for sid in ids[i:i+batch_size]]
+        params = _eapi_params(PLAYER_URL_PATH, _url_payload(batch_ids, level))
+        now = time.time()
+        for item in post(interface_url(PLAYER_URL_PATH), params).get('data') or []:
+            result[str(item['id'])] = parse_url_item(item, now)
+    return result
+
+
+def parse_url_item(item: Dict[str, Any], now: float) -> Dict[str, Any]:
+    """提取 player/url/v1 返回项中的链接信息"""
+    expi = item.get('expi') or 0
+    return {
+        'url': item.get('url'),
+        'size': item.get('size') or 0,
+        'md5': item.get('md5') or '',
+        'type': item.get('type') or '',
+        'expi': expi,
+        'expires_at': now + expi if expi else 0
+    }
 
 
 def name_v1(id: str) -> Dict[str, Any]:
     """获取歌曲详细信息"""
-    url = "https://interface3.music.163.com/api/v3/song/detail"
     data = {'c': json.dumps([{"id": id, "v": 0}])}
     try:
-        response = requests.post(url, data=data, timeout=5)
+        response, body = _limited_post(interface_url(SONG_DETAIL_PATH), data=data, timeout=5)
         response.raise_for_status()
-        return response.json()
+        return _json_body(response, body)
     except requests.RequestException as e:
         logging.error(f"获取歌曲信息失败：{id}，错误：{str(e)}")
         raise
 
 
-def lyric_v1(id: str, cookies: Dict[str, str]) -> Dict[str, Any]:
+def _lyric_data(id: str) -> Dict[str, str]:
+    """构建歌词请求参数"""
+    return {'id': id, 'cp': 'false', 'tv': '0', 'lv': '0', 'rv': '0', 'kv': '0', 'yv': '0', 'ytv': '0', 'yrv': '0'}
+
+
+def lyric_v1(id: str) -> Dict[str, Any]:
     """获取歌词"""
-    url = "https://interface3.music.163.com/api/song/lyric"
-    data = {'id': id, 'cp': 'false', 'tv': '0', 'lv': '0', 'rv': '0', 'kv': '0', 'yv': '0', 'ytv': '0', 'yrv': '0'}
+    data = _lyric_data(id)
     try:
-        response = requests.post(url, data=data, cookies=cookies, timeout=5)
+        response, body = _limited_post(interface_url(LYRIC_PATH), data=data, timeout=5)
         response.raise_for_status()
-        return response.json()
+        return _json_body(response, body)
     except requests.RequestException as e:
         logging.error(f"获取歌词失败：{id}，错误：{str(e)}")
         raise
 
 
-def playlist_detail(playlist_id: str, cookies: Dict[str, str]) -> Dict[str, Any]:
-    """获取歌单详情"""
-    url = 'https://music.163.com/api/v6/playlist/detail'
+def _fetch_song_details(batch_ids: List[str], headers: Dict[str, str]) -> List[Dict[str, Any]]:
+    """获取一批歌曲详情，失败时按退避间隔重试"""
+    song_data = {'c': json.dumps([{'id': int(sid), 'v': 0} for sid in batch_ids])}
+    for attempt in range(DETAIL_MAX_RETRIES + 1):
+        try:
+            song_resp, body = _limited_post(interface_url(SONG_DETAIL_PATH), data=song_data, headers=headers,
+                                            timeout=10)
+            song_resp.raise_for_status()
+            return _json_body(song_resp, body).get('songs', [])
+        except (requests.RequestException, ValueError) as e:
+            if attempt == DETAIL_MAX_RETRIES:
+                raise
+            logging.warning(f"获取歌曲详情失败，第 {attempt + 1} 次重试：{str(e)}")
+            time.sleep(2 ** attempt)
+
+
+def _cached_song_details(batch_ids: List[str], headers: Dict[str, str]) -> List[Dict[str, Any]]:
+    """获取一批歌曲详情，只请求缓存中没有的歌曲，并把结果写回缓存"""
+    cache = get_song_cache()
+    cached = cache.get_many(batch_ids)
+    missing_ids = [sid for sid in batch_ids if sid not in cached]
+    if not missing_ids:
+        return list(cached.values())
+    fetched = _fetch_song_details(missing_ids, headers)
+    cache.put_many(fetched)
+    return list(cached.values()) + fetched
+
+
+def _build_track(song: Dict[str, Any]) -> Dict[str, Any]:
+    """将歌曲详情转换为歌单曲目"""
+    track = {
+        'id': song['id'],
+        'name': song['name'],
+        'artists': '/'.join(artist['name'] for artist in song['ar']),
+        'album': song['al']['name'],
+        'picUrl': song['al'].get('picUrl', ''),  # 使用 picUrl，默认为空字符串
+        'dt': song.get('dt', 0)  # 时长（毫秒），短歌优先时用于估算文件大小
+    }
+    # 各音质的文件大小和码率（l/h/sq/hr），短歌优先时优先于按时长估算
+    for field in TRACK_QUALITY_FIELDS:
+        detail = song.get(field)
+        if isinstance(detail, dict) and detail.get('size'):
+            track[field] = {'size': detail['size'], 'br': detail.get('br', 0)}
+    return track
+
+
+def _playlist_header(playlist_id: str, playlist: Dict[str, Any], track_ids: List[str],
+                     incremental: bool) -> Tuple[Dict[str, Any], Dict[str, Dict[str, Any]], Optional[float]]:
+    """
+    对比歌单快照，返回 (歌单信息, 可沿用的快照曲目 {歌曲ID: 曲目}, 沿用曲目的获取时间)
+    歌单信息包含 added/removed（相对上次快照新增和移除的歌曲ID）以及 changed（trackUpdateTime 是否变化）
+    歌单有变化或快照已过期时不沿用快照中的曲目，全部重新读取详情（仍优先使用歌曲详情缓存）
+    """
+    snapshot = get_playlist_snapshots().get(playlist_id) if incremental else None
+    header = {'id': playlist.get('id'), 'name': playlist.get('name'), 'total': len(track_ids),
+              'added': [], 'removed': [], 'changed': True}
+    if snapshot is None:
+        return header, {}, None
+
+    known = {str(track['id']): track for track in snapshot['tracks']}
+    current = set(track_ids)
+    header['added'] = [sid for sid in track_ids if sid not in known]
+    header['removed'] = [sid for sid in known if sid not in current]
+    header['changed'] = snapshot['track_update_time'] != playlist.get('trackUpdateTime')
+    if header['changed'] or snapshot['expired']:
+        # 过期的快照不再使用，完整迭代后重新保存；中途停止时下次解析完整获取
+        get_playlist_snapshots().delete(playlist_id)
+        return header, {}, None
+    return header, known, snapshot['updated_at']
+
+
+def iter_playlist_detail(playlist_id: str, incremental: bool = True) -> Iterator[Dict[str, Any]]:
+    """
+    流式获取歌单详情，按 trackIds 原始顺序逐批产出曲目
+    每批产出: {'status': 200, 'playlist': {'id', 'name', 'total', 'added', 'removed', 'changed'}, 'tracks': [...], 'missing': [...]}
+    歌单本身获取失败时只产出一次: {'status': 错误码, 'msg': 错误信息}
+    incremental 为真时只获取相对上次快照新增歌曲的详情，完整迭代后更新快照
+    """
     data = {'id': playlist_id}
-    headers = {'User-Agent': 'Mozilla/5.0', 'Referer': 'https://music.163.com/'}
     try:
-        response = requests.post(url, data=data, headers=headers, cookies=cookies, timeout=10)
+        response, body = _limited_post(web_url(PLAYLIST_DETAIL_PATH), data=data, headers=PLAYLIST_HEADERS, timeout=10)
         response.raise_for_status()
-        result = response.json()
-        if result.get('code') != 200:
-            return {'status': result.get('code'), 'msg': '歌单解析失败'}
-        playlist = result.get('playlist', {})
-        info = {
-            'status': 200,
-            'playlist': {
-                'id': playlist.get('id'),
-                'name': playlist.get('name'),
-                'tracks': []
-            }
-        }
-        track_ids = [str(t['id']) for t in playlist.get('trackIds', [])]
-        for i in range(0, len(track_ids), 100):
-            batch_ids = track_ids[i:i+100]
-            song_data = {'c': json.dumps([{'id': int(sid), 'v': 0} for sid in batch_ids])}
-            song_resp = requests.post('https://interface3.music.163.com/api/v3/song/detail', 
-                                    data=song_data, headers=headers, cookies=cookies, timeout=10)
-            song_result = song_resp.json()
-            for song in song_result.get('songs', []):
-                info['playlist']['tracks'].append({
-                    'id': song['id'],
-                    'name': song['name'],
-                    'artists': '/'.join(artist['name'] for artist in song['ar']),
-                    'album': song['al']['name'],
-                    'picUrl': song['al'].get('picUrl', '')  # 使用 picUrl，默认为空字符串
-                })
-        return info
+        result = _json_body(response, body)
     except requests.RequestException as e:
         logging.error(f"歌单解析失败：{playlist_id}，错误：{str(e)}")
-        return {'status': 500, 'msg': str(e)}
+        yield {'status': 500, 'msg': str(e)}
+        return
+    if result.get('code') != 200:
+        yield {'status': result.get('code'), 'msg': '歌单解析失败'}
+        return
+
+    playlist = result.get('playlist', {})
+    track_ids = [str(t['id']) for t in playlist.get('trackIds', [])]
+    header, known, known_since = _playlist_header(playlist_id, playlist, track_ids, incremental)
+    batches = [track_ids[i:i+DETAIL_BATCH_SIZE] for i in range(0, len(track_ids), DETAIL_BATCH_SIZE)]
+    if not batches:
+        get_playlist_snapshots().save(playlist_id, header['name'], playlist.get('trackUpdateTime'), [])
+        yield {'status': 200, 'playlist': header, 'tracks': [], 'missing': []}
+        return
+
+    # 只为快照中没有的歌曲请求详情，重新分组以保持每次请求满批
+    fetch_ids = [sid for sid in track_ids if sid not in known]
+    fetch_batches = [fetch_ids[i:i+DETAIL_BATCH_SIZE] for i in range(0, len(fetch_ids), DETAIL_BATCH_SIZE)]
+    pool = ThreadPoolExecutor(max_workers=max(1, min(DETAIL_MAX_WORKERS, len(fetch_batches))))
+    futures = [pool.submit(_cached_song_details, batch, PLAYLIST_HEADERS) for batch in fetch_batches]
+    future_index = {sid: i for i, batch in enumerate(fetch_batches) for sid in batch}
+    fetched: Dict[str, Dict[str, Any]] = {}
+    failed = set()
+    done = set()
+    all_tracks: List[Dict[str, Any]] = []
+    try:
+        # 并发获取各批歌曲详情，按歌单顺序产出，单批失败不影响已成功的批次
+        for batch in batches:
+            for index in sorted({future_index[sid] for sid in batch if sid in future_index} - done):
+                done.add(index)
+                try:
+                    fetched.update((str(song['id']), song) for song in futures[index].result())
+                except (requests.RequestException, ValueError) as e:
+                    logging.error(f"歌曲详情批次获取失败（{len(fetch_batches[index])} 首）：{str(e)}")
+                    failed.update(fetch_batches[index])
+
+            tracks = []
+            for sid in batch:
+                if sid in known:
+                    tracks.append(known[sid])
+                elif sid in fetched:
+                    tracks.append(_build_track(fetched[sid]))
+            all_tracks.extend(tracks)
+            yield {'status': 200, 'playlist': header, 'tracks': tracks, 'missing': [sid for sid in batch if sid in failed]}
+
+        # 获取失败的歌曲不写入快照，下次解析时作为新增歌曲重新获取
+        get_playlist_snapshots().save(playlist_id, header['name'], playlist.get('trackUpdateTime'), all_tracks,
+                                      known_since)
+    finally:
+        # 调用方提前停止迭代时取消尚未开始的批次
+        for future in futures:
+            future.cancel()
+        pool.shutdown(wait=False)
+
+
+def playlist_detail(playlist_id: str, incremental: bool = True) -> Dict[str, Any]:
+    """获取歌单详情，playlist 中的 added/removed 为相对上次解析新增和移除的歌曲ID"""
+    info = None
+    for chunk in iter_playlist_detail(playlist_id, incremental):
+        if chunk['status'] != 200:
+            return chunk
+        if info is None:
+            info = {
+                'status': 200,
+                'playlist': {
+                    'id': chunk['playlist']['id'],
+                    'name': chunk['playlist']['name'],
+                    'tracks': [],
+                    'missing': [],  # 多次重试后仍获取失败的歌曲ID
+                    'added': chunk['playlist']['added'],
+                    'removed': chunk['playlist']['removed']
+                }
+            }
+        info['playlist']['tracks'].extend(chunk['tracks'])
+        info['playlist']['missing'].extend(chunk['missing'])
+    return info
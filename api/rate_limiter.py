@@ -0,0 +1,112 @@
+"""
+自适应限速器
+按 AIMD（加性增、乘性减）规则根据接口的响应码和延迟调整每秒请求数与并发请求数，
+使吞吐量稳定在服务端可承受的上限附近
+"""
+import asyncio
+import logging
+import threading
+import time
+from typing import Optional
+
+# 请求结果
+RESULT_OK = 'ok'
+RESULT_THROTTLED = 'throttled'  # 被限流、服务端过载或超时
+RESULT_ERROR = 'error'  # 与负载无关的失败，不调整速率
+
+# 视为限流的 HTTP 状态码和网易云接口 code，5xx 表示服务端过载，同样视为限流
+THROTTLE_STATUS = {429}
+THROTTLE_CODES = {429, 405, -447, -460, -462}
+
+
+class AdaptiveRateLimiter:
+    """线程安全的 AIMD 限速器，同时支持线程和协程调用"""
+
+    def __init__(self, rate: float = 10.0, min_rate: float = 1.0, max_rate: float = 100.0,
+                 concurrency: float = 8, min_concurrency: int = 1, max_concurrency: int = 32,
+                 increase: float = 1.0, decrease: float = 0.5,
+                 latency_target: float = 2.0, cooldown: float = 1.0):
+        self.rate = rate
+        self.min_rate = min_rate
+        self.max_rate = max_rate
+        self.concurrency = concurrency
+        self.min_concurrency = min_concurrency
+        self.max_concurrency = max_concurrency
+        self.increase = increase  # 持续成功时每秒约增加的请求数
+        self.decrease = decrease  # 限流时的乘性缩减系数
+        self.latency_target = latency_target  # 超过该延迟（秒）视为服务端拥塞
+        self.cooldown = cooldown  # 两次缩减的最小间隔，避免同一波失败连续缩减
+
+        self.slow_start = True  # 首次限流前按乘性增长快速逼近上限
+        self.tokens = 1.0
+        self.in_flight = 0
+        self.last_refill = time.monotonic()
+        self.last_decrease = 0.0
+        self.cond = threading.Condition()
+
+    def _try_acquire_locked(self) -> float:
+        """尝试占用一个令牌和并发名额，成功返回 0，否则返回建议等待的秒数"""
+        now = time.monotonic()
+        self.tokens = min(max(1.0, self.rate), self.tokens + (now - self.last_refill) * self.rate)
+        self.last_refill = now
+        if self.in_flight >= int(self.concurrency):
+            return 0.05
+        if self.tokens < 1:
+            return (1 - self.tokens) / self.rate
+        self.tokens -= 1
+        self.in_flight += 1
+        return 0.0
+
+    def acquire(self) -> float:
+        """阻塞直到允许发出请求，返回开始时间"""
+        with self.cond:
+            wait = self._try_acquire_locked()
+            while wait > 0:
+                self.cond.wait(wait)
+                wait = self._try_acquire_locked()
+        return time.monotonic()
+
+    async def acquire_async(self) -> float:
+        """协程版本的 acquire，等待时不阻塞事件循环"""
+        while True:
+            with self.cond:
+                wait = self._try_acquire_locked()
+            if wait == 0:
+                return time.monotonic()
+            await asyncio.sleep(wait)
+
+    def release(self, start: float, result: str = RESULT_OK):
+        """请求结束，根据结果和延迟调整速率"""
+        latency = time.monotonic() - start
+        with self.cond:
+            self.in_flight -= 1
+            if result == RESULT_THROTTLED or (result == RESULT_OK and latency > self.latency_target):
+                now = time.monotonic()
+                if now - self.last_decrease >= self.cooldown:
+                    self.last_decrease = now
+                    self.slow_start = False
+                    self.rate = max(self.min_rate, self.rate * self.decrease)
+                    self.concurrency = max(self.min_concurrency, self.concurrency * self.decrease)
+                    logging.info(f"接口限流或响应变慢，降低请求速率至 {self.rate:.1f}/s，并发 {int(self.concurrency)}")
+            elif result == RESULT_OK and self.slow_start:
+                # 每个成功请求加一，约每秒翻倍
+                self.rate = min(self.max_rate, self.rate + self.increase)
+                self.concurrency = min(self.max_concurrency, self.concurrency + 1)
+            elif result == RESULT_OK:
+                self.rate = min(self.max_rate, self.rate + self.increase / max(self.rate, 1.0))
+                self.concurrency = min(self.max_concurrency, self.concurrency + 1 / max(self.concurrency, 1.0))
+            self.cond.notify_all()
+
+
+_limiter: Optional[AdaptiveRateLimiter] = None
+_limiter_lock = threading.Lock()
+
+
+def get_rate_limiter() -> AdaptiveRateLimiter:
+    """获取全局共享的接口限速器"""
+    global _limiter
+    if _limiter is None:
+        with _limiter_lock:
+            if _limiter is None:
+                _limiter = AdaptiveRateLimiter()
+    return _limiter
@@ -3,6 +3,7 @@
 """
 import flet as ft
 import logging
+import multiprocessing
 import threading
 from managers.cookie_manager import CookieManager
 from ui.cookie_ui import CookieUI
@@ -90,4 +91,6 @@ def main(page: ft.Page):
 
 
 if __name__ == "__main__":
+    # 打包为 exe 后标签写入进程池（DOWNLIST_METADATA_PROCESSES）的子进程需要由此识别，不再重新启动应用
+    multiprocessing.freeze_support()
     ft.app(target=main)
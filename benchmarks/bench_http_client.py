@@ -0,0 +1,77 @@
+#!/usr/bin/env python3
+"""
+HTTP 客户端基准测试
+在本地替身服务器上比较裸 requests.post 与共享连接池客户端的每秒请求数
+
+用法: python benchmarks/bench_http_client.py [--requests 2000] [--threads 8]
+"""
+import argparse
+import os
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import requests
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from api.http_client import HttpClient  # noqa: E402
+
+RESPONSE_BODY = b'{"code": 200, "songs": []}'
+
+
+class StandInHandler(BaseHTTPRequestHandler):
+    """模拟接口：读取请求体后返回固定 JSON，支持长连接"""
+    protocol_version = 'HTTP/1.1'
+    disable_nagle_algorithm = True
+
+    def do_POST(self):
+        self.rfile.read(int(self.headers.get('Content-Length', 0)))
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(RESPONSE_BODY)))
+        self.end_headers()
+        self.wfile.write(RESPONSE_BODY)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def run(label: str, send, total: int, threads: int) -> float:
+    """并发发送 total 个请求，返回每秒请求数"""
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=threads) as pool:
+        list(pool.map(lambda _: send(), range(total)))
+    elapsed = time.perf_counter() - start
+    rps = total / elapsed
+    print(f"{label:<24} {total} 次请求  耗时 {elapsed:6.2f}s  {rps:8.1f} req/s")
+    return rps
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--requests', type=int, default=2000)
+    parser.add_argument('--threads', type=int, default=8)
+    args = parser.parse_args()
+
+    server = ThreadingHTTPServer(('127.0.0.1', 0), StandInHandler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    netloc = f"127.0.0.1:{server.server_address[1]}"
+    url = f"http://{netloc}/api/v3/song/detail"
+    data = {'c': '[{"id": 1, "v": 0}]'}
+
+    before = run("requests.post (无连接池)", lambda: requests.post(url, data=data, timeout=10).content,
+                 args.requests, args.threads)
+    client = HttpClient(pool_sizes={netloc: args.threads})
+    after = run("HttpClient (长连接)", lambda: client.post(url, data=data, timeout=10).content,
+                args.requests, args.threads)
+    print(f"提升: {after / before:.2f}x")
+
+    client.close()
+    server.shutdown()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,72 @@
+#!/usr/bin/env python3
+"""
+标签写入基准测试
+为一批合成的 FLAC 和 MP3 文件缩放封面并写入标签，比较在线程中执行与交给进程池执行的每秒处理文件数
+
+用法: python benchmarks/bench_metadata.py [--files 200] [--threads 4] [--processes 4]
+"""
+import argparse
+import os
+import shutil
+import sys
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from core import metadata  # noqa: E402
+from tools.fake_netease_server import synth_audio, synth_cover  # noqa: E402
+
+
+def prepare_files(directory: str, count: int):
+    """写入 count 个未打标签的音频文件，FLAC 和 MP3 各占一半"""
+    sources = {ext: synth_audio(1, ext, size) for ext, size in (('flac', 4 * 1024 * 1024), ('mp3', 1024 * 1024))}
+    files = []
+    for i in range(count):
+        ext = 'flac' if i % 2 == 0 else 'mp3'
+        path = os.path.join(directory, f"{i}.{ext}")
+        with open(path, 'wb') as f:
+            f.write(sources[ext])
+        files.append((path, f'.{ext}'))
+    return files
+
+
+def run(files, cover: bytes, threads: int):
+    """用 threads 个线程为所有文件写入标签，返回耗时"""
+    def tag(item):
+        path, ext = item
+        # 每个文件都重新缩放封面，相当于封面缓存未命中
+        cover_data = metadata.resize_cover(cover)
+        metadata.write_metadata(path, '标题', '艺术家', '专辑', cover_data, ext)
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=threads) as executor:
+        list(executor.map(tag, files))
+    return time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--files', type=int, default=200)
+    parser.add_argument('--threads', type=int, default=4)
+    parser.add_argument('--processes', type=int, default=os.cpu_count() or 1)
+    args = parser.parse_args()
+
+    cover = synth_cover(1024)
+    print(f"CPU 核数: {os.cpu_count()}，文件数: {args.files}，封面 {len(cover) // 1024} KB")
+    for label, processes in (("线程内执行", 0), (f"进程池 ({args.processes} 个进程)", args.processes)):
+        metadata.configure_metadata_processes(processes)
+        # 预热：启动子进程
+        metadata.start_metadata_processes()
+        tmp = tempfile.mkdtemp()
+        try:
+            files = prepare_files(tmp, args.files)
+            elapsed = run(files, cover, max(args.threads, processes))
+        finally:
+            shutil.rmtree(tmp, ignore_errors=True)
+        print(f"{label:<20} {elapsed:6.2f} 秒  {args.files / elapsed:8.1f} 文件/秒")
+    metadata.configure_metadata_processes(0)
+
+
+if __name__ == '__main__':
+    main()
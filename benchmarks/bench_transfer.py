@@ -0,0 +1,99 @@
+#!/usr/bin/env python3
+"""
+传输路径基准测试
+在子进程中启动本地替身服务器，比较旧的 iter_content(8192) 逐块写入与复用缓冲区的 readinto 写入，
+输出每传输 1GB 消耗的 CPU 时间（只统计下载进程）
+
+用法: python benchmarks/bench_transfer.py [--size 256MB] [--rounds 3]
+"""
+import argparse
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from api.http_client import get_client  # noqa: E402
+from core.downloader import DownloadCore  # noqa: E402
+from managers.download_manager import DownloadProgressManager  # noqa: E402
+from models.download_task import DownloadTask  # noqa: E402
+from tools.fake_netease_server import parse_size  # noqa: E402
+
+GB = 1024 ** 3
+TASK_ID = 'bench'
+
+
+def legacy_transfer(url: str, file_path: str, progress_manager: DownloadProgressManager):
+    """旧实现：8KB 数据块，每块计算速度并加锁更新进度"""
+    with get_client().get(url, stream=True, timeout=10) as response:
+        response.raise_for_status()
+        total_size = int(response.headers.get('content-length', 0))
+        downloaded_size = 0
+        start_time = time.time()
+        with open(file_path, 'wb') as f:
+            for chunk in response.iter_content(chunk_size=8192):
+                f.write(chunk)
+                downloaded_size += len(chunk)
+                elapsed = time.time() - start_time
+                speed = downloaded_size / elapsed / 1024 if elapsed > 0 else 0
+                progress_manager.update_task_progress(TASK_ID, downloaded_size / total_size, speed)
+
+
+def pooled_transfer(url: str, file_path: str, core: DownloadCore):
+    """新实现：DownloadCore 的单连接传输路径"""
+    core._resume_download(url, file_path, TASK_ID)
+
+
+def measure(label: str, transfer, size: int, rounds: int, file_path: str):
+    """重复传输 rounds 次，取 CPU 时间最少的一次"""
+    best_cpu, best_wall = float('inf'), float('inf')
+    for _ in range(rounds):
+        if os.path.exists(file_path):
+            os.remove(file_path)
+        cpu_start, wall_start = time.process_time(), time.perf_counter()
+        transfer(file_path)
+        best_cpu = min(best_cpu, time.process_time() - cpu_start)
+        best_wall = min(best_wall, time.perf_counter() - wall_start)
+        assert os.path.getsize(file_path) == size, "传输大小不一致"
+    print(f"{label:<28} CPU {best_cpu / size * GB:6.2f} s/GB  吞吐 {size / best_wall / 1024 ** 2:8.1f} MB/s")
+    return best_cpu
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--size', type=parse_size, default=parse_size('256MB'))
+    parser.add_argument('--rounds', type=int, default=3)
+    args = parser.parse_args()
+
+    server_script = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+                                 'tools', 'fake_netease_server.py')
+    server = subprocess.Popen([sys.executable, '-u', server_script, '--port', '0', '--flac-size', str(args.size)],
+                              stdout=subprocess.PIPE, text=True)
+    try:
+        base_url = server.stdout.readline().strip().split('：', 1)[1]
+        url = f"{base_url}/audio/1.flac?expires={int(time.time()) + 3600}"
+
+        progress_manager = DownloadProgressManager()
+        progress_manager.add_task(DownloadTask(id=TASK_ID, track={}, quality='lossless',
+                                               download_lyrics=False, download_dir=''))
+        core = DownloadCore(progress_manager)
+        core.set_download_state(True)
+
+        # 预热：服务端生成合成音频并建立连接
+        get_client().get(url, headers={'Range': 'bytes=0-0'}).close()
+
+        with tempfile.TemporaryDirectory() as tmp:
+            file_path = os.path.join(tmp, 'bench.flac')
+            before = measure("iter_content(8192)", lambda path: legacy_transfer(url, path, progress_manager),
+                             args.size, args.rounds, file_path)
+            after = measure("StreamReader (readinto)", lambda path: pooled_transfer(url, path, core),
+                            args.size, args.rounds, file_path)
+        print(f"CPU 降低: {before / after:.2f}x")
+    finally:
+        server.terminate()
+        server.wait()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,488 @@
+"""
+asyncio 下载引擎（设置 DOWNLIST_ASYNC_ENGINE=1 启用）
+解析和传输在一个事件循环中以协程执行，数百个同时进行的传输只占用一个线程；后处理仍由线程执行
+续传、分段、传输中写入标签和完整性校验的判断与线程版本共用 DownloadCore 的方法，只有网络读写换成 aiohttp
+"""
+import asyncio
+import logging
+import os
+import queue
+import threading
+import time
+import aiohttp
+from typing import Any, Callable, Dict, Optional
+
+from api.async_http_client import close_async_client, get_async_client
+from api.async_netease_api import name_v1 as name_v1_async, url_v1 as url_v1_async
+from core.downloader import RESUME_BACKOFF, RESUME_MAX_RETRIES, DownloadCore
+from core.inline_tags import InlineTagger
+from core.integrity import VERIFY_MAX_RETRIES, IntegrityError, StreamVerifier
+from core.pipeline import _STOP, DownloadPipeline
+from core.segments import RangeNotSupportedError, SegmentPlan
+from core.transfer import TRANSFER_MAX_CHUNK, ProgressReporter
+from managers.song_cache import get_song_cache
+from models.download_task import DownloadTask, ResolvedTask
+from utils.file_utils import parse_content_range
+
+ASYNC_ENGINE_ENV = 'DOWNLIST_ASYNC_ENGINE'  # 设置为 1 时使用 asyncio 下载引擎
+ASYNC_RESOLVE_WORKERS = 8  # 同时解析的任务数
+ASYNC_TRANSFER_WORKERS = 32  # 默认同时传输的任务数
+ASYNC_MAX_CONCURRENCY = 128  # 同时传输的任务数上限，自动调整并发数时同样以此为上限
+STAGE_PUT_RETRY = 0.05  # 下游队列已满时协程重试放入的间隔（秒）
+
+# 连接中断、数据不完整或读取超时，可从断点续传
+TRANSFER_ERRORS = (aiohttp.ClientPayloadError, aiohttp.ClientConnectionError, asyncio.TimeoutError)
+
+
+def async_engine_enabled() -> bool:
+    """是否启用 asyncio 下载引擎"""
+    return os.environ.get(ASYNC_ENGINE_ENV) == '1'
+
+
+class AsyncDownloadCore(DownloadCore):
+    """
+    DownloadCore 的协程版本：resolve_task_async、transfer_task_async 在事件循环中执行
+    线程版本的方法保留不变，download_single_task 等原有入口仍可在线程中调用
+    """
+
+    async def _get_url_info_async(self, song_id: str, quality: str) -> Optional[Dict[str, Any]]:
+        """_get_url_info 的协程版本"""
+        info = self.url_cache.get(song_id, quality)
+        if info is not None:
+            return info
+        return self._cache_url_data(song_id, quality, await url_v1_async(song_id, quality))
+
+    async def download_single_task_async(self, task: DownloadTask):
+        """依次执行解析、传输和后处理，下载单个任务；后处理在线程池中执行"""
+        try:
+            resolved = await self.resolve_task_async(task)
+            if resolved is not None and await self.transfer_task_async(resolved):
+                await asyncio.get_running_loop().run_in_executor(None, self.postprocess_task, resolved)
+        finally:
+            self.release_task(task)
+
+    async def resolve_task_async(self, task: DownloadTask) -> Optional[ResolvedTask]:
+        """
+        解析阶段：下载链接和缺少的歌曲详情用异步接口获取并写入缓存，
+        之后由 resolve_task 在线程池中检查已存在的文件，失败时同样在那里更新任务状态
+        """
+        if not self._control(task.id).cancelled:
+            song_id = str(task.track['id'])
+            try:
+                await self._get_url_info_async(song_id, task.quality)
+                if 'picUrl' not in task.track and get_song_cache().get(song_id) is None:
+                    get_song_cache().put_many((await name_v1_async(song_id))['songs'][:1])
+            except Exception as e:
+                # resolve_task 会按同步接口重新获取
+                logging.warning(f"异步获取歌曲信息失败：{task.track['name']}，错误：{str(e)}")
+        return await asyncio.get_running_loop().run_in_executor(None, self.resolve_task, task)
+
+    async def transfer_task_async(self, resolved: ResolvedTask) -> bool:
+        """传输阶段：下载到 .part 文件，返回是否下载完整，失败或取消时更新任务状态"""
+        task = resolved.task
+        if self._control(task.id).cancelled:
+            # 取消前已解析并在传输队列中排队的任务不再请求 CDN
+            self.progress_manager.update_task_status(task.id, "failed", "下载已取消")
+            return False
+        try:
+            self.progress_manager.update_task_status(task.id, "downloading")
+
+            # 签名链接失效（403）时刷新链接后重试一次
+            try:
+                completed = await self._download_file_async(resolved.url_info['url'], resolved.part_path, task.id,
+                                                            resolved.url_info, resolved.tagger)
+            except aiohttp.ClientResponseError as e:
+                if e.status != 403:
+                    raise
+                logging.info(f"下载链接已失效，重新获取：{task.track['name']}")
+                self.url_cache.invalidate(resolved.song_id, task.quality)
+                url_info = await self._get_url_info_async(resolved.song_id, task.quality)
+                if not url_info or not url_info.get('url'):
+                    raise
+                resolved.url_info = url_info
+                completed = await self._download_file_async(url_info['url'], resolved.part_path, task.id, url_info,
+                                                            resolved.tagger)
+
+            if not completed:
+                # 取消下载时保留 .part 文件，下次从断点续传
+                self.progress_manager.update_task_status(task.id, "failed", "下载已取消")
+                logging.info(f"已取消下载：{task.track['name']}")
+            return completed
+
+        except Exception as e:
+            self.progress_manager.update_task_status(task.id, "failed", str(e))
+            logging.error(f"下载 {task.track['name']} 失败：{str(e)}")
+            return False
+
+    async def _download_file_async(self, url: str, part_path: str, task_id: str,
+                                   url_info: Optional[Dict[str, Any]] = None,
+                                   tagger: Optional[InlineTagger] = None) -> bool:
+        """_download_file_with_progress 的协程版本，校验失败时删除 .part 文件重新下载"""
+        for attempt in range(VERIFY_MAX_RETRIES + 1):
+            try:
+                return await self._download_once_async(url, part_path, task_id, url_info, tagger)
+            except IntegrityError as e:
+                if tagger is not None:
+                    tagger.reset()
+                if attempt == VERIFY_MAX_RETRIES:
+                    raise
+                logging.warning(f"下载校验失败，重新下载：{part_path}，错误：{str(e)}")
+        return False
+
+    async def _download_once_async(self, url: str, part_path: str, task_id: str,
+                                   url_info: Optional[Dict[str, Any]], tagger: Optional[InlineTagger]) -> bool:
+        """下载一次并校验，大文件分段下载，其余单连接下载并在中断时续传"""
+        size = (url_info or {}).get('size') or 0
+        if self._use_segments(part_path, size):
+            try:
+                return await self._download_segmented_async(url, part_path, task_id, size,
+                                                            url_info.get('md5') or '', tagger)
+            except RangeNotSupportedError:
+                self._segments_unsupported(part_path, size, tagger)
+
+        # 校验器跨续传保留，断点之前已计入摘要的数据不再读取
+        verifier = StreamVerifier.from_url_info(url_info)
+        control = self._control(task_id)
+        for attempt in range(RESUME_MAX_RETRIES + 1):
+            try:
+                if not await self._resume_download_async(url, part_path, task_id, verifier, tagger):
+                    return False
+                break
+            except TRANSFER_ERRORS as e:
+                if control.cancelled:
+                    return False
+                if attempt == RESUME_MAX_RETRIES:
+                    raise
+                logging.info(f"下载中断，{RESUME_BACKOFF * (attempt + 1):.0f} 秒后从断点续传：{part_path}，错误：{str(e)}")
+                if not await control.sleep_async(RESUME_BACKOFF * (attempt + 1)):
+                    return False
+
+        self._verify_part(verifier, part_path)
+        return True
+
+    async def _tag_data_ready(self, tagger: InlineTagger):
+        """标签区写入前等待后台获取的封面和歌词，tagger 渲染标签时不阻塞事件循环"""
+        if not tagger.done:
+            await asyncio.wrap_future(tagger.tag_data)
+
+    async def _resume_download_async(self, url: str, part_path: str, task_id: str,
+                                     verifier: StreamVerifier, tagger: Optional[InlineTagger] = None) -> bool:
+        """_resume_download 的协程版本：从 .part 文件的当前长度开始请求剩余部分并追加写入"""
+        control = self._control(task_id)
+        loop = asyncio.get_running_loop()
+        offset, readable, headers = self._resume_start(part_path, tagger)
+
+        # 取消时在事件循环中关闭响应，等待中的读取立即返回
+        async with get_async_client().stream(url, headers=headers) as response:
+            with control.on_cancel(lambda: loop.call_soon_threadsafe(response.close)):
+                if response.status == 416:
+                    if self._resume_exhausted(response.headers.get('content-range'), part_path, offset, verifier,
+                                              readable):
+                        return True
+                    return await self._resume_download_async(url, part_path, task_id, verifier, tagger)
+                response.raise_for_status()
+
+                offset, total_size = self._resume_range(response.status, int(response.headers.get('content-length', 0)),
+                                                        response.headers.get('content-range'), offset, tagger)
+                # 回退或补读摘要需要读取已下载的文件，在线程池中执行
+                await loop.run_in_executor(None, verifier.seek, part_path, offset, readable)
+
+                downloaded_size = offset
+                start_time = time.time()
+                reporter = ProgressReporter(self.progress_manager, task_id, total_size, offset)
+
+                # 等待响应期间已取消时不创建或截断 .part 文件
+                if control.cancelled:
+                    return False
+                with open(part_path, 'ab' if offset else 'wb') as f:
+                    while True:
+                        chunk = await response.content.read(self.bandwidth.read_limit() or TRANSFER_MAX_CHUNK)
+                        if not chunk:
+                            break
+                        if not await control.wait_if_paused_async():
+                            return False
+
+                        if tagger is None:
+                            f.write(chunk)
+                        else:
+                            await self._tag_data_ready(tagger)
+                            tagger.write(f, chunk)
+                        verifier.update(chunk)
+                        downloaded_size += len(chunk)
+                        reporter.update(downloaded_size)
+                        self.transfer_stats.add_bytes(len(chunk))
+                        delay = self.bandwidth.reserve(len(chunk))
+                        if delay and not await control.sleep_async(delay):
+                            return False
+                    if tagger is not None and downloaded_size >= total_size:
+                        await self._tag_data_ready(tagger)
+                        tagger.finish(f)
+                reporter.update(downloaded_size, force=True)
+
+        if control.cancelled:
+            return False
+        self.throughput.update(downloaded_size - offset, time.time() - start_time)
+        if total_size and downloaded_size < total_size:
+            raise aiohttp.ClientPayloadError(f"下载不完整：{downloaded_size}/{total_size} 字节")
+        return True
+
+    async def _download_segmented_async(self, url: str, part_path: str, task_id: str, size: int, md5: str,
+                                        tagger: Optional[InlineTagger] = None) -> bool:
+        """_download_segmented 的协程版本，各分段由同一事件循环中的协程下载"""
+        if self._control(task_id).cancelled:
+            return False
+        plan = self._load_segment_plan(part_path, size, tagger)
+        if plan is None:
+            start = 0
+            if tagger is not None:
+                start = await self._fetch_head_async(url, part_path, task_id, tagger)
+                if start is None:
+                    return False
+            plan = self._create_segment_plan(part_path, size, start, tagger)
+        workers = self._segment_workers(plan)
+        reporter = ProgressReporter(self.progress_manager, task_id, size, plan.downloaded)
+
+        async def worker() -> bool:
+            seg = plan.next_segment()
+            while seg is not None:
+                try:
+                    if not await self._download_segment_async(url, plan, seg, task_id, reporter):
+                        return False
+                finally:
+                    plan.release(seg)
+                seg = plan.next_segment()
+            return True
+
+        # 与线程版本一样等待所有分段结束后再报告第一个错误
+        try:
+            results = await asyncio.gather(*(worker() for _ in range(workers)), return_exceptions=True)
+        finally:
+            plan.save()
+        for result in results:
+            if isinstance(result, BaseException):
+                raise result
+
+        if not all(results):
+            return False
+        # 校验需要读取整个文件，在线程池中执行
+        await asyncio.get_running_loop().run_in_executor(None, self._verify_segments, plan, md5, tagger)
+        return True
+
+    async def _fetch_head_async(self, url: str, part_path: str, task_id: str, tagger: InlineTagger) -> Optional[int]:
+        """_fetch_head 的协程版本：下载文件头部直到 tagger 写入标签区，返回已下载的服务端字节数"""
+        control = self._control(task_id)
+        loop = asyncio.get_running_loop()
+        for attempt in range(RESUME_MAX_RETRIES + 1):
+            try:
+                async with get_async_client().stream(url) as response:
+                    with control.on_cancel(lambda: loop.call_soon_threadsafe(response.close)):
+                        response.raise_for_status()
+                        if control.cancelled:
+                            return None
+                        consumed = 0
+                        with open(part_path, 'wb') as f:
+                            while not tagger.done:
+                                chunk = await response.content.read(TRANSFER_MAX_CHUNK)
+                                await self._tag_data_ready(tagger)
+                                if not chunk:
+                                    tagger.finish(f)
+                                    break
+                                tagger.write(f, chunk)
+                                consumed += len(chunk)
+                return None if control.cancelled else consumed
+            except TRANSFER_ERRORS as e:
+                if control.cancelled:
+                    return None
+                if attempt == RESUME_MAX_RETRIES:
+                    raise
+                tagger.reset()
+                logging.info(f"下载文件头部中断，重试：{part_path}，错误：{str(e)}")
+                if not await control.sleep_async(RESUME_BACKOFF * (attempt + 1)):
+                    return None
+        return None
+
+    async def _download_segment_async(self, url: str, plan: SegmentPlan, seg: Dict[str, Any], task_id: str,
+                                      reporter: ProgressReporter) -> bool:
+        """下载单个分段，连接中断时从分段当前位置重试，取消时返回 False"""
+        control = self._control(task_id)
+        for attempt in range(RESUME_MAX_RETRIES + 1):
+            try:
+                return await self._fetch_segment_async(url, plan, seg, task_id, reporter)
+            except TRANSFER_ERRORS as e:
+                if control.cancelled:
+                    return False
+                if attempt == RESUME_MAX_RETRIES:
+                    raise
+                logging.info(f"分段下载中断，重试：{plan.part_path} [{seg['pos']}-{seg['end']}]，错误：{str(e)}")
+                if not await control.sleep_async(RESUME_BACKOFF * (attempt + 1)):
+                    return False
+        return False
+
+    async def _fetch_segment_async(self, url: str, plan: SegmentPlan, seg: Dict[str, Any], task_id: str,
+                                   reporter: ProgressReporter) -> bool:
+        """_fetch_segment 的协程版本：请求分段剩余的字节范围并写入对应位置"""
+        control = self._control(task_id)
+        loop = asyncio.get_running_loop()
+        offset = seg['pos']
+        headers = {'Range': f"bytes={offset}-{seg['end']}"}
+        fetch_start = time.time()
+
+        async with get_async_client().stream(url, headers=headers) as response:
+            with control.on_cancel(lambda: loop.call_soon_threadsafe(response.close)):
+                response.raise_for_status()
+                if response.status != 206 or parse_content_range(response.headers.get('content-range'))[0] != offset:
+                    raise RangeNotSupportedError(url)
+
+                with open(plan.part_path, 'r+b') as f:
+                    f.seek(offset + plan.file_offset)
+                    while not plan.is_done(seg):
+                        # 分段可能已被其他协程拆分，只读取到当前的结束位置
+                        chunk = await response.content.read(plan.clip(seg, self.bandwidth.read_limit()
+                                                                      or TRANSFER_MAX_CHUNK))
+                        if not chunk:
+                            break
+                        if not await control.wait_if_paused_async():
+                            return False
+
+                        f.write(chunk)
+                        plan.advance(seg, len(chunk))
+                        if reporter.due():
+                            reporter.update(plan.downloaded)
+                        self.transfer_stats.add_bytes(len(chunk))
+                        delay = self.bandwidth.reserve(len(chunk))
+                        if delay and not await control.sleep_async(delay):
+                            return False
+
+        if control.cancelled:
+            return False
+        self.throughput.update(seg['pos'] - offset, time.time() - fetch_start)
+        if not plan.is_done(seg):
+            raise aiohttp.ClientPayloadError(f"分段不完整：{seg['pos']}/{seg['end'] + 1}")
+        return True
+
+
+class AsyncPipelineStage:
+    """
+    在事件循环中以协程处理任务的阶段，接口与 PipelineStage 相同
+    一个线程从输入队列领取任务交给事件循环，同时处理的任务数不超过 workers；
+    收到结束标记且已领取的任务全部完成后通知下游阶段结束
+    """
+
+    def __init__(self, name: str, workers: int, handler: Callable, input_queue,
+                 on_finished: Callable[[], None], loop: asyncio.AbstractEventLoop):
+        self.name = name
+        self.workers = max(1, workers)
+        self.handler = handler
+        self.input_queue = input_queue
+        self.on_finished = on_finished
+        self.loop = loop
+        self.active = 0
+        self.started = False
+        self.finished = False
+        self.cond = threading.Condition()
+        self.thread: Optional[threading.Thread] = None
+
+    def start(self):
+        self.started = True
+        self.thread = threading.Thread(target=self._run, name=self.name, daemon=True)
+        self.thread.start()
+
+    def resize(self, workers: int):
+        """调整同时处理的任务数，调小时正在处理的任务继续完成"""
+        with self.cond:
+            self.workers = max(1, workers)
+            self.cond.notify_all()
+
+    def stop(self):
+        """输入结束后调用，已领取的任务处理完后通知下游阶段结束"""
+        self.input_queue.put(_STOP)
+
+    def _run(self):
+        while True:
+            # 有空闲名额时才领取，排在后面的优先任务仍能先被领取
+            with self.cond:
+                self.cond.wait_for(lambda: self.active < self.workers)
+            item = self.input_queue.get()
+            if item is _STOP:
+                break
+            with self.cond:
+                self.active += 1
+            asyncio.run_coroutine_threadsafe(self._handle(item), self.loop)
+
+        with self.cond:
+            self.cond.wait_for(lambda: self.active == 0)
+            self.finished = True
+        self.on_finished()
+
+    async def _handle(self, item):
+        try:
+            await self.handler(item)
+        except Exception as e:
+            # 各阶段自行更新任务状态，这里只防止名额不被归还
+            logging.error(f"{self.name} 阶段处理任务失败：{str(e)}")
+        finally:
+            with self.cond:
+                self.active -= 1
+                self.cond.notify_all()
+
+
+class AsyncDownloadPipeline(DownloadPipeline):
+    """
+    解析和传输阶段在事件循环中执行的 DownloadPipeline，调度、重试、预取和并发调整与线程版本相同
+    并发下载数为同时进行的传输协程数，可以设置到 ASYNC_MAX_CONCURRENCY 而不需要相应数量的线程
+    """
+
+    max_concurrency = ASYNC_MAX_CONCURRENCY
+
+    def __init__(self, core: AsyncDownloadCore, resolve_workers: int = ASYNC_RESOLVE_WORKERS,
+                 transfer_workers: int = ASYNC_TRANSFER_WORKERS,
+                 postprocess_workers: Optional[int] = None,
+                 shortest_first: bool = False):
+        self.loop = asyncio.new_event_loop()
+        self.loop_thread = threading.Thread(target=self._run_loop, name="异步下载", daemon=True)
+        super().__init__(core, resolve_workers, transfer_workers, postprocess_workers, shortest_first)
+
+    def _create_stage(self, name: str, workers: int, handler: Callable, input_queue,
+                      on_finished: Callable[[], None]):
+        """解析和传输阶段由事件循环中的协程执行"""
+        return AsyncPipelineStage(name, workers, handler, input_queue, on_finished, self.loop)
+
+    def start(self):
+        """启动事件循环线程和所有阶段"""
+        if not self.started:
+            self.loop_thread.start()
+        super().start()
+
+    def _run_loop(self):
+        asyncio.set_event_loop(self.loop)
+        try:
+            self.loop.run_forever()
+        finally:
+            self.loop.run_until_complete(close_async_client())
+            self.loop.run_until_complete(self.loop.shutdown_default_executor())
+            self.loop.close()
+
+    def _on_finished(self):
+        super()._on_finished()
+        self.loop.call_soon_threadsafe(self.loop.stop)
+
+    async def _put(self, stage_queue: queue.Queue, item):
+        """放入下游阶段的有界队列，队列已满时让出事件循环稍后重试，不阻塞其他协程"""
+        while True:
+            try:
+                stage_queue.put_nowait(item)
+                return
+            except queue.Full:
+                await asyncio.sleep(STAGE_PUT_RETRY)
+
+    async def _resolve(self, task: DownloadTask):
+        resolved = await self.core.resolve_task_async(task)
+        if resolved is None:
+            self._task_finished(task)
+            return
+        # 传输队列已满时等待，解析不会领先传输太多，链接也不会在排队时过期
+        await self._put(self.transfer.input_queue, resolved)
+
+    async def _transfer(self, resolved: ResolvedTask):
+        if self._transfer_finished(resolved, await self.core.transfer_task_async(resolved)):
+            await self._put(self.postprocess.input_queue, resolved)
@@ -0,0 +1,143 @@
+"""
+并发数自动调整
+按固定窗口统计传输的总字节数得到总速度（KB/s），并统计传输失败率，用爬山法调整并发下载数：
+增加连接仍能明显提升总速度时继续增加，提升不明显或失败率过高时退回，稳定一段时间后再试探
+"""
+import logging
+import threading
+import time
+from typing import Callable, Optional
+
+AUTO_CONCURRENCY_MIN = 1
+AUTO_CONCURRENCY_MAX = 8
+AUTO_SAMPLE_INTERVAL = 1.0  # 检查是否需要停止的间隔（秒）
+AUTO_WINDOW_SAMPLES = 8  # 每个窗口包含的间隔数，窗口结束时决定下一步
+AUTO_MIN_GAIN = 0.05  # 每增加一个连接至少提升的总速度比例
+AUTO_MAX_ERROR_RATE = 0.2  # 窗口内传输失败的比例超过该值时减少并发
+AUTO_HOLD_WINDOWS = 3  # 找到合适的并发数后保持的窗口数，之后再次试探
+
+
+class TransferStats:
+    """
+    传输统计：累计传输的字节数和传输阶段的成功、失败次数，线程安全
+    只统计传输本身，解析阶段的失败（VIP 限制、无版权）和取消不计入失败
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.bytes = 0
+        self.succeeded = 0
+        self.failed = 0
+
+    def add_bytes(self, nbytes: int):
+        with self.lock:
+            self.bytes += nbytes
+
+    def record(self, success: bool):
+        """记录一次传输结果，失败包括网络错误和限流"""
+        with self.lock:
+            if success:
+                self.succeeded += 1
+            else:
+                self.failed += 1
+
+    def snapshot(self) -> tuple:
+        """返回 (字节数, 成功次数, 失败次数)"""
+        with self.lock:
+            return self.bytes, self.succeeded, self.failed
+
+
+class HillClimber:
+    """
+    爬山法决策：每个窗口结束时传入该窗口的平均总速度和失败率，返回下一个窗口的并发数
+    """
+
+    def __init__(self, workers: int, min_workers: int = AUTO_CONCURRENCY_MIN,
+                 max_workers: int = AUTO_CONCURRENCY_MAX):
+        self.min_workers = min_workers
+        self.max_workers = max_workers
+        self.workers = max(min_workers, min(workers, max_workers))
+        self.direction = 1
+        self.previous: Optional[float] = None  # 上一个窗口的总速度
+        self.hold = 0
+
+    def observe(self, throughput: float, error_rate: float) -> int:
+        """记录一个窗口的结果并返回下一个窗口的并发数"""
+        previous, self.previous = self.previous, throughput
+        if error_rate > AUTO_MAX_ERROR_RATE:
+            # 失败增多通常是触发了限流，减少连接后保持一段时间
+            return self._step(-1, hold=True, probe=1)
+        if self.hold:
+            self.hold -= 1
+            return self.workers if self.hold else self._step(self.direction)
+        if previous is None:
+            return self._step(self.direction)
+
+        if self.direction > 0:
+            if throughput >= previous * (1 + AUTO_MIN_GAIN):
+                return self._step(1)
+            # 新增的连接没有带来明显提升，退回后保持，下次试探减少连接
+            return self._step(-1, hold=True, probe=-1)
+        if throughput >= previous * (1 - AUTO_MIN_GAIN):
+            # 减少连接总速度没有明显下降，继续减少
+            return self._step(-1)
+        return self._step(1, hold=True, probe=1)
+
+    def _step(self, direction: int, hold: bool = False, probe: int = 1) -> int:
+        """调整并发数；hold 为 True 时保持 AUTO_HOLD_WINDOWS 个窗口，之后向 probe 方向试探"""
+        workers = max(self.min_workers, min(self.workers + direction, self.max_workers))
+        if workers == self.workers and not hold:
+            # 到达边界，下个窗口向另一个方向试探
+            direction = -direction
+        self.workers = workers
+        self.direction = probe if hold else direction
+        self.hold = AUTO_HOLD_WINDOWS if hold else 0
+        return workers
+
+
+class ConcurrencyTuner:
+    """
+    后台线程：按窗口统计 DownloadCore.transfer_stats 中字节数和传输失败数的变化，按 HillClimber 的结果调整流水线的并发数
+    on_change 在调整后调用，参数为新的并发数
+    """
+
+    def __init__(self, pipeline, on_change: Optional[Callable[[int], None]] = None,
+                 min_workers: int = AUTO_CONCURRENCY_MIN, max_workers: int = AUTO_CONCURRENCY_MAX):
+        self.pipeline = pipeline
+        self.stats: TransferStats = pipeline.core.transfer_stats
+        self.on_change = on_change
+        self.climber = HillClimber(pipeline.concurrency, min_workers, max_workers)
+        self.stop_event = threading.Event()
+        self.thread: Optional[threading.Thread] = None
+
+    def start(self):
+        self.thread = threading.Thread(target=self._run, name="并发调整", daemon=True)
+        self.thread.start()
+
+    def stop(self):
+        self.stop_event.set()
+
+    def _run(self):
+        intervals = 0
+        nbytes, succeeded, failed = self.stats.snapshot()
+        started = time.monotonic()
+        while not self.stop_event.wait(AUTO_SAMPLE_INTERVAL):
+            intervals += 1
+            if intervals < AUTO_WINDOW_SAMPLES:
+                continue
+
+            now = time.monotonic()
+            now_bytes, now_succeeded, now_failed = self.stats.snapshot()
+            finished = (now_succeeded - succeeded) + (now_failed - failed)
+            error_rate = (now_failed - failed) / finished if finished else 0.0
+            throughput = (now_bytes - nbytes) / 1024 / (now - started)
+            nbytes, succeeded, failed, started = now_bytes, now_succeeded, now_failed, now
+            intervals = 0
+
+            workers = self.climber.observe(throughput, error_rate)
+            if workers != self.pipeline.concurrency:
+                logging.info(f"自动并发：总速度 {throughput:.0f} KB/s，失败率 {error_rate:.0%}，"
+                             f"调整为 {workers} 个连接")
+                self.pipeline.set_concurrency(workers)
+                if self.on_change is not None:
+                    self.on_change(workers)
@@ -0,0 +1,107 @@
+"""
+全局带宽限速
+所有下载线程和协程共享一个令牌桶，限速可在运行时修改，并可按时段自动切换（例如夜间不限速）
+"""
+import datetime
+import threading
+import time
+from dataclasses import dataclass
+from typing import List, Optional
+
+BANDWIDTH_BURST_SECONDS = 0.5  # 令牌桶容量相当于多少秒的流量，限制突发
+BANDWIDTH_READ_SECONDS = 0.1  # 限速时单次读取的数据量相当于多少秒的流量，保证暂停和进度及时
+SCHEDULE_CHECK_INTERVAL = 30.0  # 重新匹配时段规则的间隔（秒）
+
+
+@dataclass
+class ScheduleRule:
+    """时段限速规则，start 晚于 end 时表示跨越午夜"""
+    start: datetime.time
+    end: datetime.time
+    rate: int  # 字节/秒，0 表示不限速
+
+    @classmethod
+    def parse(cls, start: str, end: str, rate: int) -> 'ScheduleRule':
+        """从 "HH:MM" 格式创建规则"""
+        return cls(datetime.datetime.strptime(start, '%H:%M').time(),
+                   datetime.datetime.strptime(end, '%H:%M').time(), rate)
+
+    def matches(self, now: datetime.time) -> bool:
+        if self.start <= self.end:
+            return self.start <= now < self.end
+        return now >= self.start or now < self.end
+
+
+class BandwidthLimiter:
+    """
+    线程安全的令牌桶限速器
+    reserve 按数据量扣除令牌并返回调用方需要等待的秒数，由调用方用可取消的方式等待
+    """
+
+    def __init__(self, rate: int = 0, schedule: Optional[List[ScheduleRule]] = None):
+        self.rate = rate  # 手动设置的速率（字节/秒），0 表示不限速
+        self.schedule: List[ScheduleRule] = list(schedule or [])
+        self.effective_rate = rate
+        self.tokens = 0.0
+        self.last_refill = time.monotonic()
+        self.next_schedule_check = 0.0
+        self.lock = threading.Lock()
+        self._apply_schedule(time.monotonic())
+
+    def set_rate(self, rate: int):
+        """修改限速，立即生效"""
+        with self.lock:
+            self.rate = max(0, int(rate))
+            self._apply_schedule(time.monotonic())
+
+    def set_schedule(self, schedule: List[ScheduleRule]):
+        """设置时段规则，匹配的时段使用规则的速率，其余时间使用手动设置的速率"""
+        with self.lock:
+            self.schedule = list(schedule)
+            self._apply_schedule(time.monotonic())
+
+    def _apply_schedule(self, now: float):
+        """按当前时间重新计算生效速率"""
+        clock = datetime.datetime.now().time()
+        rate = next((rule.rate for rule in self.schedule if rule.matches(clock)), self.rate)
+        if rate != self.effective_rate:
+            self.effective_rate = rate
+            self.tokens = min(self.tokens, rate * BANDWIDTH_BURST_SECONDS)
+        self.next_schedule_check = now + SCHEDULE_CHECK_INTERVAL
+
+    def read_limit(self) -> Optional[int]:
+        """限速时单次读取的最大字节数，不限速返回 None"""
+        rate = self.effective_rate
+        if not rate:
+            return None
+        return max(4096, int(rate * BANDWIDTH_READ_SECONDS))
+
+    def reserve(self, nbytes: int) -> float:
+        """扣除 nbytes 的令牌，返回需要等待的秒数"""
+        now = time.monotonic()
+        if not self.effective_rate and (not self.schedule or now < self.next_schedule_check):
+            return 0.0
+        with self.lock:
+            if self.schedule and now >= self.next_schedule_check:
+                self._apply_schedule(now)
+            rate = self.effective_rate
+            if not rate:
+                return 0.0
+            self.tokens = min(rate * BANDWIDTH_BURST_SECONDS, self.tokens + (now - self.last_refill) * rate)
+            self.last_refill = now
+            self.tokens -= nbytes
+            return -self.tokens / rate if self.tokens < 0 else 0.0
+
+
+_limiter: Optional[BandwidthLimiter] = None
+_limiter_lock = threading.Lock()
+
+
+def get_bandwidth_limiter() -> BandwidthLimiter:
+    """获取全局共享的带宽限速器"""
+    global _limiter
+    if _limiter is None:
+        with _limiter_lock:
+            if _limiter is None:
+                _limiter = BandwidthLimiter()
+    return _limiter
@@ -0,0 +1,148 @@
+"""
+下载控制
+以条件变量和回调代替轮询实现暂停、继续和取消：暂停中的下载线程阻塞等待，不占用 CPU；
+取消时立即回调关闭正在读取的连接，使阻塞的 socket 读取返回
+"""
+import asyncio
+import logging
+import threading
+import weakref
+from contextlib import contextmanager
+from typing import Callable, Iterator, List, Optional
+
+
+class DownloadControl:
+    """
+    暂停/取消控制令牌
+    可挂在父令牌（整个下载会话）之下，父令牌暂停或取消时对所有子令牌（单个任务）同样生效
+    """
+
+    def __init__(self, parent: Optional['DownloadControl'] = None):
+        self.parent = parent
+        # 同一棵令牌树共用一个条件变量，任何一级状态变化都能唤醒等待者
+        self.cond: threading.Condition = parent.cond if parent else threading.Condition()
+        self._paused = False
+        self._cancelled = False
+        self.children: "weakref.WeakSet[DownloadControl]" = weakref.WeakSet()
+        self.listeners: List[Callable[[], None]] = []
+        if parent is not None:
+            with self.cond:
+                parent.children.add(self)
+
+    @property
+    def cancelled(self) -> bool:
+        """自身或任一上级已取消"""
+        return self._cancelled or (self.parent is not None and self.parent.cancelled)
+
+    @property
+    def paused(self) -> bool:
+        """自身或任一上级已暂停且未取消"""
+        if self.cancelled:
+            return False
+        return self._paused or (self.parent is not None and self.parent.paused)
+
+    def child(self) -> 'DownloadControl':
+        """创建子令牌"""
+        return DownloadControl(self)
+
+    def pause(self):
+        """暂停"""
+        self._update(paused=True)
+
+    def resume(self):
+        """继续"""
+        self._update(paused=False)
+
+    def cancel(self):
+        """取消，不可恢复"""
+        self._update(cancelled=True)
+
+    def _update(self, paused: Optional[bool] = None, cancelled: Optional[bool] = None):
+        """修改状态，唤醒等待者并在锁外调用自身及所有子令牌的监听回调"""
+        with self.cond:
+            if paused is not None:
+                self._paused = paused
+            if cancelled:
+                self._cancelled = True
+            listeners = self._collect_listeners()
+            self.cond.notify_all()
+        for listener in listeners:
+            try:
+                listener()
+            except Exception as e:
+                logging.warning(f"下载控制回调失败：{str(e)}")
+
+    def _collect_listeners(self) -> List[Callable[[], None]]:
+        listeners = list(self.listeners)
+        for child in list(self.children):
+            listeners.extend(child._collect_listeners())
+        return listeners
+
+    @contextmanager
+    def listen(self, callback: Callable[[], None]) -> Iterator[None]:
+        """在代码块执行期间，本令牌或上级状态变化时调用 callback（在修改状态的线程中执行）"""
+        with self.cond:
+            self.listeners.append(callback)
+        try:
+            yield
+        finally:
+            with self.cond:
+                self.listeners.remove(callback)
+
+    @contextmanager
+    def on_cancel(self, callback: Callable[[], None]) -> Iterator[None]:
+        """在代码块执行期间取消时调用一次 callback，进入时已取消则立即调用"""
+        fired = threading.Event()
+
+        def listener():
+            if self.cancelled and not fired.is_set():
+                fired.set()
+                callback()
+
+        with self.listen(listener):
+            listener()
+            yield
+
+    def wait_if_paused(self) -> bool:
+        """暂停时阻塞直到继续或取消，返回是否可以继续下载"""
+        with self.cond:
+            while self.paused:
+                self.cond.wait()
+            return not self.cancelled
+
+    def sleep(self, seconds: float) -> bool:
+        """等待指定秒数，取消时提前返回，返回是否可以继续下载"""
+        with self.cond:
+            self.cond.wait_for(lambda: self.cancelled, timeout=seconds)
+            return not self.cancelled
+
+    async def wait_if_paused_async(self) -> bool:
+        """协程版本的 wait_if_paused，等待时不阻塞事件循环"""
+        loop = asyncio.get_running_loop()
+        while self.paused:
+            waiter = loop.create_future()
+
+            def wake():
+                loop.call_soon_threadsafe(lambda: waiter.done() or waiter.set_result(None))
+
+            with self.listen(wake):
+                if self.paused:
+                    await waiter
+        return not self.cancelled
+
+    async def sleep_async(self, seconds: float) -> bool:
+        """协程版本的 sleep，取消时提前返回"""
+        loop = asyncio.get_running_loop()
+        waiter = loop.create_future()
+
+        def wake():
+            if self.cancelled:
+                loop.call_soon_threadsafe(lambda: waiter.done() or waiter.set_result(None))
+
+        with self.listen(wake):
+            if not self.cancelled:
+                try:
+                    await asyncio.wait_for(waiter, seconds)
+                except asyncio.TimeoutError:
+                    pass
+        return not self.cancelled
@@ -4,13 +4,33 @@
 import os
 import time
 import logging
+import threading
 import requests
-from typing import Dict, Any
-from models.download_task import DownloadTask
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict, Any, List, Optional, Tuple
+from models.download_task import DownloadTask, ResolvedTask
 from managers.download_manager import DownloadProgressManager
-from api.netease_api import name_v1, url_v1, lyric_v1
-from core.metadata import add_metadata
-from utils.file_utils import build_file_path, build_lyric_path, clean_filename
+from api.http_client import abort_response, get_client
+from api.netease_api import name_v1, url_v1, url_v1_batch, lyric_v1, parse_url_item
+from core.autotune import TransferStats
+from core.bandwidth import get_bandwidth_limiter
+from core.control import DownloadControl
+from core.inline_tags import InlineTagger, read_audio_extension, tag_region_size
+from core.integrity import (VERIFY_MAX_RETRIES, IntegrityError, StreamVerifier, is_existing_file_complete,
+                            local_audio_size)
+from core.metadata import add_metadata, load_cover, submit_metadata_load
+from core.transfer import TRANSFER_MAX_CHUNK, ProgressReporter, StreamReader
+from core.segments import SEGMENT_THRESHOLD, RangeNotSupportedError, SegmentPlan, ThroughputMeter, build_state_path
+from managers.downloaded_files import get_downloaded_files
+from managers.song_cache import get_song_cache
+from managers.url_cache import DownloadUrlCache
+from utils.file_utils import build_file_path, build_lyric_path, build_part_path, clean_filename, parse_content_range
+
+URL_PREFETCH_AHEAD = 40  # 预取下载链接的任务数
+RESUME_MAX_RETRIES = 3  # 连接中断后从断点续传的最大次数
+RESUME_BACKOFF = 1.0  # 续传重试的退避基数（秒）
+INLINE_TAGS_ENV = 'DOWNLIST_INLINE_TAGS'  # 设置为 1 时在传输中写入标签
+TAG_PROBE_SIZE = 64 * 1024  # 检查已存在的文件时请求的服务端文件头部长度
 
 
 class DownloadCore:
@@ -18,19 +38,183 @@ class DownloadCore:
     
     def __init__(self, progress_manager: DownloadProgressManager):
         self.progress_manager = progress_manager
-        self.is_downloading = False
-        self.is_paused = False
+        # 下载会话令牌，每个任务持有其子令牌，暂停和取消通过事件通知而非轮询
+        self.session: Optional[DownloadControl] = None
+        self.task_controls: Dict[str, DownloadControl] = {}
+        # 下载链接缓存与预取：预取线程按调度顺序提前解析即将开始的任务
+        self.url_cache = DownloadUrlCache()
+        self.prefetch_cond = threading.Condition()
+        self.prefetch_thread: Optional[threading.Thread] = None
+        # 单连接下载速度，决定大文件的分段数
+        self.throughput = ThroughputMeter()
+        # 所有下载共享的带宽限速
+        self.bandwidth = get_bandwidth_limiter()
+        # 传输的字节数和成功、失败次数，供自动调整并发数使用
+        self.transfer_stats = TransferStats()
+        # 传输中写入标签（设置 DOWNLIST_INLINE_TAGS=1 启用）：封面和歌词在后台获取，文件只写一遍
+        self.inline_tags = os.environ.get(INLINE_TAGS_ENV) == '1'
+
+    @property
+    def is_downloading(self) -> bool:
+        """当前会话是否在下载中（含暂停）"""
+        return self.session is not None and not self.session.cancelled
+
+    @property
+    def is_paused(self) -> bool:
+        """当前会话是否已暂停"""
+        return self.session is not None and self.session.paused
 
     def set_download_state(self, is_downloading: bool, is_paused: bool = False):
-        """设置下载状态"""
-        self.is_downloading = is_downloading
-        self.is_paused = is_paused
+        """设置下载状态：开始新会话、暂停、继续或取消当前会话"""
+        if not is_downloading:
+            if self.session is not None:
+                self.session.cancel()
+            return
+        if self.session is None or self.session.cancelled:
+            self.session = DownloadControl()
+        if is_paused:
+            self.session.pause()
+        else:
+            self.session.resume()
+
+    def pause_task(self, task_id: str):
+        """暂停单个任务"""
+        control = self.task_controls.get(task_id)
+        if control is not None:
+            control.pause()
+            self.progress_manager.update_task_status(task_id, "paused")
+
+    def resume_task(self, task_id: str):
+        """继续单个任务"""
+        control = self.task_controls.get(task_id)
+        if control is not None:
+            control.resume()
+            self.progress_manager.update_task_status(task_id, "downloading")
+
+    def cancel_task(self, task_id: str):
+        """取消单个任务，正在阻塞的读取会立即中断"""
+        control = self.task_controls.get(task_id)
+        if control is not None:
+            control.cancel()
+
+    def is_task_cancelled(self, task_id: str) -> bool:
+        """任务或所在的下载会话是否已取消"""
+        control = self.task_controls.get(task_id)
+        return control is not None and control.cancelled
+
+    def _control(self, task_id: str) -> DownloadControl:
+        """获取任务的控制令牌"""
+        control = self.task_controls.get(task_id)
+        if control is None:
+            # 不在会话中执行的下载（没有开始会话时）使用独立令牌
+            control = self.session.child() if self.session is not None else DownloadControl()
+            self.task_controls[task_id] = control
+        return control
+
+    def resolve_urls(self, tasks: List[DownloadTask]):
+        """按音质批量解析任务的下载链接，结果写入 url_cache"""
+        ids_by_quality: Dict[str, List[str]] = {}
+        for task in tasks:
+            ids_by_quality.setdefault(task.quality, []).append(str(task.track['id']))
+
+        for quality, ids in ids_by_quality.items():
+            try:
+                self.url_cache.put_many(quality, url_v1_batch(ids, quality))
+            except Exception as e:
+                logging.warning(f"批量解析下载链接失败，将逐首获取：{str(e)}")
+
+    def start_url_prefetch(self, upcoming: Callable[[int], List[DownloadTask]],
+                           lookahead: int = URL_PREFETCH_AHEAD, done: Optional[threading.Event] = None):
+        """
+        启动后台预取线程，提前解析接下来 lookahead 个任务的下载链接
+        upcoming(n) 按开始顺序返回接下来的 n 个任务；会话取消或 done 设置后线程退出
+        """
+        self.prefetch_thread = threading.Thread(target=self._prefetch_loop,
+                                                args=(self.session, upcoming, lookahead, done), daemon=True)
+        self.prefetch_thread.start()
 
-    def download_single_task(self, task: DownloadTask, cookies: Dict[str, str]):
-        """下载单个任务"""
+    def _prefetch_window(self, upcoming: Callable[[int], List[DownloadTask]], lookahead: int) -> List[DownloadTask]:
+        """
+        返回需要预取的任务
+        窗口前半部分出现未缓存或即将过期的链接时，一次性补齐整个窗口，保证批量请求
+        """
+        window = upcoming(lookahead)
+        stale = [task for task in window if not self.url_cache.is_fresh(str(task.track['id']), task.quality)]
+        low_water = max(1, lookahead // 2)
+        if any(task in stale for task in window[:low_water]):
+            return stale
+        return []
+
+    def _prefetch_loop(self, session: Optional[DownloadControl], upcoming: Callable[[int], List[DownloadTask]],
+                       lookahead: int, done: Optional[threading.Event]):
+        """预取线程：任务开始、加入任务或定时醒来时检查预取窗口"""
+        while session is not None and not session.cancelled and not (done is not None and done.is_set()):
+            stale = self._prefetch_window(upcoming, lookahead)
+            if stale:
+                self.resolve_urls(stale)
+            with self.prefetch_cond:
+                self.prefetch_cond.wait(timeout=1.0)
+
+    def notify_prefetch(self):
+        """待开始的任务有变化，唤醒预取线程"""
+        with self.prefetch_cond:
+            self.prefetch_cond.notify()
+
+    def _mark_task_started(self, task: DownloadTask):
+        """任务开始执行，唤醒预取线程补齐窗口"""
+        self.notify_prefetch()
+
+    def _get_url_info(self, song_id: str, quality: str) -> Optional[Dict[str, Any]]:
+        """获取下载链接信息，优先使用未过期的缓存"""
+        info = self.url_cache.get(song_id, quality)
+        if info is not None:
+            return info
+
+        return self._cache_url_data(song_id, quality, url_v1(song_id, quality))
+
+    def _cache_url_data(self, song_id: str, quality: str, url_data: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+        """解析 url_v1 的返回结果并写入缓存，没有下载链接信息时返回 None"""
+        if not url_data.get('data'):
+            return None
+        info = parse_url_item(url_data['data'][0], time.time())
+        self.url_cache.put(song_id, quality, info)
+        return info
+
+    def _get_song_detail(self, song_id: str) -> Dict[str, Any]:
+        """获取歌曲详情，缓存未命中时请求接口并写入缓存"""
+        cache = get_song_cache()
+        song_info = cache.get(song_id)
+        if song_info is None:
+            song_info = name_v1(song_id)['songs'][0]
+            cache.put_many([song_info])
+        return song_info
+
+    def _get_cover_url(self, track: Dict[str, Any]) -> str:
+        """获取封面链接：歌单解析得到的曲目已包含 picUrl，缺少时才读取歌曲详情"""
+        if 'picUrl' in track:
+            return track['picUrl']
+        return self._get_song_detail(str(track['id']))['al'].get('picUrl', '')
+
+    def download_single_task(self, task: DownloadTask):
+        """在当前线程依次执行解析、传输和后处理，下载单个任务"""
         try:
-            # 更新任务状态为下载中
-            self.progress_manager.update_task_status(task.id, "downloading")
+            resolved = self.resolve_task(task)
+            if resolved is not None and self.transfer_task(resolved):
+                self.postprocess_task(resolved)
+        finally:
+            self.release_task(task)
+
+    def resolve_task(self, task: DownloadTask) -> Optional[ResolvedTask]:
+        """
+        解析阶段：获取歌曲详情和下载链接
+        已取消、无法下载或文件已存在时更新任务状态并返回 None
+        """
+        control = self._control(task.id)
+        try:
+            self._mark_task_started(task)
+            if control.cancelled:
+                self.progress_manager.update_task_status(task.id, "failed", "下载已取消")
+                return None
 
             song_id = str(task.track['id'])
             song_name = task.track['name']
@@ -40,88 +224,557 @@ class DownloadCore:
             clean_artists = clean_filename(task.track['artists'])
             clean_album = clean_filename(task.track['album'])
 
-            # 获取歌曲信息
-            song_info = name_v1(song_id)['songs'][0]
-            cover_url = song_info['al'].get('picUrl', '')
+            # 封面链接优先使用曲目信息，缺少时读取歌曲详情（优先读取歌单解析时写入的缓存）
+            cover_url = self._get_cover_url(task.track)
 
             # 获取下载链接
-            url_data = url_v1(song_id, task.quality, cookies)
-            if not url_data.get('data') or not url_data['data'][0].get('url'):
+            url_info = self._get_url_info(song_id, task.quality)
+            if not url_info or not url_info.get('url'):
                 self.progress_manager.update_task_status(task.id, "failed", "VIP限制或音质不可用")
                 logging.warning(f"无法下载 {song_name}，可能是 VIP 限制或音质不可用")
-                return
+                return None
 
-            song_url = url_data['data'][0]['url']
-            file_path = build_file_path(task.download_dir, clean_song_name, clean_artists, task.quality)
+            file_path = build_file_path(task.download_dir, clean_song_name, clean_artists, task.quality,
+                                        url_info.get('type', ''))
             task.file_path = file_path
 
-            # 检查文件是否已存在
+            # 检查文件是否已存在且完整
             if os.path.exists(file_path):
-                self.progress_manager.update_task_status(task.id, "completed")
-                logging.info(f"{song_name} 已存在，跳过下载")
-                return
+                audio_size = self._expected_audio_size(file_path, url_info, task.id)
+                if control.cancelled:
+                    self.progress_manager.update_task_status(task.id, "failed", "下载已取消")
+                    return None
+                if is_existing_file_complete(file_path, url_info, audio_size):
+                    self.progress_manager.update_task_status(task.id, "completed")
+                    logging.info(f"{song_name} 已存在，跳过下载")
+                    return None
+                logging.warning(f"{song_name} 已存在但不完整，重新下载")
+
+            resolved = ResolvedTask(task, song_id, clean_song_name, clean_artists, clean_album, cover_url,
+                                    url_info, file_path, build_part_path(file_path))
+            if self.inline_tags:
+                self._prepare_inline_tags(resolved)
+            return resolved
+
+        except Exception as e:
+            self.progress_manager.update_task_status(task.id, "failed", str(e))
+            logging.error(f"下载 {task.track['name']} 失败：{str(e)}")
+            return None
+
+    def _expected_audio_size(self, file_path: str, url_info: Dict[str, Any], task_id: str) -> Optional[int]:
+        """
+        已存在的正式文件去掉标签区后应有的长度
+        优先使用下载完成时的记录，服务端大小未变时不请求服务端；没有记录时按服务端文件头部计算，获取失败返回 None
+        """
+        size = url_info.get('size') or 0
+        if not size:
+            return None
+        record = get_downloaded_files().get(file_path)
+        if record is not None and record['server_size'] == size:
+            return record['audio_size']
+        file_extension = os.path.splitext(file_path)[1].lower()
+        server_head_size = self._fetch_tag_region_size(url_info['url'], file_extension, task_id)
+        return None if server_head_size is None else size - server_head_size
+
+    def _prepare_inline_tags(self, resolved: ResolvedTask):
+        """
+        创建传输中写入标签的 InlineTagger
+        封面和歌词交给元数据后台获取，不占用解析线程；传输收齐头部标签区时才等待结果
+        """
+        task = resolved.task
+        resolved.tag_data = submit_metadata_load(self._load_tag_data, resolved.cover_url, resolved.song_id,
+                                                 resolved.song_name, task.download_lyrics)
+        file_extension = os.path.splitext(resolved.file_path)[1]
+        resolved.tagger = InlineTagger(resolved.part_path, file_extension, resolved.song_name, resolved.artists,
+                                       resolved.album, resolved.tag_data)
+
+    def _load_tag_data(self, cover_url: str, song_id: str, song_name: str,
+                       download_lyrics: bool) -> Tuple[Optional[bytes], Optional[str]]:
+        """获取写入标签的封面和歌词，未下载歌词时歌词为 None"""
+        lyrics = self._fetch_lyrics(song_id, song_name) if download_lyrics else None
+        cover_data = load_cover(cover_url) if cover_url else None
+        return cover_data, lyrics
+
+    def transfer_task(self, resolved: ResolvedTask) -> bool:
+        """传输阶段：下载到 .part 文件，返回是否下载完整，失败或取消时更新任务状态"""
+        task = resolved.task
+        if self._control(task.id).cancelled:
+            # 取消前已解析并在传输队列中排队的任务不再请求 CDN
+            self.progress_manager.update_task_status(task.id, "failed", "下载已取消")
+            return False
+        try:
+            self.progress_manager.update_task_status(task.id, "downloading")
+
+            # 签名链接失效（403）时刷新链接后重试一次
+            try:
+                completed = self._download_file_with_progress(resolved.url_info['url'], resolved.part_path,
+                                                              task.id, resolved.url_info, resolved.tagger)
+            except requests.HTTPError as e:
+                if e.response is None or e.response.status_code != 403:
+                    raise
+                logging.info(f"下载链接已失效，重新获取：{task.track['name']}")
+                self.url_cache.invalidate(resolved.song_id, task.quality)
+                url_info = self._get_url_info(resolved.song_id, task.quality)
+                if not url_info or not url_info.get('url'):
+                    raise
+                resolved.url_info = url_info
+                completed = self._download_file_with_progress(url_info['url'], resolved.part_path, task.id, url_info,
+                                                              resolved.tagger)
+
+            if not completed:
+                # 取消下载时保留 .part 文件，下次从断点续传
+                self.progress_manager.update_task_status(task.id, "failed", "下载已取消")
+                logging.info(f"已取消下载：{task.track['name']}")
+            return completed
+
+        except Exception as e:
+            self.progress_manager.update_task_status(task.id, "failed", str(e))
+            logging.error(f"下载 {task.track['name']} 失败：{str(e)}")
+            return False
+
+    def postprocess_task(self, resolved: ResolvedTask):
+        """后处理阶段：写入元数据后重命名为正式文件，并下载歌词；传输中已写入标签时不再重写文件"""
+        task = resolved.task
+        tagger = resolved.tagger
+        try:
+            if resolved.tag_data is not None:
+                # 后台获取的歌词在写入歌词文件或补写标签时复用
+                resolved.lyrics = resolved.tag_data.result()[1]
 
-            # 下载文件
-            self._download_file_with_progress(song_url, file_path, task.id)
+            # 按下载数据开头的标识确定容器格式，扩展名和标签格式都以实际格式为准
+            file_extension = self._settle_file_extension(resolved)
 
-            # 添加元数据
-            file_extension = '.flac' if task.quality == 'lossless' else '.mp3'
-            add_metadata(file_path, clean_song_name, clean_artists, clean_album, cover_url, file_extension)
+            # 添加元数据后再重命名，正式文件存在即表示下载完整
+            if tagger is None or not tagger.applied:
+                add_metadata(resolved.part_path, resolved.song_name, resolved.artists, resolved.album,
+                             resolved.cover_url, file_extension, resolved.lyrics or '')
+            os.replace(resolved.part_path, resolved.file_path)
+            if tagger is not None:
+                tagger.discard()
+            self._record_downloaded_file(resolved)
 
             # 下载歌词
             if task.download_lyrics:
-                self._download_lyrics(song_id, clean_song_name, clean_artists, task.download_dir, cookies)
+                self._download_lyrics(resolved.song_id, resolved.song_name, resolved.artists,
+                                      task.download_dir, resolved.lyrics)
 
             # 更新任务状态为完成
             self.progress_manager.update_task_status(task.id, "completed")
-            logging.info(f"成功下载：{song_name}")
+            logging.info(f"成功下载：{task.track['name']}")
 
         except Exception as e:
             self.progress_manager.update_task_status(task.id, "failed", str(e))
             logging.error(f"下载 {task.track['name']} 失败：{str(e)}")
 
-    def _download_file_with_progress(self, url: str, file_path: str, task_id: str):
-        """带进度更新的文件下载"""
-        session = requests.Session()
-        retries = requests.adapters.Retry(total=3, backoff_factor=1, status_forcelist=[429, 500, 502, 503, 504])
-        session.mount('http://', requests.adapters.HTTPAdapter(max_retries=retries))
-        session.mount('https://', requests.adapters.HTTPAdapter(max_retries=retries))
+    def _settle_file_extension(self, resolved: ResolvedTask) -> str:
+        """
+        按 .part 文件开头的标识确定容器格式并返回扩展名
+        与推测的扩展名不一致时（如 Hi-Res、母带返回 FLAC）改用实际格式的文件名，无法识别时保留原扩展名
+        """
+        base, file_extension = os.path.splitext(resolved.file_path)
+        detected = read_audio_extension(resolved.part_path)
+        if detected is None or detected == file_extension:
+            return file_extension
+        logging.info(f"数据格式为 {detected}，改用对应的扩展名：{resolved.file_path}")
+        resolved.file_path = base + detected
+        resolved.task.file_path = resolved.file_path
+        return detected
 
-        response = session.get(url, stream=True, timeout=10)
-        response.raise_for_status()
+    def _record_downloaded_file(self, resolved: ResolvedTask):
+        """记录下载完成的文件，再次下载时按记录检查是否完整"""
+        size = resolved.url_info.get('size') or 0
+        local = local_audio_size(resolved.file_path) if size else None
+        if local is not None:
+            get_downloaded_files().put(resolved.file_path, size, *local)
 
-        total_size = int(response.headers.get('content-length', 0))
-        downloaded_size = 0
-        start_time = time.time()
+    def release_task(self, task: DownloadTask):
+        """任务离开下载流程，释放其控制令牌"""
+        self.task_controls.pop(task.id, None)
 
-        with open(file_path, 'wb') as f:
-            for chunk in response.iter_content(chunk_size=8192):
-                if chunk and self.is_downloading and not self.is_paused:
-                    f.write(chunk)
+    def _download_file_with_progress(self, url: str, part_path: str, task_id: str,
+                                     url_info: Optional[Dict[str, Any]] = None,
+                                     tagger: Optional[InlineTagger] = None) -> bool:
+        """
+        带进度更新的文件下载，写入 .part 文件
+        连接中断或数据不完整时按已下载的长度续传，返回是否下载完整，取消时返回 False
+        大文件（url_info 中的 size 超过 SEGMENT_THRESHOLD）分段并发下载
+        完成后按 url_info 中的 md5 和大小校验，校验失败时删除 .part 文件重新下载
+        提供 tagger 时服务端数据经 tagger 写入文件，头部标签区在传输中替换为合并后的标签
+        """
+        for attempt in range(VERIFY_MAX_RETRIES + 1):
+            try:
+                return self._download_and_verify(url, part_path, task_id, url_info, tagger)
+            except IntegrityError as e:
+                if attempt == VERIFY_MAX_RETRIES:
+                    raise
+                logging.warning(f"下载校验失败，重新下载：{part_path}，错误：{str(e)}")
+        return False
+
+    def _download_and_verify(self, url: str, part_path: str, task_id: str,
+                             url_info: Optional[Dict[str, Any]] = None,
+                             tagger: Optional[InlineTagger] = None) -> bool:
+        """下载一次并校验，校验失败时删除 .part 文件并抛出 IntegrityError"""
+        try:
+            return self._download_once(url, part_path, task_id, url_info, tagger)
+        except IntegrityError:
+            if tagger is not None:
+                tagger.reset()
+            raise
+
+    def _download_once(self, url: str, part_path: str, task_id: str, url_info: Optional[Dict[str, Any]],
+                       tagger: Optional[InlineTagger]) -> bool:
+        """下载一次并校验，大文件分段下载，其余单连接下载并在中断时续传"""
+        size = (url_info or {}).get('size') or 0
+        if self._use_segments(part_path, size):
+            try:
+                return self._download_segmented(url, part_path, task_id, size, url_info.get('md5') or '', tagger)
+            except RangeNotSupportedError:
+                self._segments_unsupported(part_path, size, tagger)
+
+        # 校验器跨续传保留，断点之前已计入摘要的数据不再读取
+        verifier = StreamVerifier.from_url_info(url_info)
+        control = self._control(task_id)
+        for attempt in range(RESUME_MAX_RETRIES + 1):
+            try:
+                if not self._resume_download(url, part_path, task_id, verifier, tagger):
+                    return False
+                break
+            except (requests.ConnectionError, requests.exceptions.ChunkedEncodingError) as e:
+                if control.cancelled:
+                    return False
+                if attempt == RESUME_MAX_RETRIES:
+                    raise
+                logging.info(f"下载中断，{RESUME_BACKOFF * (attempt + 1):.0f} 秒后从断点续传：{part_path}，错误：{str(e)}")
+                if not control.sleep(RESUME_BACKOFF * (attempt + 1)):
+                    return False
+
+        self._verify_part(verifier, part_path)
+        return True
+
+    def _use_segments(self, part_path: str, size: int) -> bool:
+        """大文件分段下载；单连接下载留下的 .part 文件（没有分段状态）继续单连接续传"""
+        return size >= SEGMENT_THRESHOLD and (os.path.exists(build_state_path(part_path)) or not os.path.exists(part_path))
+
+    def _segments_unsupported(self, part_path: str, size: int, tagger: Optional[InlineTagger]):
+        """服务端不支持分段下载：删除分段状态和 .part 文件，改为单连接从头下载"""
+        logging.info(f"服务端不支持分段下载，改为单连接下载：{part_path}")
+        SegmentPlan(part_path, size, []).discard(keep_part=False)
+        if tagger is not None:
+            tagger.reset()
+
+    def _verify_part(self, verifier: StreamVerifier, part_path: str):
+        """校验单连接下载的 .part 文件，失败时删除文件并抛出 IntegrityError"""
+        try:
+            verifier.verify()
+        except IntegrityError:
+            os.remove(part_path)
+            raise
+
+    def _resume_start(self, part_path: str, tagger: Optional[InlineTagger]) -> Tuple[int, bool, Optional[Dict[str, str]]]:
+        """
+        续传的起始位置：返回 (服务端位置, 能否从文件补读已下载的数据, 请求头)
+        提供 tagger 时文件长度与服务端位置相差标签区长度的变化，由 tagger 换算续传位置
+        """
+        offset = os.path.getsize(part_path) if os.path.exists(part_path) else 0
+        if tagger is not None:
+            offset = tagger.resume_offset(offset)
+        # 文件头部已替换为合并后的标签时无法从文件补读服务端数据
+        readable = tagger is None or not tagger.applied
+        headers = {'Range': f"bytes={offset}-"} if offset else None
+        return offset, readable, headers
+
+    def _resume_exhausted(self, content_range: Optional[str], part_path: str, offset: int,
+                          verifier: StreamVerifier, readable: bool) -> bool:
+        """
+        处理 416（请求范围超出文件大小）：.part 已完整时返回 True，
+        与当前文件不一致时删除 .part 并返回 False，由调用方从头下载
+        """
+        total_size = parse_content_range(content_range)[2]
+        if total_size == offset:
+            verifier.seek(part_path, offset, readable)
+            return True
+        os.remove(part_path)
+        return False
+
+    def _resume_range(self, status: int, content_length: int, content_range: Optional[str], offset: int,
+                      tagger: Optional[InlineTagger]) -> Tuple[int, int]:
+        """按响应确定实际的起始位置和文件总大小，服务端不支持 Range 时从头下载"""
+        start, _, total_size = parse_content_range(content_range)
+        if status != 206 or start != offset:
+            if tagger is not None:
+                tagger.reset()
+            return 0, content_length
+        if total_size is None:
+            total_size = offset + content_length
+        return offset, total_size
+
+    def _resume_download(self, url: str, part_path: str, task_id: str,
+                         verifier: Optional[StreamVerifier] = None, tagger: Optional[InlineTagger] = None) -> bool:
+        """
+        从 .part 文件的当前长度开始请求剩余部分并追加写入，写入的数据同时计入 verifier
+        提供 tagger 时文件长度与服务端位置相差标签区长度的变化，由 tagger 换算续传位置
+        """
+        control = self._control(task_id)
+        verifier = verifier or StreamVerifier()
+        offset, readable, headers = self._resume_start(part_path, tagger)
+
+        # 取消时从调用 cancel 的线程关闭 socket，阻塞中的读取立即返回
+        with get_client().get(url, stream=True, timeout=10, headers=headers) as response, \
+                control.on_cancel(lambda: abort_response(response)):
+            if response.status_code == 416:
+                if self._resume_exhausted(response.headers.get('content-range'), part_path, offset, verifier, readable):
+                    return True
+                return self._resume_download(url, part_path, task_id, verifier, tagger)
+            response.raise_for_status()
+
+            offset, total_size = self._resume_range(response.status_code, int(response.headers.get('content-length', 0)),
+                                                    response.headers.get('content-range'), offset, tagger)
+            verifier.seek(part_path, offset, readable)
+
+            downloaded_size = offset
+            start_time = time.time()
+            reporter = ProgressReporter(self.progress_manager, task_id, total_size, offset)
+
+            # 等待响应期间已取消时不创建或截断 .part 文件
+            if control.cancelled:
+                return False
+            # 数据读入复用缓冲区后直接写入文件，进度按固定间隔汇报
+            with open(part_path, 'ab' if offset else 'wb') as f, StreamReader(response) as reader:
+                while True:
+                    chunk = reader.read(self.bandwidth.read_limit())
+                    if not chunk:
+                        break
+                    # 暂停时阻塞等待，继续后写入已读取的数据块
+                    if not control.wait_if_paused():
+                        return False
+
+                    if tagger is None:
+                        f.write(chunk)
+                    else:
+                        tagger.write(f, chunk)
+                    verifier.update(chunk)
                     downloaded_size += len(chunk)
+                    reporter.update(downloaded_size)
+                    self.transfer_stats.add_bytes(len(chunk))
+                    delay = self.bandwidth.reserve(len(chunk))
+                    if delay and not control.sleep(delay):
+                        return False
+                if tagger is not None and downloaded_size >= total_size:
+                    tagger.finish(f)
+            reporter.update(downloaded_size, force=True)
+
+        if control.cancelled:
+            return False
+        self.throughput.update(downloaded_size - offset, time.time() - start_time)
+        if total_size and downloaded_size < total_size:
+            raise requests.ConnectionError(f"下载不完整：{downloaded_size}/{total_size} 字节")
+        return True
+
+    def _download_segmented(self, url: str, part_path: str, task_id: str, size: int, md5: str,
+                            tagger: Optional[InlineTagger] = None) -> bool:
+        """
+        分段并发下载到预分配的 .part 文件，完成后校验大小和 MD5
+        提供 tagger 时先单独下载并写入头部标签区，之后的数据再按分段下载
+        """
+        if self._control(task_id).cancelled:
+            return False
+        plan = self._load_segment_plan(part_path, size, tagger)
+        if plan is None:
+            start = 0
+            if tagger is not None:
+                start = self._fetch_head(url, part_path, task_id, tagger)
+                if start is None:
+                    return False
+            plan = self._create_segment_plan(part_path, size, start, tagger)
+        workers = self._segment_workers(plan)
+        reporter = ProgressReporter(self.progress_manager, task_id, size, plan.downloaded)
+
+        def worker() -> bool:
+            seg = plan.next_segment()
+            while seg is not None:
+                try:
+                    if not self._download_segment(url, plan, seg, task_id, reporter):
+                        return False
+                finally:
+                    plan.release(seg)
+                seg = plan.next_segment()
+            return True
+
+        try:
+            with ThreadPoolExecutor(max_workers=workers) as executor:
+                results = [future.result() for future in [executor.submit(worker) for _ in range(workers)]]
+        finally:
+            plan.save()
+
+        if not all(results):
+            return False
+        self._verify_segments(plan, md5, tagger)
+        return True
+
+    def _load_segment_plan(self, part_path: str, size: int, tagger: Optional[InlineTagger]) -> Optional[SegmentPlan]:
+        """读取可续传的分段计划；没有计划或与标签状态不一致时返回 None，需要重新下载头部并规划"""
+        plan = SegmentPlan.load(part_path, size)
+        if tagger is not None and plan is not None:
+            tagger.load_state()
+            if plan.file_offset != tagger.delta:
+                plan = None
+        if plan is None and tagger is not None:
+            tagger.reset()
+        return plan
+
+    def _create_segment_plan(self, part_path: str, size: int, start: int,
+                             tagger: Optional[InlineTagger]) -> SegmentPlan:
+        """按单连接速度规划分段，start 之前的服务端数据已随头部标签区写入文件"""
+        return SegmentPlan.create(part_path, size, self.throughput.segment_count(size), start,
+                                  tagger.delta if tagger is not None else 0)
+
+    def _segment_workers(self, plan: SegmentPlan) -> int:
+        """分段下载的连接数"""
+        workers = min(self.throughput.segment_count(plan.size), max(plan.pending_count, 1))
+        logging.info(f"分段下载：{plan.part_path}，{workers} 个连接")
+        return workers
+
+    def _verify_segments(self, plan: SegmentPlan, md5: str, tagger: Optional[InlineTagger]):
+        """校验分段下载的文件，失败时删除 .part 文件并抛出 IntegrityError"""
+        head = None
+        if tagger is not None and tagger.applied:
+            # 用服务端原始的标签区代替文件头部计算 MD5，续传时原始数据未知，只校验大小
+            head = tagger.raw_head
+            if head is None:
+                md5 = ''
+        if not plan.verify(md5, head):
+            plan.discard(keep_part=False)
+            raise IntegrityError(f"分段下载校验失败：{plan.part_path}")
+        plan.discard()
+
+    def _fetch_tag_region_size(self, url: str, file_extension: str, task_id: str) -> Optional[int]:
+        """
+        只请求服务端文件的前 TAG_PROBE_SIZE 字节，返回其标签区的长度
+        失败、取消或标签区超出该范围时返回 None
+        """
+        control = self._control(task_id)
+        head = b''
+        try:
+            with get_client().get(url, stream=True, timeout=10, headers={'Range': f"bytes=0-{TAG_PROBE_SIZE - 1}"}) \
+                    as response, control.on_cancel(lambda: abort_response(response)):
+                response.raise_for_status()
+                with StreamReader(response) as reader:
+                    # 服务端不支持 Range 时返回整个文件，同样只读取前 TAG_PROBE_SIZE 字节
+                    while not control.cancelled and len(head) < TAG_PROBE_SIZE:
+                        size = tag_region_size(head, file_extension)
+                        if size is not None:
+                            return size
+                        chunk = reader.read(TAG_PROBE_SIZE - len(head))
+                        if not chunk:
+                            break
+                        head += bytes(chunk)
+                return tag_region_size(head, file_extension)
+        except requests.RequestException as e:
+            logging.warning(f"获取文件头部失败：{url}，错误：{str(e)}")
+        return None
+
+    def _fetch_head(self, url: str, part_path: str, task_id: str, tagger: InlineTagger) -> Optional[int]:
+        """下载文件头部直到 tagger 写入标签区，返回已下载的服务端字节数，取消时返回 None"""
+        control = self._control(task_id)
+        for attempt in range(RESUME_MAX_RETRIES + 1):
+            try:
+                with get_client().get(url, stream=True, timeout=10) as response, \
+                        control.on_cancel(lambda: abort_response(response)):
+                    response.raise_for_status()
+                    if control.cancelled:
+                        return None
+                    consumed = 0
+                    with open(part_path, 'wb') as f, StreamReader(response) as reader:
+                        while not tagger.done:
+                            chunk = reader.read()
+                            if not chunk:
+                                tagger.finish(f)
+                                break
+                            tagger.write(f, chunk)
+                            consumed += len(chunk)
+                return None if control.cancelled else consumed
+            except (requests.ConnectionError, requests.exceptions.ChunkedEncodingError) as e:
+                if control.cancelled:
+                    return None
+                if attempt == RESUME_MAX_RETRIES:
+                    raise
+                tagger.reset()
+                logging.info(f"下载文件头部中断，重试：{part_path}，错误：{str(e)}")
+                if not control.sleep(RESUME_BACKOFF * (attempt + 1)):
+                    return None
+        return None
+
+    def _download_segment(self, url: str, plan: SegmentPlan, seg: Dict[str, Any], task_id: str,
+                          reporter: ProgressReporter) -> bool:
+        """下载单个分段，连接中断时从分段当前位置重试，取消时返回 False"""
+        control = self._control(task_id)
+        for attempt in range(RESUME_MAX_RETRIES + 1):
+            try:
+                return self._fetch_segment(url, plan, seg, task_id, reporter)
+            except (requests.ConnectionError, requests.exceptions.ChunkedEncodingError) as e:
+                if control.cancelled:
+                    return False
+                if attempt == RESUME_MAX_RETRIES:
+                    raise
+                logging.info(f"分段下载中断，重试：{plan.part_path} [{seg['pos']}-{seg['end']}]，错误：{str(e)}")
+                if not control.sleep(RESUME_BACKOFF * (attempt + 1)):
+                    return False
+        return False
+
+    def _fetch_segment(self, url: str, plan: SegmentPlan, seg: Dict[str, Any], task_id: str,
+                       reporter: ProgressReporter) -> bool:
+        """请求分段剩余的字节范围并写入对应位置，分段被拆分后只写到新的结束位置"""
+        control = self._control(task_id)
+        offset = seg['pos']
+        headers = {'Range': f"bytes={offset}-{seg['end']}"}
+        fetch_start = time.time()
+
+        with get_client().get(url, stream=True, timeout=10, headers=headers) as response, \
+                control.on_cancel(lambda: abort_response(response)):
+            response.raise_for_status()
+            if response.status_code != 206 or parse_content_range(response.headers.get('content-range'))[0] != offset:
+                raise RangeNotSupportedError(url)
+
+            with open(plan.part_path, 'r+b') as f, StreamReader(response) as reader:
+                f.seek(offset + plan.file_offset)
+                while not plan.is_done(seg):
+                    # 分段可能已被其他连接拆分，只读取到当前的结束位置
+                    chunk = reader.read(plan.clip(seg, self.bandwidth.read_limit() or TRANSFER_MAX_CHUNK))
+                    if not chunk:
+                        break
+                    if not control.wait_if_paused():
+                        return False
+
+                    f.write(chunk)
+                    plan.advance(seg, len(chunk))
+                    if reporter.due():
+                        reporter.update(plan.downloaded)
+                    self.transfer_stats.add_bytes(len(chunk))
+                    delay = self.bandwidth.reserve(len(chunk))
+                    if delay and not control.sleep(delay):
+                        return False
+
+        if control.cancelled:
+            return False
+        self.throughput.update(seg['pos'] - offset, time.time() - fetch_start)
+        if not plan.is_done(seg):
+            raise requests.ConnectionError(f"分段不完整：{seg['pos']}/{seg['end'] + 1}")
+        return True
+
+    def _fetch_lyrics(self, song_id: str, song_name: str) -> str:
+        """获取歌词文本，失败时返回空字符串"""
+        try:
+            return lyric_v1(song_id).get('lrc', {}).get('lyric', '')
+        except Exception as lyric_error:
+            logging.warning(f"获取歌词失败：{song_name}，错误：{str(lyric_error)}")
+            return ''
 
-                    # 计算进度和速度
-                    if total_size > 0:
-                        progress = downloaded_size / total_size
-                        elapsed = time.time() - start_time
-                        speed = downloaded_size / elapsed / 1024 if elapsed > 0 else 0
-
-                        # 更新任务进度
-                        self.progress_manager.update_task_progress(task_id, progress, speed)
-
-                elif self.is_paused:
-                    # 暂停时等待
-                    while self.is_paused and self.is_downloading:
-                        time.sleep(0.1)
-                elif not self.is_downloading:
-                    # 取消下载
-                    break
-
-    def _download_lyrics(self, song_id: str, song_name: str, artists: str, download_dir: str, cookies: Dict[str, str]):
-        """下载歌词"""
+    def _download_lyrics(self, song_id: str, song_name: str, artists: str, download_dir: str,
+                         lyric: Optional[str] = None):
+        """下载歌词，解析阶段已获取的歌词通过 lyric 传入"""
         try:
-            lyric_data = lyric_v1(song_id, cookies)
-            lyric = lyric_data.get('lrc', {}).get('lyric', '')
+            if lyric is None:
+                lyric = lyric_v1(song_id).get('lrc', {}).get('lyric', '')
             if lyric:
                 lyric_path = build_lyric_path(download_dir, song_name, artists)
                 with open(lyric_path, 'w', encoding='utf-8') as f:
@@ -0,0 +1,224 @@
+"""
+传输中写入标签
+下载开始时先收下服务端文件头部的标签区（MP3 的 ID3v2、FLAC 的元数据块），合并标题、艺术家、专辑、封面和歌词后
+写入 .part 文件，其后的音频数据原样追加，文件只写一遍，不再在下载完成后重写整个文件
+"""
+import io
+import json
+import logging
+import os
+from concurrent.futures import Future
+from typing import Optional
+
+from mutagen.flac import FLAC
+from mutagen.id3 import ID3
+
+from core.metadata import apply_flac_tags, apply_id3_tags
+
+
+def detect_audio_extension(head: bytes) -> Optional[str]:
+    """
+    按数据开头的标识判断容器格式：fLaC 为 FLAC，ID3 标签或 MPEG 帧同步为 MP3
+    数据不足 4 字节或无法识别时返回 None
+    """
+    if len(head) < 4:
+        return None
+    if head[:4] == b'fLaC':
+        return '.flac'
+    if head[:3] == b'ID3' or (head[0] == 0xFF and head[1] & 0xE0 == 0xE0):
+        return '.mp3'
+    return None
+
+
+def read_audio_extension(file_path: str) -> Optional[str]:
+    """按文件开头的标识判断容器格式，无法识别或读取失败时返回 None"""
+    try:
+        with open(file_path, 'rb') as f:
+            return detect_audio_extension(f.read(4))
+    except OSError:
+        return None
+
+
+def tag_region_size(head: bytes, file_extension: str) -> Optional[int]:
+    """
+    文件头部标签区（MP3 的 ID3v2、FLAC 的元数据块）的长度
+    head 为文件开头的数据，不足以判断时返回 None，没有标签区或格式不符返回 0
+    """
+    if file_extension == '.flac':
+        if len(head) < 4:
+            return None
+        if head[:4] != b'fLaC':
+            return 0
+        pos = 4
+        while pos + 4 <= len(head):
+            last = head[pos] & 0x80
+            pos += 4 + int.from_bytes(head[pos + 1:pos + 4], 'big')
+            if last:
+                return pos
+        return None
+
+    if len(head) < 10:
+        return None
+    if head[:3] != b'ID3':
+        return 0
+    size = (head[6] << 21) | (head[7] << 14) | (head[8] << 7) | head[9]
+    return 10 + size + (10 if head[5] & 0x10 else 0)
+
+
+def read_tag_region_size(file_path: str, file_extension: str, chunk_size: int = 64 * 1024) -> Optional[int]:
+    """读取本地文件头部标签区的长度，文件不完整无法判断时返回 None"""
+    head = b''
+    with open(file_path, 'rb') as f:
+        while True:
+            size = tag_region_size(head, file_extension)
+            if size is not None:
+                return size
+            block = f.read(chunk_size)
+            if not block:
+                return None
+            head += block
+
+
+def build_tag_state_path(part_path: str) -> str:
+    """传输中写入标签的状态文件路径，记录文件与服务端数据的偏移，续传时使用"""
+    return f"{part_path}.tags"
+
+
+class InlineTagger:
+    """
+    把服务端数据流转换为带标签的文件内容
+    write 按顺序接收服务端数据：头部标签区收齐前只缓存，收齐后写入合并后的标签区，之后的数据直接写入；
+    文件中的位置 = 服务端位置 + delta（标签区收齐后确定）
+    tag_data 为后台获取 (封面数据, 歌词) 的 Future，标签区收齐时才等待结果
+    file_extension 为按链接类型或音质推测的格式，收到数据开头后按其中的标识改为实际格式
+    """
+
+    def __init__(self, part_path: str, file_extension: str, title: str, artist: str, album: str,
+                 tag_data: Future):
+        self.part_path = part_path
+        self.state_path = build_tag_state_path(part_path)
+        self.file_extension = file_extension
+        self.title = title
+        self.artist = artist
+        self.album = album
+        self.tag_data = tag_data
+        self.head = bytearray()
+        self.raw_head: Optional[bytes] = None  # 服务端原始标签区，续传时未知
+        self.done = False  # 标签区已写入
+        self.applied = False  # 标签已写入文件，下载完成后无需再写
+        self.delta = 0
+        self.head_length = 0  # 文件中标签区的长度
+
+    def reset(self):
+        """从头开始写入文件"""
+        self.head = bytearray()
+        self.raw_head = None
+        self.done = False
+        self.applied = False
+        self.delta = 0
+        self.head_length = 0
+        self.discard()
+
+    def discard(self):
+        """删除状态文件"""
+        try:
+            os.remove(self.state_path)
+        except FileNotFoundError:
+            pass
+
+    def load_state(self) -> bool:
+        """
+        续传前读取状态，返回是否读取成功
+        没有状态文件说明 .part 文件由未写入标签的下载产生，按原样续传，下载完成后再写标签
+        """
+        try:
+            with open(self.state_path, 'r', encoding='utf-8') as f:
+                state = json.load(f)
+            applied, delta, head_length = state['applied'], state['delta'], state['head_length']
+        except (OSError, ValueError, KeyError):
+            applied, delta, head_length = False, 0, 0
+            loaded = False
+        else:
+            loaded = True
+        self.head = bytearray()
+        self.raw_head = None
+        self.done = True
+        self.applied = applied
+        self.delta = delta
+        self.head_length = head_length
+        return loaded
+
+    def resume_offset(self, file_size: int) -> int:
+        """按 .part 文件长度返回续传的服务端位置，标签区尚未完整写入文件时返回 0（从头下载）"""
+        if not self.done and file_size:
+            self.load_state()
+        if not self.done or file_size < self.head_length or file_size == 0:
+            self.reset()
+            return 0
+        return file_size - self.delta
+
+    def _save_state(self):
+        try:
+            with open(self.state_path, 'w', encoding='utf-8') as f:
+                json.dump({'applied': self.applied, 'delta': self.delta, 'head_length': self.head_length}, f)
+        except OSError as e:
+            logging.warning(f"保存标签状态失败：{self.state_path}，错误：{str(e)}")
+
+    def _head_size(self) -> Optional[int]:
+        """服务端标签区的长度，数据不足以判断时返回 None，格式不符返回 0（不写入标签）"""
+        return tag_region_size(self.head, self.file_extension)
+
+    def _render(self, raw_head: bytes) -> bytes:
+        """合并标签，返回新的标签区"""
+        cover_data, lyrics = self.tag_data.result()
+        if self.file_extension == '.flac':
+            audio = FLAC(io.BytesIO(raw_head))
+            apply_flac_tags(audio, self.title, self.artist, self.album, cover_data, lyrics or '')
+        else:
+            audio = ID3(io.BytesIO(raw_head)) if raw_head else ID3()
+            apply_id3_tags(audio, self.title, self.artist, self.album, cover_data, lyrics or '')
+        out = io.BytesIO(raw_head)
+        audio.save(out)
+        return out.getvalue()
+
+    def write(self, f, data):
+        """写入一块服务端数据"""
+        if self.done:
+            f.write(data)
+            return
+        self.head += data
+        detected = detect_audio_extension(self.head)
+        if detected is not None and detected != self.file_extension:
+            logging.info(f"数据格式为 {detected}，按实际格式写入标签：{self.part_path}")
+            self.file_extension = detected
+        size = self._head_size()
+        if size is None or len(self.head) < size:
+            return
+        self._flush_head(f, size)
+
+    def finish(self, f):
+        """数据流完整结束但标签区仍未收齐（数据格式异常）时原样写入，下载完成后再写标签"""
+        if not self.done:
+            self._flush_head(f, len(self.head), render=False)
+
+    def _flush_head(self, f, size: int, render: bool = True):
+        raw_head = bytes(self.head[:size])
+        rest = self.head[size:]
+        # 没有 ID3 的 MP3 直接在最前面插入标签；不是 FLAC 格式的数据原样写入，下载完成后再写标签
+        new_head = raw_head
+        self.applied = False
+        if render and (size or self.file_extension != '.flac'):
+            try:
+                new_head = self._render(raw_head)
+                self.applied = True
+            except Exception as e:
+                logging.warning(f"生成标签失败，下载完成后再写入：{self.part_path}，错误：{str(e)}")
+        self.raw_head = raw_head
+        self.delta = len(new_head) - size
+        self.head_length = len(new_head)
+        self.head = bytearray()
+        self.done = True
+        # 先保存状态再写入：异常退出时文件长度不足 head_length，续传会从头下载
+        self._save_state()
+        f.write(new_head)
+        f.write(rest)
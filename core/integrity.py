@@ -0,0 +1,99 @@
+"""
+下载完整性校验
+按 player/url/v1 返回的 md5 和 size 校验下载内容，md5 在数据写入时增量计算，下载完成后无需再读一遍文件
+"""
+import hashlib
+import os
+from typing import Any, Dict, Optional, Tuple
+
+from core.inline_tags import read_tag_region_size
+
+VERIFY_MAX_RETRIES = 1  # 校验失败后重新下载的次数
+VERIFY_READ_CHUNK = 1024 * 1024
+
+
+class IntegrityError(IOError):
+    """下载内容与服务端提供的 md5 或大小不一致"""
+
+
+class StreamVerifier:
+    """
+    增量校验器：update 按文件顺序接收写入的数据
+    续传时由 seek 把摘要对齐到断点，只补读尚未计入摘要的部分；接口未返回 md5 时只校验大小
+    """
+
+    def __init__(self, md5: str = '', size: int = 0):
+        self.expected_md5 = (md5 or '').lower()
+        self.expected_size = size or 0
+        self.digest = hashlib.md5() if self.expected_md5 else None
+        self.offset = 0  # 已计入摘要的字节数
+
+    @classmethod
+    def from_url_info(cls, url_info: Optional[Dict[str, Any]]) -> 'StreamVerifier':
+        url_info = url_info or {}
+        return cls(url_info.get('md5') or '', url_info.get('size') or 0)
+
+    def seek(self, part_path: str, offset: int, readable: bool = True):
+        """
+        下一次 update 的数据从 offset 开始写入：断点回退时重新计算，前进时补读文件中缺少的部分
+        readable 为 False 表示文件内容与服务端数据不同（已写入标签），无法补读时放弃 md5，只校验大小
+        """
+        if self.digest is None:
+            self.offset = offset
+            return
+        if offset < self.offset:
+            self.digest = hashlib.md5()
+            self.offset = 0
+        if offset > self.offset and not readable:
+            self.digest = None
+        elif offset > self.offset:
+            with open(part_path, 'rb') as f:
+                f.seek(self.offset)
+                while self.offset < offset:
+                    block = f.read(min(VERIFY_READ_CHUNK, offset - self.offset))
+                    if not block:
+                        break
+                    self.digest.update(block)
+                    self.offset += len(block)
+        self.offset = offset
+
+    def update(self, data):
+        """计入新写入的数据块"""
+        if self.digest is not None:
+            self.digest.update(data)
+        self.offset += len(data)
+
+    def verify(self):
+        """校验已写入的数据，不一致时抛出 IntegrityError"""
+        if self.expected_size and self.offset != self.expected_size:
+            raise IntegrityError(f"文件大小不一致：{self.offset}/{self.expected_size} 字节")
+        if self.digest is not None and self.digest.hexdigest() != self.expected_md5:
+            raise IntegrityError("MD5 校验失败")
+
+
+def local_audio_size(file_path: str) -> Optional[Tuple[int, int]]:
+    """返回正式文件的 (去掉标签区后的长度, 标签区长度)，无法判断时返回 None"""
+    file_extension = os.path.splitext(file_path)[1].lower()
+    try:
+        tag_size = read_tag_region_size(file_path, file_extension)
+        if tag_size is None:
+            return None
+        return os.path.getsize(file_path) - tag_size, tag_size
+    except OSError:
+        return None
+
+
+def is_existing_file_complete(file_path: str, url_info: Optional[Dict[str, Any]],
+                              audio_size: Optional[int]) -> bool:
+    """
+    检查已存在的正式文件是否完整
+    写入标签只替换文件头部的标签区（ID3v2、FLAC 元数据块），其后的音频数据与服务端一致；
+    写入标签后整个文件的 md5 已与服务端不同，因此比较去掉标签区后的长度：
+    正式文件大小 - 本地标签区 == audio_size（下载完成时记录的长度，或服务端大小 - 服务端标签区）
+    接口未返回大小或 audio_size 未知（获取服务端文件头部失败）时无法判断，视为完整，保留已有文件
+    """
+    size = (url_info or {}).get('size') or 0
+    if not size or audio_size is None:
+        return os.path.exists(file_path)
+    local = local_audio_size(file_path)
+    return local is not None and local[0] == audio_size
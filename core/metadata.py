@@ -1,76 +1,195 @@
 """
 元数据处理模块
+封面按 picUrl 缓存，同一专辑只下载和缩放一次；封面缩放和标签写入可选交给进程池执行，
+只传递文件路径和封面数据，批量写入大量文件时不受 GIL 限制
 """
 import io
 import logging
-import requests
+import os
+import threading
+from concurrent.futures import Future, ProcessPoolExecutor, ThreadPoolExecutor
+from typing import Callable, Optional
 from PIL import Image
 from mutagen.mp3 import MP3
-from mutagen.easyid3 import EasyID3
-from mutagen.id3 import ID3, APIC
-from mutagen.flac import FLAC
+from mutagen.id3 import APIC, ID3, TALB, TIT2, TPE1, USLT
+from mutagen.flac import FLAC, Picture
+from api.http_client import get_client
+from managers.cover_cache import get_cover_cache
+from utils.file_utils import build_cover_url
 
+COVER_SIZE = 300  # 嵌入的封面边长
 
-def add_metadata(file_path: str, title: str, artist: str, album: str, cover_url: str, file_extension: str):
+# 标签写入进程数，设置 DOWNLIST_METADATA_PROCESSES 环境变量或调用 configure_metadata_processes 启用，0 表示在调用线程中执行
+METADATA_PROCESSES_ENV = 'DOWNLIST_METADATA_PROCESSES'
+_metadata_processes = int(os.environ.get(METADATA_PROCESSES_ENV) or 0)
+_executor: Optional[ProcessPoolExecutor] = None
+_executor_lock = threading.Lock()
+
+METADATA_LOADER_THREADS = 4  # 传输中写入标签时，后台获取封面和歌词的线程数
+_loader: Optional[ThreadPoolExecutor] = None
+_loader_lock = threading.Lock()
+
+
+def configure_metadata_processes(processes: int):
+    """设置标签写入进程数，0 表示不使用进程池"""
+    global _metadata_processes, _executor
+    with _executor_lock:
+        _metadata_processes = max(0, processes)
+        if _executor is not None:
+            _executor.shutdown(wait=False)
+            _executor = None
+
+
+def get_metadata_concurrency() -> int:
+    """标签写入进程数，未启用进程池时返回 0"""
+    return _metadata_processes
+
+
+def _get_executor() -> Optional[ProcessPoolExecutor]:
+    global _executor
+    if not _metadata_processes:
+        return None
+    if _executor is None:
+        with _executor_lock:
+            if _executor is None and _metadata_processes:
+                _executor = ProcessPoolExecutor(max_workers=_metadata_processes)
+    return _executor
+
+
+def start_metadata_processes():
+    """预先启动标签写入进程池的全部子进程，未启用进程池时不做任何事"""
+    executor = _get_executor()
+    if executor is not None:
+        list(executor.map(abs, range(_metadata_processes)))
+
+
+def submit_metadata_load(func: Callable, *args) -> Future:
+    """在后台线程中获取写入标签所需的数据（封面、歌词），封面的缩放仍按配置交给进程池"""
+    global _loader
+    if _loader is None:
+        with _loader_lock:
+            if _loader is None:
+                _loader = ThreadPoolExecutor(max_workers=METADATA_LOADER_THREADS, thread_name_prefix="标签数据")
+    return _loader.submit(func, *args)
+
+
+def add_metadata(file_path: str, title: str, artist: str, album: str, cover_url: str, file_extension: str,
+                 lyrics: str = ''):
     """为音频文件添加元数据"""
     try:
-        if file_extension == '.flac':
-            _add_flac_metadata(file_path, title, artist, album, cover_url)
-        else:  # MP3 格式
-            _add_mp3_metadata(file_path, title, artist, album, cover_url)
+        cover_data = load_cover(cover_url) if cover_url else None
+        write_metadata(file_path, title, artist, album, cover_data, file_extension, lyrics)
         logging.info(f"成功嵌入元数据：{file_path}")
     except Exception as e:
         logging.error(f"嵌入元数据失败：{file_path}，错误：{str(e)}")
 
 
-def _add_flac_metadata(file_path: str, title: str, artist: str, album: str, cover_url: str):
+def _run_in_backend(func, *args):
+    """启用进程池时在子进程中执行 func 并等待结果，否则在调用线程中执行"""
+    executor = _get_executor()
+    if executor is None:
+        return func(*args)
+    return executor.submit(func, *args).result()
+
+
+def write_metadata(file_path: str, title: str, artist: str, album: str, cover_data: Optional[bytes],
+                   file_extension: str, lyrics: str = ''):
+    """写入标签，cover_data 为处理后的封面；音频文件只传递路径，启用进程池时在子进程中执行"""
+    if file_extension == '.flac':
+        _run_in_backend(_add_flac_metadata, file_path, title, artist, album, cover_data, lyrics)
+    else:  # MP3 格式
+        _run_in_backend(_add_mp3_metadata, file_path, title, artist, album, cover_data, lyrics)
+
+
+def resize_cover(cover_data: bytes) -> bytes:
+    """缩放封面为嵌入尺寸，启用进程池时在子进程中执行"""
+    return _run_in_backend(process_cover, cover_data)
+
+
+def load_cover(cover_url: str) -> Optional[bytes]:
+    """获取处理后的封面，同一 picUrl 只下载和缩放一次"""
+    return get_cover_cache().get_or_load(cover_url, _fetch_cover)
+
+
+def _fetch_cover(cover_url: str) -> Optional[bytes]:
+    """按嵌入尺寸向 CDN 请求封面并处理，失败返回 None"""
+    cover_data = _download_cover(build_cover_url(cover_url, COVER_SIZE))
+    if cover_data is None:
+        return None
+    try:
+        return resize_cover(cover_data)
+    except Exception as e:
+        logging.warning(f"处理封面图片失败：{str(e)}")
+        return None
+
+
+def _add_flac_metadata(file_path: str, title: str, artist: str, album: str, cover_data: Optional[bytes],
+                       lyrics: str = ''):
     """为FLAC文件添加元数据"""
     audio = FLAC(file_path)
-    audio['title'] = title
-    audio['artist'] = artist
-    audio['album'] = album
-    
-    if cover_url:
-        cover_data = _download_and_process_cover(cover_url)
-        if cover_data:
-            from mutagen.flac import Picture
-            picture = Picture()
-            picture.type = 3  # 封面图片类型
-            picture.mime = 'image/jpeg'
-            picture.desc = 'Front Cover'
-            picture.data = cover_data
-            audio.add_picture(picture)
-    
+    apply_flac_tags(audio, title, artist, album, cover_data, lyrics)
     audio.save()
 
 
-def _add_mp3_metadata(file_path: str, title: str, artist: str, album: str, cover_url: str):
-    """为MP3文件添加元数据"""
-    audio = MP3(file_path, ID3=EasyID3)
+def _add_mp3_metadata(file_path: str, title: str, artist: str, album: str, cover_data: Optional[bytes],
+                      lyrics: str = ''):
+    """为MP3文件添加元数据，文本标签和封面一次写入"""
+    audio = MP3(file_path)
+    if audio.tags is None:
+        audio.add_tags()
+    apply_id3_tags(audio.tags, title, artist, album, cover_data, lyrics)
+    audio.save()
+
+
+def apply_flac_tags(audio: FLAC, title: str, artist: str, album: str, cover_data: Optional[bytes],
+                    lyrics: str = ''):
+    """在 FLAC 对象上设置标签和封面，由调用方保存"""
     audio['title'] = title
     audio['artist'] = artist
     audio['album'] = album
-    audio.save()
-    
-    if cover_url:
-        cover_data = _download_and_process_cover(cover_url)
-        if cover_data:
-            audio = ID3(file_path)
-            audio.add(APIC(mime='image/jpeg', data=cover_data))
-            audio.save()
+    if lyrics:
+        audio['lyrics'] = lyrics
+
+    if cover_data:
+        picture = Picture()
+        picture.type = 3  # 封面图片类型
+        picture.mime = 'image/jpeg'
+        picture.desc = 'Front Cover'
+        picture.data = cover_data
+        audio.add_picture(picture)
 
 
-def _download_and_process_cover(cover_url: str) -> bytes:
-    """下载并处理封面图片"""
+def apply_id3_tags(tags: ID3, title: str, artist: str, album: str, cover_data: Optional[bytes], lyrics: str = ''):
+    """在 ID3 标签上设置文本帧和封面，由调用方保存"""
+    tags.add(TIT2(encoding=3, text=title))
+    tags.add(TPE1(encoding=3, text=artist))
+    tags.add(TALB(encoding=3, text=album))
+    if lyrics:
+        tags.add(USLT(encoding=3, lang='XXX', desc='', text=lyrics))
+    if cover_data:
+        tags.add(APIC(encoding=3, mime='image/jpeg', type=3, desc='Cover', data=cover_data))
+
+
+def _download_cover(cover_url: str) -> Optional[bytes]:
+    """下载封面图片原始数据"""
     try:
-        cover_response = requests.get(cover_url, timeout=5)
+        cover_response = get_client().get(cover_url, timeout=5)
         cover_response.raise_for_status()
-        image = Image.open(io.BytesIO(cover_response.content))
-        image = image.convert('RGB')  # 将图像转换为 RGB 模式，避免 RGBA 问题
-        image = image.resize((300, 300))
-        img_byte_arr = io.BytesIO()
-        image.save(img_byte_arr, format='JPEG')
-        return img_byte_arr.getvalue()
+        return cover_response.content
     except Exception as e:
-        logging.warning(f"处理封面图片失败：{str(e)}")
+        logging.warning(f"下载封面图片失败：{str(e)}")
         return None
+
+
+def process_cover(cover_data: bytes) -> bytes:
+    """缩放封面图片并编码为 JPEG，已是目标尺寸的 JPEG 原样返回"""
+    image = Image.open(io.BytesIO(cover_data))
+    if image.format == 'JPEG' and image.mode == 'RGB' and image.size == (COVER_SIZE, COVER_SIZE):
+        return cover_data
+    # JPEG 按接近目标的尺寸降采样解码，不必解码原图的全部像素
+    image.draft('RGB', (COVER_SIZE, COVER_SIZE))
+    image = image.convert('RGB')  # 将图像转换为 RGB 模式，避免 RGBA 问题
+    image = image.resize((COVER_SIZE, COVER_SIZE))
+    img_byte_arr = io.BytesIO()
+    image.save(img_byte_arr, format='JPEG')
+    return img_byte_arr.getvalue()
@@ -0,0 +1,313 @@
+"""
+分阶段下载流水线
+解析（歌曲详情、下载链接）、传输、后处理（元数据、歌词）分别由各自的线程执行，阶段之间用有界队列连接：
+传输线程只负责网络读写，写入标签时网络仍在工作；下游处理不过来时上游阻塞在队列上，排队的任务数量有上限
+待解析的任务保存在 TaskScheduler 中，传输线程数（并发下载数）可在下载过程中调整，也可由 ConcurrencyTuner 自动调整；
+任务按优先级领取，流水线结束前可以继续提交任务（例如用户单独点击下载的歌曲），传输失败的任务以低优先级重试一次
+"""
+import heapq
+import itertools
+import logging
+import queue
+import threading
+from typing import Callable, Dict, Iterable, List, Optional
+
+from core.autotune import AUTO_CONCURRENCY_MAX, ConcurrencyTuner
+from core.metadata import get_metadata_concurrency
+from core.scheduler import PRIORITY_NORMAL, PRIORITY_RETRY, TaskScheduler, estimate_size
+from models.download_task import DownloadTask, ResolvedTask
+
+PIPELINE_RESOLVE_WORKERS = 2  # 解析阶段线程数
+PIPELINE_TRANSFER_WORKERS = 3  # 传输阶段线程数
+PIPELINE_POSTPROCESS_WORKERS = 2  # 后处理阶段线程数，启用标签写入进程池时不少于进程数
+PIPELINE_QUEUE_FACTOR = 2  # 阶段之间的队列容量为下游线程数的倍数
+STAGE_IDLE_CHECK = 0.5  # 空闲线程检查线程数是否被调小的间隔（秒）
+PIPELINE_TRANSFER_RETRIES = 1  # 传输失败后重新排队的次数
+
+_STOP = object()  # 阶段结束标记
+
+
+class PriorityStageQueue(queue.Queue):
+    """按 key(item)（元组）从小到大出队的有界队列，key 相同时按加入顺序，结束标记排在最后"""
+
+    def __init__(self, maxsize: int, key: Callable[[object], tuple]):
+        self.key = key
+        super().__init__(maxsize)
+
+    def _init(self, maxsize):
+        self.heap = []
+        self.counter = itertools.count()
+
+    def _qsize(self):
+        return len(self.heap)
+
+    def _put(self, item):
+        priority = (float('inf'),) if item is _STOP else self.key(item)
+        heapq.heappush(self.heap, (priority, next(self.counter), item))
+
+    def _get(self):
+        return heapq.heappop(self.heap)[-1]
+
+
+class PipelineStage:
+    """
+    流水线中的一个阶段：多个线程从输入队列取任务处理，全部线程退出后通知下游阶段结束
+    线程数可随时调整：增加时立即启动新线程，减少时多出的线程处理完当前任务后退出
+    """
+
+    def __init__(self, name: str, workers: int, handler: Callable, input_queue,
+                 on_finished: Callable[[], None]):
+        self.name = name
+        self.workers = max(1, workers)
+        self.handler = handler
+        self.input_queue = input_queue
+        self.on_finished = on_finished
+        self.running = 0
+        self.started = False
+        self.finished = False
+        self.spawned = 0
+        self.lock = threading.Lock()
+        self.threads: List[threading.Thread] = []
+
+    def start(self):
+        self.started = True
+        self.resize(self.workers)
+
+    def resize(self, workers: int):
+        """调整线程数"""
+        with self.lock:
+            self.workers = max(1, workers)
+            if not self.started or self.finished:
+                return
+            # 等待退出的线程仍计入 running，调小后立即调大时它们会继续工作
+            spawn = max(0, self.workers - self.running)
+            self.running += spawn
+            names = [f"{self.name}-{self.spawned + i}" for i in range(spawn)]
+            self.spawned += spawn
+        for name in names:
+            thread = threading.Thread(target=self._run, name=name, daemon=True)
+            thread.start()
+            self.threads.append(thread)
+
+    def stop(self):
+        """输入结束后调用，各线程处理完队列中的任务后退出"""
+        self.input_queue.put(_STOP)
+
+    def _retire(self) -> bool:
+        """线程数被调小时让当前线程退出"""
+        with self.lock:
+            if self.running > self.workers:
+                self.running -= 1
+                return True
+            return False
+
+    def _run(self):
+        while True:
+            if self._retire():
+                return
+            try:
+                item = self.input_queue.get(timeout=STAGE_IDLE_CHECK)
+            except queue.Empty:
+                continue
+            if item is _STOP:
+                # 结束标记留给同阶段的其他线程
+                self.input_queue.put(_STOP)
+                break
+            try:
+                self.handler(item)
+            except Exception as e:
+                # 各阶段自行更新任务状态，这里只防止线程意外退出
+                logging.error(f"{self.name} 阶段处理任务失败：{str(e)}")
+
+        with self.lock:
+            self.running -= 1
+            self.finished = self.running == 0
+            finished = self.finished
+        if finished:
+            self.on_finished()
+
+
+class DownloadPipeline:
+    """
+    由 DownloadCore 的 resolve_task、transfer_task、postprocess_task 组成的三段流水线
+    shortest_first 为 True 时同一优先级内按文件大小从小到大下载：进入调度器时按已缓存的链接或歌曲详情估算大小，
+    解析后在传输队列中按链接返回的实际大小排序，不需要在开始前解析全部链接
+    """
+
+    max_concurrency = AUTO_CONCURRENCY_MAX  # 自动调整并发数的上限
+
+    def __init__(self, core, resolve_workers: int = PIPELINE_RESOLVE_WORKERS,
+                 transfer_workers: int = PIPELINE_TRANSFER_WORKERS,
+                 postprocess_workers: Optional[int] = None,
+                 shortest_first: bool = False):
+        self.core = core
+        self.done = threading.Event()
+        self.tuner: Optional[ConcurrencyTuner] = None
+        postprocess_workers = postprocess_workers or max(PIPELINE_POSTPROCESS_WORKERS, get_metadata_concurrency())
+
+        # 流水线中尚未结束的任务数，close 之后降为 0 时流水线结束
+        self.lock = threading.Lock()
+        self.outstanding = 0
+        self.closed = False
+        self.stopping = False
+        self.attempts: Dict[str, int] = {}
+
+        self.scheduler = TaskScheduler(shortest_first)
+        # 已解析的任务同样按优先级进入传输阶段，优先的任务不必排在已解析的任务之后
+        transfer_queue = PriorityStageQueue(max(1, transfer_workers) * PIPELINE_QUEUE_FACTOR, self._transfer_order)
+        postprocess_queue: queue.Queue = queue.Queue(maxsize=max(1, postprocess_workers) * PIPELINE_QUEUE_FACTOR)
+
+        self.postprocess = PipelineStage("后处理", postprocess_workers, self._postprocess, postprocess_queue,
+                                         self._on_finished)
+        self.transfer = self._create_stage("传输", transfer_workers, self._transfer, transfer_queue,
+                                           self.postprocess.stop)
+        self.resolve = self._create_stage("解析", resolve_workers, self._resolve, self.scheduler,
+                                          self.transfer.stop)
+        self.started = False
+
+    def _create_stage(self, name: str, workers: int, handler: Callable, input_queue,
+                      on_finished: Callable[[], None]):
+        """创建解析或传输阶段"""
+        return PipelineStage(name, workers, handler, input_queue, on_finished)
+
+    def start(self):
+        """启动所有阶段的线程"""
+        if not self.started:
+            self.started = True
+            for stage in (self.postprocess, self.transfer, self.resolve):
+                stage.start()
+
+    def submit(self, task: DownloadTask, priority: Optional[int] = None) -> bool:
+        """
+        提交任务到调度器，由解析线程按需领取，priority 为空时使用任务自身的优先级
+        流水线已结束或正在结束时返回 False
+        """
+        with self.lock:
+            if self.stopping:
+                return False
+            self.outstanding += 1
+        if priority is not None:
+            task.priority = priority
+        self._schedule(task)
+        return True
+
+    def _schedule(self, task: DownloadTask):
+        size = None
+        if self.scheduler.shortest_first:
+            # 预取过的链接有实际大小，否则按歌曲详情估算
+            info = self.core.url_cache.get(str(task.track['id']), task.quality)
+            size = (info or {}).get('size') or estimate_size(task.track, task.quality)
+        self.scheduler.put(task, task.priority, size)
+        self.core.notify_prefetch()
+
+    def start_url_prefetch(self):
+        """按调度器的领取顺序预取下载链接，优先的任务和重试的任务同样预取，流水线结束后停止"""
+        self.core.start_url_prefetch(self.scheduler.peek, done=self.done)
+
+    def _transfer_order(self, resolved: ResolvedTask) -> tuple:
+        """传输队列的出队顺序：优先级，短歌优先时再按实际文件大小"""
+        if not self.scheduler.shortest_first:
+            return (resolved.task.priority,)
+        return (resolved.task.priority, resolved.url_info.get('size') or float('inf'))
+
+    @property
+    def concurrency(self) -> int:
+        """当前的并发下载数（传输线程数）"""
+        return self.transfer.workers
+
+    def set_concurrency(self, workers: int):
+        """下载过程中调整并发下载数，增加的线程立即开始领取任务，减少的线程完成当前任务后退出"""
+        self.transfer.resize(workers)
+        transfer_queue = self.transfer.input_queue
+        with transfer_queue.mutex:
+            transfer_queue.maxsize = self.transfer.workers * PIPELINE_QUEUE_FACTOR
+            transfer_queue.not_full.notify_all()
+        logging.info(f"并发下载数调整为 {self.transfer.workers}")
+
+    def set_auto_concurrency(self, enabled: bool, on_change: Optional[Callable[[int], None]] = None):
+        """开启或关闭并发数自动调整，on_change 在自动调整后以新的并发数调用"""
+        if self.tuner is not None:
+            self.tuner.stop()
+            self.tuner = None
+        if enabled and not self.done.is_set():
+            self.tuner = ConcurrencyTuner(self, on_change, max_workers=self.max_concurrency)
+            self.tuner.start()
+
+    def _on_finished(self):
+        if self.tuner is not None:
+            self.tuner.stop()
+        self.done.set()
+
+    def close(self):
+        """批量提交结束，所有任务处理完后流水线结束；结束前仍可通过 submit 追加任务"""
+        with self.lock:
+            self.closed = True
+            self.stopping = self.outstanding == 0
+            stop = self.stopping
+        if stop:
+            self.resolve.stop()
+
+    def _task_finished(self, task: DownloadTask):
+        """任务离开流水线（完成、失败或取消）"""
+        self.core.release_task(task)
+        with self.lock:
+            self.outstanding -= 1
+            self.stopping = self.closed and self.outstanding == 0
+            stop = self.stopping
+        if stop:
+            self.resolve.stop()
+
+    def join(self, timeout: Optional[float] = None) -> bool:
+        """等待流水线结束，返回是否已结束"""
+        return self.done.wait(timeout)
+
+    def run(self, tasks: Iterable[DownloadTask]):
+        """提交全部任务并等待处理完成"""
+        self.start()
+        for task in tasks:
+            self.submit(task, PRIORITY_NORMAL)
+        self.close()
+        self.join()
+
+    def _resolve(self, task: DownloadTask):
+        resolved = self.core.resolve_task(task)
+        if resolved is None:
+            self._task_finished(task)
+            return
+        # 传输队列已满时在此阻塞，解析不会领先传输太多，链接也不会在排队时过期
+        self.transfer.input_queue.put(resolved)
+
+    def _transfer(self, resolved: ResolvedTask):
+        if self._transfer_finished(resolved, self.core.transfer_task(resolved)):
+            self.postprocess.input_queue.put(resolved)
+
+    def _transfer_finished(self, resolved: ResolvedTask, completed: bool) -> bool:
+        """
+        记录传输结果，返回是否交给后处理阶段
+        失败的任务重新排队或离开流水线，取消的任务不计入失败次数
+        """
+        task = resolved.task
+        if completed:
+            self.core.transfer_stats.record(True)
+            return True
+        cancelled = self.core.is_task_cancelled(task.id)
+        if not cancelled:
+            self.core.transfer_stats.record(False)
+        attempts = self.attempts.get(task.id, 0)
+        if not cancelled and attempts < PIPELINE_TRANSFER_RETRIES:
+            # 重试排在尚未开始的任务之后，暂时性的网络问题或链接失效有机会恢复
+            self.attempts[task.id] = attempts + 1
+            logging.info(f"重新排队下载：{task.track['name']}，原因：{task.error_message}")
+            self.core.release_task(task)
+            self.core.progress_manager.update_task_status(task.id, "pending")
+            task.priority = PRIORITY_RETRY
+            self._schedule(task)
+            return False
+        self._task_finished(task)
+        return False
+
+    def _postprocess(self, resolved: ResolvedTask):
+        try:
+            self.core.postprocess_task(resolved)
+        finally:
+            self._task_finished(resolved.task)
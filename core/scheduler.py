@@ -0,0 +1,77 @@
+"""
+下载任务调度
+待下载的任务保存在调度器中，由流水线的工作线程按需领取，工作线程数量可以在下载过程中调整；
+任务按优先级领取：用户单独点击下载的歌曲优先，重试的任务排在新任务之后，
+可选短文件优先（按歌曲详情中的文件大小或时长估算，解析后按实际大小），尽早完成更多歌曲
+"""
+import heapq
+import itertools
+import queue
+import threading
+from typing import Any, Dict, List, Optional, Tuple
+
+PRIORITY_USER = 0  # 用户单独点击下载
+PRIORITY_NORMAL = 1  # 批量下载
+PRIORITY_RETRY = 2  # 失败后重试
+
+# 歌曲详情中各音质对应的文件信息字段（包含 size、br）
+QUALITY_DETAIL_FIELDS = {
+    "standard": "l",
+    "exhigh": "h",
+    "lossless": "sq",
+    "hires": "hr",
+}
+# 歌曲详情没有对应音质的文件信息时，按时长和该音质的典型码率（bps）估算大小
+QUALITY_BITRATES = {
+    "standard": 128000,
+    "exhigh": 320000,
+    "lossless": 900000,
+    "hires": 2000000,
+}
+
+
+def estimate_size(track: Dict[str, Any], quality: str) -> Optional[int]:
+    """按歌曲详情估算指定音质的文件大小（字节），无法估算时返回 None"""
+    detail = track.get(QUALITY_DETAIL_FIELDS.get(quality, ""))
+    if isinstance(detail, dict) and detail.get('size'):
+        return int(detail['size'])
+    duration = track.get('dt')
+    if duration:
+        return int(duration) * QUALITY_BITRATES.get(quality, QUALITY_BITRATES["standard"]) // 8000
+    return None
+
+
+class TaskScheduler:
+    """
+    待下载任务的优先队列，接口与 queue.Queue 的 put/get 一致，可直接作为流水线阶段的输入
+    同一优先级内按提交顺序领取；shortest_first 为 True 时按 size 从小到大，大小未知的排在最后
+    """
+
+    def __init__(self, shortest_first: bool = False):
+        self.shortest_first = shortest_first
+        self.pending: List[Tuple[int, float, int, Any]] = []
+        self.counter = itertools.count()
+        self.cond = threading.Condition()
+
+    def put(self, item: Any, priority: int = PRIORITY_NORMAL, size: Optional[int] = None):
+        """加入待下载任务"""
+        order = (size if size else float('inf')) if self.shortest_first else 0
+        with self.cond:
+            heapq.heappush(self.pending, (priority, order, next(self.counter), item))
+            self.cond.notify()
+
+    def get(self, timeout: Optional[float] = None) -> Any:
+        """领取优先级最高的任务，timeout 内没有任务时抛出 queue.Empty"""
+        with self.cond:
+            if not self.cond.wait_for(lambda: self.pending, timeout):
+                raise queue.Empty
+            return heapq.heappop(self.pending)[-1]
+
+    def peek(self, count: int) -> List[Any]:
+        """按领取顺序返回接下来的 count 个任务，不移出调度器"""
+        with self.cond:
+            return [entry[-1] for entry in heapq.nsmallest(count, self.pending)]
+
+    def __len__(self) -> int:
+        with self.cond:
+            return len(self.pending)
@@ -0,0 +1,200 @@
+"""
+分段下载
+大文件按字节范围拆分为多个分段并发下载，写入预分配的 .part 文件，
+分段进度保存在 .part.json 中，中断后可按分段续传
+"""
+import hashlib
+import json
+import logging
+import math
+import os
+import threading
+from typing import Any, Dict, List, Optional
+
+MB = 1024 * 1024
+SEGMENT_THRESHOLD = 32 * MB  # 超过该大小的文件分段下载
+SEGMENT_MIN_SIZE = 4 * MB  # 单个分段的最小大小，小于两倍该值的分段不再拆分
+SEGMENT_MAX_COUNT = 8  # 同时下载的最大分段数
+SEGMENT_DEFAULT_COUNT = 4  # 尚未测得单连接速度时的分段数
+SEGMENT_TARGET_SECONDS = 10.0  # 期望每个分段的下载用时，单连接越慢分段越多
+SEGMENT_SAVE_INTERVAL = 4 * MB  # 每下载该字节数保存一次分段进度
+
+
+class RangeNotSupportedError(Exception):
+    """服务端未按 Range 请求返回 206，无法分段下载"""
+
+
+def build_state_path(part_path: str) -> str:
+    """分段进度文件路径"""
+    return f"{part_path}.json"
+
+
+class ThroughputMeter:
+    """单连接下载速度的指数加权平均，用于决定分段数"""
+
+    def __init__(self, alpha: float = 0.3):
+        self.alpha = alpha
+        self.speed = 0.0  # 字节/秒
+        self.lock = threading.Lock()
+
+    def update(self, nbytes: int, seconds: float):
+        """记录一次传输，数据量过小的样本不计入"""
+        if nbytes < MB or seconds <= 0:
+            return
+        with self.lock:
+            sample = nbytes / seconds
+            self.speed = sample if not self.speed else self.speed + self.alpha * (sample - self.speed)
+
+    def segment_count(self, size: int) -> int:
+        """按单连接速度估算分段数，使每个分段大约用时 SEGMENT_TARGET_SECONDS"""
+        with self.lock:
+            speed = self.speed
+        count = math.ceil(size / (speed * SEGMENT_TARGET_SECONDS)) if speed else SEGMENT_DEFAULT_COUNT
+        return max(2, min(count, SEGMENT_MAX_COUNT, size // SEGMENT_MIN_SIZE))
+
+
+class SegmentPlan:
+    """
+    分段计划
+    每个分段记录 start/pos/end（pos 为下一个待写入的位置），线程安全；
+    空闲的下载连接会拆分剩余最多的分段，避免慢分段拖住整个文件
+    start 之前的数据已在规划前写入（传输中写入标签时的文件头部），服务端位置 offset 写入文件的 offset + file_offset
+    """
+
+    def __init__(self, part_path: str, size: int, segments: List[Dict[str, Any]], start: int = 0,
+                 file_offset: int = 0):
+        self.part_path = part_path
+        self.state_path = build_state_path(part_path)
+        self.size = size
+        self.segments = segments
+        self.start = start
+        self.file_offset = file_offset
+        self.active: set = set()  # 正在下载的分段下标
+        self.unsaved = 0
+        self.lock = threading.Lock()
+
+    @classmethod
+    def load(cls, part_path: str, size: int) -> Optional['SegmentPlan']:
+        """读取已有的分段进度，文件大小不一致或进度损坏时返回 None"""
+        state_path = build_state_path(part_path)
+        if not (os.path.exists(state_path) and os.path.exists(part_path)):
+            return None
+        try:
+            with open(state_path, 'r', encoding='utf-8') as f:
+                state = json.load(f)
+            file_offset = state.get('file_offset', 0)
+            if state['size'] == size and os.path.getsize(part_path) == size + file_offset:
+                logging.info(f"从分段进度续传：{part_path}")
+                return cls(part_path, size, state['segments'], state.get('start', 0), file_offset)
+        except (OSError, ValueError, KeyError) as e:
+            logging.warning(f"读取分段进度失败，重新下载：{part_path}，错误：{str(e)}")
+        return None
+
+    @classmethod
+    def create(cls, part_path: str, size: int, count: int, start: int = 0, file_offset: int = 0) -> 'SegmentPlan':
+        """规划 start 之后的分段并预分配文件，start 大于 0 时保留文件中已写入的头部"""
+        step = max(1, math.ceil((size - start) / count))
+        segments = [{'start': pos, 'pos': pos, 'end': min(pos + step, size) - 1}
+                    for pos in range(start, size, step)]
+        with open(part_path, 'r+b' if start and os.path.exists(part_path) else 'wb') as f:
+            f.truncate(size + file_offset)
+        plan = cls(part_path, size, segments, start, file_offset)
+        plan.save()
+        return plan
+
+    @property
+    def downloaded(self) -> int:
+        """已下载的服务端字节数"""
+        with self.lock:
+            return self.start + sum(seg['pos'] - seg['start'] for seg in self.segments)
+
+    @property
+    def pending_count(self) -> int:
+        """尚未完成的分段数"""
+        with self.lock:
+            return sum(1 for seg in self.segments if seg['pos'] <= seg['end'])
+
+    def next_segment(self) -> Optional[Dict[str, Any]]:
+        """领取一个待下载的分段，没有空闲分段时拆分剩余最多的进行中分段"""
+        with self.lock:
+            for index, seg in enumerate(self.segments):
+                if index not in self.active and seg['pos'] <= seg['end']:
+                    self.active.add(index)
+                    return seg
+
+            candidates = [self.segments[i] for i in self.active]
+            largest = max(candidates, key=lambda s: s['end'] - s['pos'], default=None)
+            if largest is None or largest['end'] - largest['pos'] + 1 < 2 * SEGMENT_MIN_SIZE:
+                return None
+            middle = largest['pos'] + (largest['end'] - largest['pos'] + 1) // 2
+            seg = {'start': middle, 'pos': middle, 'end': largest['end']}
+            largest['end'] = middle - 1
+            self.segments.append(seg)
+            self.active.add(len(self.segments) - 1)
+            return seg
+
+    def release(self, seg: Dict[str, Any]):
+        """分段结束（完成、出错或取消），允许其他连接重新领取剩余部分"""
+        with self.lock:
+            self.active.discard(self.segments.index(seg))
+
+    def clip(self, seg: Dict[str, Any], length: int) -> int:
+        """分段可能已被拆分，返回本次数据中属于该分段的长度"""
+        with self.lock:
+            return max(0, min(length, seg['end'] - seg['pos'] + 1))
+
+    def advance(self, seg: Dict[str, Any], length: int):
+        """数据写入文件后推进分段位置，定期保存进度"""
+        with self.lock:
+            seg['pos'] += length
+            self.unsaved += length
+            should_save = self.unsaved >= SEGMENT_SAVE_INTERVAL
+        if should_save:
+            self.save()
+
+    def is_done(self, seg: Dict[str, Any]) -> bool:
+        """分段是否已下载完"""
+        with self.lock:
+            return seg['pos'] > seg['end']
+
+    def save(self):
+        """写入分段进度，先写临时文件再替换，避免进度文件损坏"""
+        with self.lock:
+            state = {'size': self.size, 'start': self.start, 'file_offset': self.file_offset,
+                     'segments': [dict(seg) for seg in self.segments]}
+            self.unsaved = 0
+        tmp_path = f"{self.state_path}.tmp"
+        try:
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                json.dump(state, f)
+            os.replace(tmp_path, self.state_path)
+        except OSError as e:
+            logging.warning(f"保存分段进度失败：{self.state_path}，错误：{str(e)}")
+
+    def verify(self, md5: str = '', head: Optional[bytes] = None) -> bool:
+        """
+        校验所有分段已完成、文件大小一致，提供 md5 时同时校验内容
+        文件头部已写入标签时 head 为服务端原始的头部，代替文件中的 head_length + file_offset 字节计入摘要
+        """
+        if self.pending_count or os.path.getsize(self.part_path) != self.size + self.file_offset:
+            return False
+        if not md5:
+            return True
+        # 各分段并发写入、不按文件顺序到达，而 md5 无法由各分段的摘要合并得到，
+        # 分段下载只能在全部完成后按顺序完整读一遍文件计算摘要；单连接下载在写入时增量计算（见 StreamVerifier）
+        head = head or b''
+        digest = hashlib.md5(head)
+        with open(self.part_path, 'rb') as f:
+            f.seek(len(head) + self.file_offset if head else 0)
+            for block in iter(lambda: f.read(MB), b''):
+                digest.update(block)
+        return digest.hexdigest() == md5.lower()
+
+    def discard(self, keep_part: bool = True):
+        """删除分段进度文件，keep_part 为 False 时同时删除 .part 文件"""
+        paths = [self.state_path] if keep_part else [self.state_path, self.part_path]
+        for path in paths:
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
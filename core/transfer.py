@@ -0,0 +1,177 @@
+"""
+传输读写
+数据直接读入复用的预分配缓冲区，按吞吐调整每次读取的大小，并按固定间隔汇报进度，
+降低大文件传输时每个数据块的分配、加锁和系统调用开销
+"""
+import http.client
+import threading
+import time
+from typing import List, Optional
+
+import requests
+from urllib3.exceptions import DecodeError, ProtocolError, ReadTimeoutError, SSLError
+
+from managers.download_manager import DownloadProgressManager
+
+TRANSFER_MIN_CHUNK = 64 * 1024
+TRANSFER_MAX_CHUNK = 1024 * 1024
+TRANSFER_TARGET_SECONDS = 0.05  # 单次读取的目标用时，兼顾吞吐和暂停、取消的响应速度
+PROGRESS_INTERVAL = 0.25  # 汇报进度的间隔（秒）
+BUFFER_POOL_SIZE = 32  # 缓冲池保留的空闲缓冲区数量
+
+
+class BufferPool:
+    """固定大小缓冲区的复用池"""
+
+    def __init__(self, buffer_size: int = TRANSFER_MAX_CHUNK, max_free: int = BUFFER_POOL_SIZE):
+        self.buffer_size = buffer_size
+        self.max_free = max_free
+        self.free: List[bytearray] = []
+        self.lock = threading.Lock()
+
+    def acquire(self) -> bytearray:
+        """取出一个缓冲区，池为空时新建"""
+        with self.lock:
+            if self.free:
+                return self.free.pop()
+        return bytearray(self.buffer_size)
+
+    def release(self, buffer: bytearray):
+        """归还缓冲区"""
+        with self.lock:
+            if len(self.free) < self.max_free:
+                self.free.append(buffer)
+
+
+_pool: Optional[BufferPool] = None
+_pool_lock = threading.Lock()
+
+
+def get_buffer_pool() -> BufferPool:
+    """获取全局共享的缓冲池"""
+    global _pool
+    if _pool is None:
+        with _pool_lock:
+            if _pool is None:
+                _pool = BufferPool()
+    return _pool
+
+
+class StreamReader:
+    """
+    把 requests 流式响应读入复用的缓冲区
+    未压缩且有 Content-Length 的响应直接调用底层 http.client 响应的 readinto，由 socket 写入缓冲区，不产生中间 bytes 对象，
+    按 Content-Length 检查提前断开的连接，读完后把连接归还 urllib3 连接池；
+    压缩或分块传输的响应通过 urllib3 读取和解码，多一次复制；
+    每次读取的大小在 TRANSFER_MIN_CHUNK 到 TRANSFER_MAX_CHUNK 之间按测得的吞吐调整
+    """
+
+    def __init__(self, response: requests.Response, pool: Optional[BufferPool] = None):
+        self.pool = pool or get_buffer_pool()
+        self.raw = response.raw
+        # requests 创建的 urllib3 响应默认不解码，压缩的响应读取时需要显式解码
+        self.decode = response.headers.get('content-encoding', 'identity') != 'identity'
+        fp = getattr(self.raw, '_fp', None)
+        direct = not self.decode and not self.raw.chunked and isinstance(fp, http.client.HTTPResponse)
+        # 直接读取时剩余的响应体字节数，None 表示通过 urllib3 读取
+        self.remaining: Optional[int] = self.raw.length_remaining if direct else None
+        self.fp = fp if direct else None
+        self.chunk_size = TRANSFER_MIN_CHUNK
+        self.buffer: Optional[bytearray] = None
+        self.view: Optional[memoryview] = None
+
+    def __enter__(self) -> 'StreamReader':
+        self.buffer = self.pool.acquire()
+        self.view = memoryview(self.buffer)
+        return self
+
+    def __exit__(self, *exc):
+        self.view = None
+        self.pool.release(self.buffer)
+        self.buffer = None
+
+    def read(self, limit: Optional[int] = None) -> memoryview:
+        """
+        读取下一块数据，返回指向缓冲区的 memoryview，读完返回空视图
+        返回的视图在下一次 read 前有效；limit 限制本次最多读取的字节数
+        """
+        size = self.chunk_size if limit is None else min(self.chunk_size, limit)
+        if size <= 0:
+            return self.view[:0]
+        start = time.monotonic()
+        try:
+            if self.remaining is not None:
+                count = self._readinto(self.view[:min(size, self.remaining)])
+            elif self.decode:
+                data = self.raw.read(size, decode_content=True)
+                count = len(data)
+                self.view[:count] = data
+            else:
+                count = self.raw.readinto(self.view[:size]) or 0
+        except ProtocolError as e:
+            # 与 requests 的 iter_content 一致，把 urllib3 的异常转换为 requests 的异常，由上层续传
+            raise requests.exceptions.ChunkedEncodingError(e) from e
+        except DecodeError as e:
+            raise requests.exceptions.ContentDecodingError(e) from e
+        except ReadTimeoutError as e:
+            raise requests.ConnectionError(e) from e
+        except SSLError as e:
+            raise requests.exceptions.SSLError(e) from e
+        elapsed = time.monotonic() - start
+
+        if count == size and elapsed < TRANSFER_TARGET_SECONDS / 2 and self.chunk_size < TRANSFER_MAX_CHUNK:
+            self.chunk_size *= 2
+        elif elapsed > TRANSFER_TARGET_SECONDS * 2 and self.chunk_size > TRANSFER_MIN_CHUNK:
+            self.chunk_size //= 2
+        return self.view[:count]
+
+    def _readinto(self, view: memoryview) -> int:
+        """从 http.client 响应直接读入 view，连接在 Content-Length 之前关闭时抛出 ChunkedEncodingError"""
+        if not self.remaining:
+            self._release()
+            return 0
+        try:
+            count = self.fp.readinto(view)
+        except (OSError, http.client.HTTPException) as e:
+            raise requests.ConnectionError(e) from e
+        if not count:
+            raise requests.exceptions.ChunkedEncodingError(f"连接提前关闭，还有 {self.remaining} 字节未接收")
+        self.remaining -= count
+        if not self.remaining:
+            self._release()
+        return count
+
+    def _release(self):
+        """响应体已读完，连接归还连接池供下一个请求复用"""
+        if self.fp is not None:
+            self.fp = None
+            self.raw.release_conn()
+
+
+class ProgressReporter:
+    """按固定间隔汇报任务进度和速度，避免每个数据块都加锁更新"""
+
+    def __init__(self, progress_manager: DownloadProgressManager, task_id: str, total_size: int,
+                 start_bytes: int = 0, interval: float = PROGRESS_INTERVAL):
+        self.progress_manager = progress_manager
+        self.task_id = task_id
+        self.total_size = total_size
+        self.start_bytes = start_bytes
+        self.interval = interval
+        self.start_time = time.monotonic()
+        self.next_report = self.start_time
+
+    def due(self) -> bool:
+        """是否已到汇报间隔"""
+        return time.monotonic() >= self.next_report
+
+    def update(self, downloaded_size: int, force: bool = False):
+        """记录已下载字节数，到达汇报间隔或 force 时更新进度"""
+        now = time.monotonic()
+        if not force and now < self.next_report:
+            return
+        self.next_report = now + self.interval
+        if self.total_size > 0:
+            elapsed = now - self.start_time
+            speed = (downloaded_size - self.start_bytes) / elapsed / 1024 if elapsed > 0 else 0
+            self.progress_manager.update_task_progress(self.task_id, downloaded_size / self.total_size, speed)
@@ -4,6 +4,7 @@ Cookie 管理器
 import logging
 import requests
 from typing import Dict, Tuple
+from api.http_client import get_client, web_url
 
 
 class CookieManager:
@@ -14,8 +15,10 @@ class CookieManager:
         self.cookie_text = None
 
     def set_cookie(self, cookie_text: str):
-        """设置Cookie文本"""
+        """设置Cookie文本，验证或使用前由 apply_cookie 设为接口请求的默认 Cookie"""
         self.cookie_text = cookie_text.strip()
+        # 旧 Cookie 不再随请求发送
+        get_client().set_default_cookies({})
 
     def read_cookie(self) -> str:
         """读取Cookie，优先使用内存中的Cookie"""
@@ -40,6 +43,12 @@ class CookieManager:
         cookie_ = [item.strip().split('=', 1) for item in cookie_text.split(';') if item and '=' in item]
         return {k.strip(): v.strip() for k, v in cookie_}
 
+    def apply_cookie(self) -> Dict[str, str]:
+        """解析Cookie并设为共享 HTTP 客户端的默认 Cookie，之后的接口请求自动携带"""
+        cookies = self.parse_cookie()
+        get_client().set_default_cookies(cookies)
+        return cookies
+
     def save_cookie(self):
         """保存Cookie到文件"""
         if self.cookie_text:
@@ -53,23 +62,20 @@ class CookieManager:
     def validate_cookie(self) -> Tuple[bool, str]:
         """验证Cookie有效性"""
         try:
-            cookies = self.parse_cookie()
+            self.apply_cookie()
             # 使用用户信息API验证Cookie
-            return self._test_cookie_validity(cookies)
+            return self._test_cookie_validity()
         except Exception as e:
             logging.error(f"Cookie验证失败：{str(e)}")
             return False, str(e)
 
-    def _test_cookie_validity(self, cookies: Dict[str, str]) -> Tuple[bool, str]:
+    def _test_cookie_validity(self) -> Tuple[bool, str]:
         """通过API测试Cookie有效性"""
         try:
             # 使用用户信息API测试
-            url = "https://music.163.com/api/nuser/account/get"
-            headers = {
-                'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; WOW64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.164 NeteaseMusicDesktop/2.10.2.200154',
-                'Referer': 'https://music.163.com/',
-            }
-            response = requests.post(url, headers=headers, cookies=cookies, timeout=10)
+            url = web_url('/api/nuser/account/get')
+            headers = {'Referer': 'https://music.163.com/'}
+            response = get_client().post(url, headers=headers, timeout=10)
             response.raise_for_status()
             result = response.json()
 
@@ -0,0 +1,145 @@
+"""
+专辑封面缓存
+以 picUrl 为键保存处理后的封面 JPEG：内存中按 LRU 保留最近使用的封面，同时写入本地目录，
+同一专辑的歌曲只下载和缩放一次封面，重启后仍可命中
+"""
+import hashlib
+import logging
+import os
+import threading
+from collections import OrderedDict
+from typing import Callable, Dict, Optional
+
+COVER_CACHE_DIR = 'cover_cache'
+COVER_CACHE_MEMORY_ITEMS = 64  # 内存中保留的封面数
+COVER_CACHE_MAX_FILES = 5000  # 本地目录保留的封面数，超出时删除最久未使用的四分之一
+
+
+class CoverCache:
+    """专辑封面缓存管理"""
+
+    def __init__(self, cache_dir: str = COVER_CACHE_DIR, memory_items: int = COVER_CACHE_MEMORY_ITEMS,
+                 max_files: int = COVER_CACHE_MAX_FILES):
+        self.cache_dir = cache_dir
+        self.memory_items = memory_items
+        self.max_files = max_files
+        self.entries: "OrderedDict[str, bytes]" = OrderedDict()
+        self.loading: Dict[str, threading.Event] = {}
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        os.makedirs(cache_dir, exist_ok=True)
+        self.file_count = len(os.listdir(cache_dir))
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.cache_dir, hashlib.sha1(key.encode('utf-8')).hexdigest() + '.jpg')
+
+    def get(self, key: str) -> Optional[bytes]:
+        """获取封面，内存未命中时读取本地目录"""
+        with self.lock:
+            data = self.entries.get(key)
+            if data is not None:
+                self.entries.move_to_end(key)
+                self.hits += 1
+                return data
+
+        path = self._path(key)
+        try:
+            with open(path, 'rb') as f:
+                data = f.read()
+            os.utime(path)  # 记录最近使用时间，清理时保留常用封面
+        except OSError:
+            return None
+        with self.lock:
+            self.disk_hits += 1
+            self._remember(key, data)
+        return data
+
+    def put(self, key: str, data: bytes):
+        """写入封面"""
+        with self.lock:
+            self._remember(key, data)
+        path = self._path(key)
+        tmp_path = f"{path}.tmp"
+        try:
+            with open(tmp_path, 'wb') as f:
+                f.write(data)
+            os.replace(tmp_path, path)
+        except OSError as e:
+            logging.warning(f"写入封面缓存失败：{str(e)}")
+            return
+        with self.lock:
+            self.file_count += 1
+            prune = self.file_count > self.max_files
+        if prune:
+            self._prune()
+
+    def get_or_load(self, key: str, loader: Callable[[str], Optional[bytes]]) -> Optional[bytes]:
+        """获取封面，未命中时调用 loader 加载并写入缓存；同一封面同时只加载一次，其他线程等待结果"""
+        data = self.get(key)
+        if data is not None:
+            return data
+        with self.lock:
+            event = self.loading.get(key)
+            waiting = event is not None
+            if not waiting:
+                event = self.loading[key] = threading.Event()
+                self.misses += 1
+        if waiting:
+            event.wait()
+            # 加载结果可能已被挤出内存，get 会再读取本地目录；加载失败时不写入缓存，
+            # 等待者直接放弃，避免对同一个失效链接重复请求
+            return self.get(key)
+
+        try:
+            data = loader(key)
+            if data is not None:
+                self.put(key, data)
+            return data
+        finally:
+            with self.lock:
+                self.loading.pop(key).set()
+
+    def _remember(self, key: str, data: bytes):
+        self.entries[key] = data
+        self.entries.move_to_end(key)
+        while len(self.entries) > self.memory_items:
+            self.entries.popitem(last=False)
+
+    def _prune(self):
+        """删除本地目录中最久未使用的四分之一封面"""
+        try:
+            paths = [os.path.join(self.cache_dir, name) for name in os.listdir(self.cache_dir)]
+            paths.sort(key=os.path.getmtime)
+            for path in paths[:len(paths) // 4]:
+                os.remove(path)
+            with self.lock:
+                self.file_count = len(paths) - len(paths) // 4
+        except OSError as e:
+            logging.warning(f"清理封面缓存失败：{str(e)}")
+
+    def stats(self) -> Dict[str, float]:
+        """命中统计: {'hits', 'disk_hits', 'misses', 'hit_rate'}"""
+        with self.lock:
+            total = self.hits + self.disk_hits + self.misses
+            return {
+                'hits': self.hits,
+                'disk_hits': self.disk_hits,
+                'misses': self.misses,
+                'hit_rate': (self.hits + self.disk_hits) / total if total else 0.0
+            }
+
+
+_cache: Optional[CoverCache] = None
+_cache_lock = threading.Lock()
+
+
+def get_cover_cache() -> CoverCache:
+    """获取全局共享的封面缓存"""
+    global _cache
+    if _cache is None:
+        with _cache_lock:
+            if _cache is None:
+                _cache = CoverCache()
+    return _cache
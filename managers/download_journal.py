@@ -0,0 +1,182 @@
+"""
+下载任务日志
+把每批下载任务及其状态变化持久化到本地 SQLite，程序异常退出后重新启动时可以继续未完成的下载；
+状态变化先合并在内存中，由后台线程按固定间隔批量写入，进度频繁更新时不会拖慢下载线程
+"""
+import json
+import logging
+import sqlite3
+import threading
+import time
+from typing import Any, Dict, List, Optional, Tuple
+from models.download_task import DownloadTask
+
+DOWNLOAD_JOURNAL_FILE = 'download_journal.db'
+JOURNAL_FLUSH_INTERVAL = 1.0  # 批量写入的间隔（秒）
+JOURNAL_BATCH_SIZE = 500  # 待写入的任务数达到该值时提前写入
+
+
+class DownloadJournal:
+    """下载任务日志管理"""
+
+    def __init__(self, db_path: str = DOWNLOAD_JOURNAL_FILE, flush_interval: float = JOURNAL_FLUSH_INTERVAL):
+        self.db_path = db_path
+        self.flush_interval = flush_interval
+        self.lock = threading.Lock()
+        self.conn = sqlite3.connect(db_path, check_same_thread=False)
+        with self.lock, self.conn:
+            self.conn.execute(
+                'CREATE TABLE IF NOT EXISTS download_job ('
+                'id TEXT PRIMARY KEY, name TEXT, created_at REAL NOT NULL)'
+            )
+            self.conn.execute(
+                'CREATE TABLE IF NOT EXISTS download_job_task ('
+                'job_id TEXT NOT NULL, task_id TEXT NOT NULL, seq INTEGER NOT NULL, track TEXT NOT NULL, '
+                'quality TEXT, download_lyrics INTEGER, download_dir TEXT, status TEXT, progress REAL, '
+                'error_message TEXT, file_path TEXT, PRIMARY KEY (job_id, task_id))'
+            )
+
+        # 待写入的状态变化：(job_id, task_id) -> (status, progress, error_message, file_path)
+        self.pending: Dict[Tuple[str, str], Tuple[str, float, str, str]] = {}
+        self.pending_lock = threading.Lock()
+        self.wakeup = threading.Event()
+        self.closed = False
+        self.flush_thread = threading.Thread(target=self._flush_loop, daemon=True)
+        self.flush_thread.start()
+
+    def create_job(self, job_id: str, name: str, tasks: List[DownloadTask]):
+        """记录一批新的下载任务"""
+        try:
+            with self.lock, self.conn:
+                self.conn.execute('INSERT OR REPLACE INTO download_job (id, name, created_at) VALUES (?, ?, ?)',
+                                  (job_id, name, time.time()))
+                self._insert_tasks(job_id, tasks, 0)
+        except sqlite3.Error as e:
+            logging.warning(f"写入下载任务日志失败：{name}，错误：{str(e)}")
+
+    def add_tasks(self, job_id: str, tasks: List[DownloadTask]):
+        """向下载中的一批任务追加任务，排在已有任务之后"""
+        try:
+            with self.lock, self.conn:
+                row = self.conn.execute('SELECT COALESCE(MAX(seq) + 1, 0) FROM download_job_task WHERE job_id = ?',
+                                        (job_id,)).fetchone()
+                self._insert_tasks(job_id, tasks, row[0])
+        except sqlite3.Error as e:
+            logging.warning(f"写入下载任务日志失败：{str(e)}")
+
+    def _insert_tasks(self, job_id: str, tasks: List[DownloadTask], first_seq: int):
+        rows = [
+            (job_id, task.id, seq, json.dumps(task.track, ensure_ascii=False), task.quality,
+             int(task.download_lyrics), task.download_dir, task.status, task.progress,
+             task.error_message, task.file_path)
+            for seq, task in enumerate(tasks, first_seq)
+        ]
+        self.conn.executemany(
+            'INSERT OR REPLACE INTO download_job_task (job_id, task_id, seq, track, quality, download_lyrics, '
+            'download_dir, status, progress, error_message, file_path) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)',
+            rows
+        )
+
+    def record(self, job_id: str, task: DownloadTask):
+        """记录任务的最新状态，同一任务在写入前的多次变化只保留最后一次"""
+        with self.pending_lock:
+            self.pending[(job_id, task.id)] = (task.status, task.progress, task.error_message, task.file_path)
+            if len(self.pending) >= JOURNAL_BATCH_SIZE:
+                self.wakeup.set()
+
+    def flush(self):
+        """立即写入所有待写入的状态变化"""
+        with self.pending_lock:
+            pending, self.pending = self.pending, {}
+        if not pending:
+            return
+        rows = [(*state, job_id, task_id) for (job_id, task_id), state in pending.items()]
+        try:
+            with self.lock, self.conn:
+                self.conn.executemany(
+                    'UPDATE download_job_task SET status = ?, progress = ?, error_message = ?, file_path = ? '
+                    'WHERE job_id = ? AND task_id = ?',
+                    rows
+                )
+        except sqlite3.Error as e:
+            logging.warning(f"写入下载任务日志失败：{str(e)}")
+
+    def _flush_loop(self):
+        while not self.closed:
+            self.wakeup.wait(self.flush_interval)
+            self.wakeup.clear()
+            self.flush()
+
+    def finish_job(self, job_id: str):
+        """整批任务结束（完成或被用户取消）后删除记录"""
+        with self.pending_lock:
+            self.pending = {key: state for key, state in self.pending.items() if key[0] != job_id}
+        try:
+            with self.lock, self.conn:
+                self.conn.execute('DELETE FROM download_job_task WHERE job_id = ?', (job_id,))
+                self.conn.execute('DELETE FROM download_job WHERE id = ?', (job_id,))
+        except sqlite3.Error as e:
+            logging.warning(f"删除下载任务日志失败：{job_id}，错误：{str(e)}")
+
+    def unfinished_jobs(self) -> List[Dict[str, Any]]:
+        """
+        获取未结束的任务批次，按创建时间从新到旧排列
+        返回: [{'id', 'name', 'created_at', 'total', 'completed'}]
+        """
+        self.flush()
+        with self.lock:
+            rows = self.conn.execute(
+                'SELECT j.id, j.name, j.created_at, COUNT(t.task_id), '
+                "COALESCE(SUM(t.status = 'completed'), 0) "
+                'FROM download_job j LEFT JOIN download_job_task t ON t.job_id = j.id '
+                'GROUP BY j.id ORDER BY j.created_at DESC'
+            ).fetchall()
+        return [{'id': row[0], 'name': row[1], 'created_at': row[2], 'total': row[3], 'completed': row[4]}
+                for row in rows]
+
+    def load_tasks(self, job_id: str) -> List[DownloadTask]:
+        """按原顺序读取一批任务，未完成的任务恢复为等待状态"""
+        self.flush()
+        with self.lock:
+            rows = self.conn.execute(
+                'SELECT task_id, track, quality, download_lyrics, download_dir, status, progress, file_path '
+                'FROM download_job_task WHERE job_id = ? ORDER BY seq',
+                (job_id,)
+            ).fetchall()
+        tasks = []
+        for task_id, track, quality, download_lyrics, download_dir, status, progress, file_path in rows:
+            completed = status == "completed"
+            tasks.append(DownloadTask(
+                id=task_id,
+                track=json.loads(track),
+                quality=quality,
+                download_lyrics=bool(download_lyrics),
+                download_dir=download_dir,
+                status="completed" if completed else "pending",
+                progress=1.0 if completed else (progress or 0.0),
+                file_path=file_path or ""
+            ))
+        return tasks
+
+    def close(self):
+        """写入剩余的状态变化并关闭数据库连接"""
+        self.closed = True
+        self.wakeup.set()
+        self.flush_thread.join()
+        self.flush()
+        with self.lock:
+            self.conn.close()
+
+
+_journal: Optional[DownloadJournal] = None
+_journal_lock = threading.Lock()
+
+
+def get_download_journal() -> DownloadJournal:
+    """获取全局共享的下载任务日志"""
+    global _journal
+    if _journal is None:
+        with _journal_lock:
+            if _journal is None:
+                _journal = DownloadJournal()
+    return _journal
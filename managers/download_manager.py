@@ -4,14 +4,27 @@
 import threading
 from typing import Dict, List, Optional, Tuple
 from models.download_task import DownloadTask
+from managers.download_journal import DownloadJournal
 
 
 class DownloadProgressManager:
     """下载进度管理器"""
-    
+
     def __init__(self):
         self.tasks: Dict[str, DownloadTask] = {}
         self.lock = threading.Lock()
+        self.journal: Optional[DownloadJournal] = None
+        self.job_id = ""
+
+    def attach_journal(self, journal: DownloadJournal, job_id: str):
+        """之后的任务状态变化同步记录到下载任务日志"""
+        with self.lock:
+            self.journal = journal
+            self.job_id = job_id
+
+    def _record(self, task: DownloadTask):
+        if self.journal is not None:
+            self.journal.record(self.job_id, task)
 
     def add_task(self, task: DownloadTask):
         """添加下载任务"""
@@ -24,6 +37,7 @@ class DownloadProgressManager:
             if task_id in self.tasks:
                 self.tasks[task_id].progress = progress
                 self.tasks[task_id].speed = speed
+                self._record(self.tasks[task_id])
 
     def update_task_status(self, task_id: str, status: str, error_message: str = ""):
         """更新任务状态"""
@@ -31,6 +45,7 @@ class DownloadProgressManager:
             if task_id in self.tasks:
                 self.tasks[task_id].status = status
                 self.tasks[task_id].error_message = error_message
+                self._record(self.tasks[task_id])
 
     def get_task(self, task_id: str) -> Optional[DownloadTask]:
         """获取指定任务"""
@@ -0,0 +1,69 @@
+"""
+已下载文件记录
+下载完成时记录文件的服务端大小、音频数据长度和标签区长度，再次下载同一文件时直接按记录检查是否完整，
+不需要请求服务端文件头部
+"""
+import logging
+import os
+import sqlite3
+import threading
+import time
+from typing import Any, Dict, Optional
+from managers.song_cache import SONG_CACHE_FILE
+
+
+class DownloadedFileStore:
+    """已下载文件记录管理"""
+
+    def __init__(self, db_path: str = SONG_CACHE_FILE):
+        self.db_path = db_path
+        self.lock = threading.Lock()
+        self.conn = sqlite3.connect(db_path, check_same_thread=False)
+        with self.lock, self.conn:
+            self.conn.execute(
+                'CREATE TABLE IF NOT EXISTS downloaded_file ('
+                'path TEXT PRIMARY KEY, server_size INTEGER NOT NULL, audio_size INTEGER NOT NULL, '
+                'tag_size INTEGER NOT NULL, updated_at REAL NOT NULL)'
+            )
+
+    def get(self, file_path: str) -> Optional[Dict[str, Any]]:
+        """获取文件记录: {'server_size', 'audio_size', 'tag_size'}，没有记录返回 None"""
+        with self.lock:
+            row = self.conn.execute(
+                'SELECT server_size, audio_size, tag_size FROM downloaded_file WHERE path = ?',
+                (os.path.abspath(file_path),)
+            ).fetchone()
+        if row is None:
+            return None
+        return {'server_size': row[0], 'audio_size': row[1], 'tag_size': row[2]}
+
+    def put(self, file_path: str, server_size: int, audio_size: int, tag_size: int):
+        """记录下载完成的文件，audio_size 为去掉标签区后的长度"""
+        try:
+            with self.lock, self.conn:
+                self.conn.execute(
+                    'INSERT OR REPLACE INTO downloaded_file (path, server_size, audio_size, tag_size, updated_at) '
+                    'VALUES (?, ?, ?, ?, ?)',
+                    (os.path.abspath(file_path), server_size, audio_size, tag_size, time.time())
+                )
+        except sqlite3.Error as e:
+            logging.warning(f"写入已下载文件记录失败：{file_path}，错误：{str(e)}")
+
+    def close(self):
+        """关闭数据库连接"""
+        with self.lock:
+            self.conn.close()
+
+
+_store: Optional[DownloadedFileStore] = None
+_store_lock = threading.Lock()
+
+
+def get_downloaded_files() -> DownloadedFileStore:
+    """获取全局共享的已下载文件记录"""
+    global _store
+    if _store is None:
+        with _store_lock:
+            if _store is None:
+                _store = DownloadedFileStore()
+    return _store
@@ -0,0 +1,88 @@
+"""
+歌单快照
+保存每个歌单上次解析得到的曲目列表和 trackUpdateTime，重新解析时只需获取新增歌曲的详情
+快照中的曲目详情与歌曲详情缓存使用相同的有效期，过期后重新获取
+"""
+import json
+import logging
+import sqlite3
+import threading
+import time
+from typing import Any, Dict, List, Optional
+from managers.song_cache import SONG_CACHE_FILE, SONG_CACHE_TTL
+
+
+class PlaylistSnapshotStore:
+    """歌单快照管理"""
+
+    def __init__(self, db_path: str = SONG_CACHE_FILE, ttl: float = SONG_CACHE_TTL):
+        self.db_path = db_path
+        self.ttl = ttl
+        self.lock = threading.Lock()
+        self.conn = sqlite3.connect(db_path, check_same_thread=False)
+        with self.lock, self.conn:
+            self.conn.execute(
+                'CREATE TABLE IF NOT EXISTS playlist_snapshot ('
+                'id TEXT PRIMARY KEY, name TEXT, track_update_time INTEGER, '
+                'tracks TEXT NOT NULL, updated_at REAL NOT NULL)'
+            )
+
+    def get(self, playlist_id: str) -> Optional[Dict[str, Any]]:
+        """
+        获取歌单快照: {'name', 'track_update_time', 'tracks', 'updated_at', 'expired'}，不存在返回 None
+        expired 为真时快照中的曲目详情已超过有效期，只能用于对比新增和移除的歌曲
+        """
+        with self.lock:
+            row = self.conn.execute(
+                'SELECT name, track_update_time, tracks, updated_at FROM playlist_snapshot WHERE id = ?',
+                (str(playlist_id),)
+            ).fetchone()
+        if row is None:
+            return None
+        expired = self.ttl <= 0 or row[3] < time.time() - self.ttl
+        return {'name': row[0], 'track_update_time': row[1], 'tracks': json.loads(row[2]),
+                'updated_at': row[3], 'expired': expired}
+
+    def save(self, playlist_id: str, name: str, track_update_time: Optional[int], tracks: List[Dict[str, Any]],
+             updated_at: Optional[float] = None):
+        """
+        保存歌单快照，tracks 为按歌单顺序排列的曲目
+        updated_at 为曲目详情的获取时间，沿用旧快照的详情时传入旧快照的时间，避免有效期被不断延长
+        """
+        try:
+            with self.lock, self.conn:
+                self.conn.execute(
+                    'INSERT OR REPLACE INTO playlist_snapshot (id, name, track_update_time, tracks, updated_at) '
+                    'VALUES (?, ?, ?, ?, ?)',
+                    (str(playlist_id), name, track_update_time, json.dumps(tracks, ensure_ascii=False),
+                     updated_at if updated_at is not None else time.time())
+                )
+        except sqlite3.Error as e:
+            logging.warning(f"保存歌单快照失败：{playlist_id}，错误：{str(e)}")
+
+    def delete(self, playlist_id: str):
+        """删除歌单快照，下次解析时完整获取"""
+        try:
+            with self.lock, self.conn:
+                self.conn.execute('DELETE FROM playlist_snapshot WHERE id = ?', (str(playlist_id),))
+        except sqlite3.Error as e:
+            logging.warning(f"删除歌单快照失败：{playlist_id}，错误：{str(e)}")
+
+    def close(self):
+        """关闭数据库连接"""
+        with self.lock:
+            self.conn.close()
+
+
+_store: Optional[PlaylistSnapshotStore] = None
+_store_lock = threading.Lock()
+
+
+def get_playlist_snapshots() -> PlaylistSnapshotStore:
+    """获取全局共享的歌单快照存储"""
+    global _store
+    if _store is None:
+        with _store_lock:
+            if _store is None:
+                _store = PlaylistSnapshotStore()
+    return _store
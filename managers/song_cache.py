@@ -0,0 +1,105 @@
+"""
+歌曲详情缓存
+以歌曲ID为键把 v3/song/detail 的结果持久化到本地 SQLite，重复解析时无需再次请求
+"""
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+from typing import Any, Dict, Iterable, List, Optional
+
+SONG_CACHE_FILE = 'song_cache.db'
+# 缓存有效期（秒），0 表示不使用缓存；设置 DOWNLIST_SONG_CACHE_TTL 环境变量或调用 configure_song_cache 修改
+SONG_CACHE_TTL_ENV = 'DOWNLIST_SONG_CACHE_TTL'
+SONG_CACHE_TTL = float(os.environ.get(SONG_CACHE_TTL_ENV) or 7 * 24 * 3600)
+
+
+class SongDetailCache:
+    """歌曲详情缓存管理"""
+
+    def __init__(self, db_path: str = SONG_CACHE_FILE, ttl: float = SONG_CACHE_TTL):
+        self.db_path = db_path
+        self.ttl = ttl
+        self.lock = threading.Lock()
+        self.conn = sqlite3.connect(db_path, check_same_thread=False)
+        with self.lock, self.conn:
+            self.conn.execute(
+                'CREATE TABLE IF NOT EXISTS song_detail ('
+                'id TEXT PRIMARY KEY, data TEXT NOT NULL, updated_at REAL NOT NULL)'
+            )
+        # 打开时清理过期条目，避免缓存文件无限增长
+        self.purge_expired()
+
+    def get(self, song_id: str) -> Optional[Dict[str, Any]]:
+        """获取单首歌曲详情，未命中或已过期返回 None"""
+        return self.get_many([song_id]).get(str(song_id))
+
+    def get_many(self, song_ids: Iterable[str]) -> Dict[str, Dict[str, Any]]:
+        """批量获取歌曲详情，只返回命中且未过期的条目"""
+        ids = [str(sid) for sid in song_ids]
+        if not ids or self.ttl <= 0:
+            return {}
+        min_time = time.time() - self.ttl
+        result: Dict[str, Dict[str, Any]] = {}
+        with self.lock:
+            # SQLite 单条语句的参数个数有限，分段查询
+            for i in range(0, len(ids), 500):
+                chunk = ids[i:i+500]
+                rows = self.conn.execute(
+                    f"SELECT id, data FROM song_detail WHERE updated_at >= ? AND id IN ({','.join('?' * len(chunk))})",
+                    [min_time, *chunk]
+                ).fetchall()
+                for song_id, data in rows:
+                    result[song_id] = json.loads(data)
+        return result
+
+    def put_many(self, songs: List[Dict[str, Any]]):
+        """写入歌曲详情"""
+        if not songs or self.ttl <= 0:
+            return
+        now = time.time()
+        rows = [(str(song['id']), json.dumps(song, ensure_ascii=False), now) for song in songs]
+        try:
+            with self.lock, self.conn:
+                self.conn.executemany('INSERT OR REPLACE INTO song_detail (id, data, updated_at) VALUES (?, ?, ?)', rows)
+        except sqlite3.Error as e:
+            logging.warning(f"写入歌曲详情缓存失败：{str(e)}")
+
+    def purge_expired(self):
+        """删除过期条目"""
+        try:
+            with self.lock, self.conn:
+                self.conn.execute('DELETE FROM song_detail WHERE updated_at < ?', (time.time() - self.ttl,))
+        except sqlite3.Error as e:
+            logging.warning(f"清理过期歌曲详情缓存失败：{str(e)}")
+
+    def close(self):
+        """关闭数据库连接"""
+        with self.lock:
+            self.conn.close()
+
+
+_cache: Optional[SongDetailCache] = None
+_cache_lock = threading.Lock()
+
+
+def get_song_cache() -> SongDetailCache:
+    """获取全局共享的歌曲详情缓存"""
+    global _cache
+    if _cache is None:
+        with _cache_lock:
+            if _cache is None:
+                _cache = SongDetailCache()
+    return _cache
+
+
+def configure_song_cache(db_path: str = SONG_CACHE_FILE, ttl: float = SONG_CACHE_TTL) -> SongDetailCache:
+    """使用新的路径或有效期替换全局缓存"""
+    global _cache
+    with _cache_lock:
+        if _cache is not None:
+            _cache.close()
+        _cache = SongDetailCache(db_path, ttl)
+    return _cache
@@ -0,0 +1,58 @@
+"""
+下载链接缓存
+按 (歌曲ID, 音质) 保存 player/url/v1 返回的签名链接，并遵守链接的过期时间
+"""
+import threading
+import time
+from typing import Any, Dict, Optional, Tuple
+
+URL_DEFAULT_TTL = 1200  # 接口未返回 expi 时链接的默认有效期（秒）
+URL_EXPIRY_MARGIN = 60  # 距过期不足该秒数的链接视为已过期，留出传输开始前的余量
+
+
+class DownloadUrlCache:
+    """下载链接缓存管理"""
+
+    def __init__(self, margin: float = URL_EXPIRY_MARGIN):
+        self.margin = margin
+        self.entries: Dict[Tuple[str, str], Dict[str, Any]] = {}
+        self.lock = threading.Lock()
+
+    def get(self, song_id: str, quality: str) -> Optional[Dict[str, Any]]:
+        """获取未过期的链接信息"""
+        key = (str(song_id), quality)
+        with self.lock:
+            info = self.entries.get(key)
+            if info is None:
+                return None
+            if info['expires_at'] - self.margin <= time.time():
+                del self.entries[key]
+                return None
+            return info
+
+    def is_fresh(self, song_id: str, quality: str) -> bool:
+        """链接是否已缓存且未过期"""
+        return self.get(song_id, quality) is not None
+
+    def put(self, song_id: str, quality: str, info: Dict[str, Any]):
+        """写入链接信息，缺少过期时间时使用默认有效期"""
+        info = dict(info)
+        if not info.get('expires_at'):
+            info['expires_at'] = time.time() + URL_DEFAULT_TTL
+        with self.lock:
+            self.entries[(str(song_id), quality)] = info
+
+    def put_many(self, quality: str, resolved: Dict[str, Dict[str, Any]]):
+        """批量写入同一音质的链接信息"""
+        for song_id, info in resolved.items():
+            self.put(song_id, quality, info)
+
+    def invalidate(self, song_id: str, quality: str):
+        """移除链接，例如传输返回 403 时"""
+        with self.lock:
+            self.entries.pop((str(song_id), quality), None)
+
+    def clear(self):
+        """清空缓存"""
+        with self.lock:
+            self.entries.clear()
@@ -2,7 +2,7 @@
 下载任务数据模型
 """
 from dataclasses import dataclass
-from typing import Dict
+from typing import Any, Dict, Optional
 
 
 @dataclass
@@ -18,3 +18,21 @@ class DownloadTask:
     speed: float = 0.0
     error_message: str = ""
     file_path: str = ""
+    priority: int = 1  # 调度优先级，数值越小越先下载（见 core.scheduler）
+
+
+@dataclass
+class ResolvedTask:
+    """已解析出下载链接、等待传输和后处理的任务"""
+    task: DownloadTask
+    song_id: str
+    song_name: str  # 已清理无效字符
+    artists: str
+    album: str
+    cover_url: str
+    url_info: Dict[str, Any]
+    file_path: str
+    part_path: str
+    lyrics: Optional[str] = None  # 已获取的歌词，None 表示未获取
+    tagger: Optional[Any] = None  # InlineTagger，传输中写入标签时使用
+    tag_data: Optional[Any] = None  # 后台获取 (封面数据, 歌词) 的 Future，传输中写入标签时使用
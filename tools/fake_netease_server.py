@@ -0,0 +1,437 @@
+#!/usr/bin/env python3
+"""
+本地网易云音乐替身服务器
+实现 api/netease_api.py 与 CookieManager 用到的接口，并提供可配置大小、延迟、带宽和错误注入的合成音频，
+用于离线测试和基准测试
+
+用法:
+    python tools/fake_netease_server.py --port 8163 --tracks 500 --bandwidth 2MB
+    DOWNLIST_API_BASE=http://127.0.0.1:8163 python app.py
+
+代码中使用:
+    with FakeNeteaseServer(FakeNeteaseConfig(tracks=100)) as server:
+        set_api_base_url(server.base_url)
+"""
+import argparse
+import hashlib
+import io
+import json
+import os
+import random
+import re
+import sys
+import threading
+import time
+import urllib.parse
+from collections import deque
+from dataclasses import dataclass
+from functools import lru_cache
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Dict, Optional, Tuple
+
+from cryptography.hazmat.primitives import padding
+from cryptography.hazmat.primitives.ciphers import Cipher, algorithms, modes
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from api.netease_api import EAPI_AES_KEY, hash_hex_digest  # noqa: E402
+
+MB = 1024 * 1024
+EAPI_SEPARATOR = '-36cd479b6b5-'
+MP3_LEVELS = {'standard', 'higher', 'exhigh'}  # 其余音质返回 FLAC
+
+
+@dataclass
+class FakeNeteaseConfig:
+    """替身服务器配置"""
+    tracks: int = 200  # 每个歌单的歌曲数
+    mp3_size: int = 4 * MB  # 合成 MP3 文件大小（字节）
+    flac_size: int = 20 * MB  # 合成 FLAC 文件大小（字节）
+    api_latency: float = 0.0  # 接口响应延迟（秒）
+    file_latency: float = 0.0  # 音频响应首字节延迟（秒）
+    bandwidth: int = 0  # 单个连接的带宽上限（字节/秒），0 表示不限速
+    error_rate: float = 0.0  # 音频请求返回 500 的概率
+    drop_rate: float = 0.0  # 音频传输到一半时断开连接的概率
+    api_error_rate: float = 0.0  # 接口返回 503 的概率
+    rate_limit: float = 0.0  # 接口每秒请求上限，超出时返回 code -460，0 表示不限
+    url_expiry: int = 1200  # 下载链接有效期（秒），过期后请求返回 403
+    cover_size: int = 1000  # 封面原图边长（像素）
+
+
+def decrypt_eapi_params(params_hex: str) -> Tuple[str, Dict[str, Any]]:
+    """解密 eapi 的 params，校验摘要后返回 (接口路径, 请求体)"""
+    cipher = Cipher(algorithms.AES(EAPI_AES_KEY), modes.ECB())
+    decryptor = cipher.decryptor()
+    padded = decryptor.update(bytes.fromhex(params_hex)) + decryptor.finalize()
+    unpadder = padding.PKCS7(algorithms.AES(EAPI_AES_KEY).block_size).unpadder()
+    text = (unpadder.update(padded) + unpadder.finalize()).decode('utf-8')
+    path, payload, digest = text.split(EAPI_SEPARATOR)
+    if hash_hex_digest(f"nobody{path}use{payload}md5forencrypt") != digest:
+        raise ValueError("eapi 摘要校验失败")
+    return path, json.loads(payload)
+
+
+def _stream_info_block() -> bytes:
+    """FLAC STREAMINFO 元数据块：44.1kHz、双声道、16 位"""
+    bits = (4096 << 256) | (4096 << 240) | (44100 << 172) | (1 << 169) | (15 << 164)
+    header = bytes([0x80]) + (34).to_bytes(3, 'big')  # 最后一个元数据块
+    return header + bits.to_bytes(34, 'big')
+
+
+@lru_cache(maxsize=8)
+def synth_audio(song_id: int, kind: str, size: int) -> bytes:
+    """按歌曲ID生成确定性的合成音频，MP3 由合法帧组成，FLAC 带 STREAMINFO，可被 mutagen 读写标签"""
+    seed = hashlib.sha256(f"{song_id}-{kind}".encode()).digest()
+    if kind == 'mp3':
+        # MPEG-1 Layer III，128kbps，44.1kHz，每帧 417 字节
+        frame = b'\xff\xfb\x90\x00' + (seed * 13)[:413]
+        data = frame * (size // len(frame) + 1)
+    else:
+        head = b'fLaC' + _stream_info_block()
+        data = head + seed * ((size - len(head)) // len(seed) + 1)
+    return data[:size]
+
+
+@lru_cache(maxsize=4096)
+def synth_md5(song_id: int, kind: str, size: int) -> str:
+    """合成音频的 MD5"""
+    return hashlib.md5(synth_audio(song_id, kind, size)).hexdigest()
+
+
+@lru_cache(maxsize=16)
+def synth_cover(size: int) -> bytes:
+    """生成指定边长的 JPEG 封面"""
+    from PIL import Image
+    image = Image.new('RGB', (size, size), (29, 185, 84))
+    output = io.BytesIO()
+    image.save(output, format='JPEG', quality=90)
+    return output.getvalue()
+
+
+class FakeNeteaseHandler(BaseHTTPRequestHandler):
+    """替身服务器请求处理"""
+    protocol_version = 'HTTP/1.1'
+    disable_nagle_algorithm = True
+
+    @property
+    def config(self) -> FakeNeteaseConfig:
+        return self.server.config
+
+    def log_message(self, format, *args):
+        pass
+
+    def handle(self):
+        try:
+            super().handle()
+        except (BrokenPipeError, ConnectionResetError):
+            # 客户端取消下载时主动断开连接
+            pass
+
+    # ---- 基础工具 ----
+
+    def _send(self, status: int, body: bytes, content_type: str = 'application/json', headers: Optional[Dict[str, str]] = None):
+        self.send_response(status)
+        self.send_header('Content-Type', content_type)
+        self.send_header('Content-Length', str(len(body)))
+        for key, value in (headers or {}).items():
+            self.send_header(key, value)
+        self.end_headers()
+        if self.command != 'HEAD':
+            self.wfile.write(body)
+
+    def _send_json(self, data: Dict[str, Any], status: int = 200):
+        self._send(status, json.dumps(data, ensure_ascii=False).encode('utf-8'))
+
+    def _read_form(self) -> Dict[str, str]:
+        length = int(self.headers.get('Content-Length', 0))
+        body = self.rfile.read(length).decode('utf-8') if length else ''
+        return {k: v[0] for k, v in urllib.parse.parse_qs(body).items()}
+
+    def _cookies(self) -> Dict[str, str]:
+        pairs = [item.strip().split('=', 1) for item in self.headers.get('Cookie', '').split(';') if '=' in item]
+        return {k: v for k, v in pairs}
+
+    def _base_url(self) -> str:
+        return f"http://{self.headers.get('Host') or '%s:%s' % self.server.server_address[:2]}"
+
+    # ---- 接口 ----
+
+    def do_POST(self):
+        path = urllib.parse.urlparse(self.path).path
+        form = self._read_form()
+        self.server.stats['api'] += 1
+        if self.config.api_latency:
+            time.sleep(self.config.api_latency)
+        if random.random() < self.config.api_error_rate:
+            self._send_json({'code': 503, 'message': 'injected error'}, status=503)
+            return
+        if self.server.over_rate_limit():
+            self._send_json({'code': -460, 'message': 'Cheating'})
+            return
+
+        routes = {
+            '/eapi/song/enhance/player/url/v1': self._player_url,
+            '/api/v3/song/detail': self._song_detail,
+            '/api/song/lyric': self._lyric,
+            '/api/v6/playlist/detail': self._playlist_detail,
+            '/api/nuser/account/get': self._account,
+        }
+        handler = routes.get(path)
+        if handler is None:
+            self._send_json({'code': 404, 'message': 'not found'}, status=404)
+            return
+        try:
+            self._send_json(handler(form))
+        except (KeyError, ValueError) as e:
+            self._send_json({'code': 400, 'message': str(e)})
+
+    def _player_url(self, form: Dict[str, str]) -> Dict[str, Any]:
+        _, payload = decrypt_eapi_params(form['params'])
+        ids = payload['ids'] if isinstance(payload['ids'], list) else json.loads(payload['ids'])
+        level = payload.get('level', 'standard')
+        kind = 'mp3' if level in MP3_LEVELS else 'flac'
+        size = self.config.mp3_size if kind == 'mp3' else self.config.flac_size
+        expires = int(time.time()) + self.config.url_expiry
+        data = []
+        for sid in ids:
+            sid = int(sid)
+            data.append({
+                'id': sid,
+                'url': f"{self._base_url()}/audio/{sid}.{kind}?level={level}&expires={expires}",
+                'br': 128000 if kind == 'mp3' else 1411000,
+                'size': size,
+                'md5': synth_md5(sid, kind, size),
+                'code': 200,
+                'expi': self.config.url_expiry,
+                'type': kind,
+                'level': level,
+                'encodeType': kind
+            })
+        return {'code': 200, 'data': data}
+
+    def _song(self, sid: int) -> Dict[str, Any]:
+        album_id = sid // 10  # 每 10 首歌属于同一张专辑
+        return {
+            'id': sid,
+            'name': f"Song {sid}",
+            'ar': [{'id': sid % 50, 'name': f"Artist {sid % 50}"}],
+            'al': {'id': album_id, 'name': f"Album {album_id}", 'picUrl': f"{self._base_url()}/cover/{album_id}.jpg"},
+            'dt': 240000,
+            'l': {'br': 128000, 'size': self.config.mp3_size},
+            'h': {'br': 320000, 'size': self.config.mp3_size},
+            'sq': {'br': 1411000, 'size': self.config.flac_size}
+        }
+
+    def _song_detail(self, form: Dict[str, str]) -> Dict[str, Any]:
+        songs = [self._song(int(item['id'])) for item in json.loads(form['c'])]
+        return {'code': 200, 'songs': songs}
+
+    def _lyric(self, form: Dict[str, str]) -> Dict[str, Any]:
+        sid = form['id']
+        lyric = ''.join(f"[{m:02d}:00.00]Song {sid} line {m}\n" for m in range(4))
+        return {'code': 200, 'lrc': {'version': 1, 'lyric': lyric}}
+
+    def _playlist_detail(self, form: Dict[str, str]) -> Dict[str, Any]:
+        pid = int(form['id'])
+        track_ids = [{'id': pid * 100000 + i} for i in range(1, self.config.tracks + 1)]
+        return {
+            'code': 200,
+            'playlist': {
+                'id': pid,
+                'name': f"Fake Playlist {pid}",
+                'trackCount': len(track_ids),
+                'trackUpdateTime': self.server.started_at,
+                'trackIds': track_ids
+            }
+        }
+
+    def _account(self, form: Dict[str, str]) -> Dict[str, Any]:
+        if not self._cookies().get('MUSIC_U'):
+            return {'code': 200, 'account': None, 'profile': None}
+        return {'code': 200, 'account': {'id': 1}, 'profile': {'userId': 1, 'nickname': 'Fake User'}}
+
+    # ---- 文件 ----
+
+    def do_HEAD(self):
+        self.do_GET()
+
+    def do_GET(self):
+        parsed = urllib.parse.urlparse(self.path)
+        query = {k: v[0] for k, v in urllib.parse.parse_qs(parsed.query).items()}
+        audio = re.fullmatch(r'/audio/(\d+)\.(mp3|flac)', parsed.path)
+        cover = re.fullmatch(r'/cover/(\d+)\.jpg', parsed.path)
+        if audio:
+            self._audio(int(audio.group(1)), audio.group(2), query)
+        elif cover:
+            self._cover(query)
+        else:
+            self._send(404, b'not found', 'text/plain')
+
+    def _cover(self, query: Dict[str, str]):
+        size = self.config.cover_size
+        match = re.fullmatch(r'(\d+)y(\d+)', query.get('param', ''))
+        if match:
+            # 模拟 CDN 的 param=宽y高 缩放参数
+            size = min(size, int(match.group(1)))
+        self._send(200, synth_cover(size), 'image/jpeg')
+
+    def _audio(self, sid: int, kind: str, query: Dict[str, str]):
+        self.server.stats['audio'] += 1
+        if int(query.get('expires', 0)) < time.time():
+            self._send(403, b'expired', 'text/plain')
+            return
+        if random.random() < self.config.error_rate:
+            self._send(500, b'injected error', 'text/plain')
+            return
+        if self.config.file_latency:
+            time.sleep(self.config.file_latency)
+
+        data = synth_audio(sid, kind, self.config.mp3_size if kind == 'mp3' else self.config.flac_size)
+        start, end = 0, len(data) - 1
+        status = 200
+        content_range = None
+        range_match = re.fullmatch(r'bytes=(\d*)-(\d*)', self.headers.get('Range', ''))
+        if range_match and (range_match.group(1) or range_match.group(2)):
+            if range_match.group(1):
+                start = int(range_match.group(1))
+                end = min(int(range_match.group(2)), end) if range_match.group(2) else end
+            else:
+                start = max(0, len(data) - int(range_match.group(2)))
+            if start > end:
+                self._send(416, b'', 'text/plain', {'Content-Range': f"bytes */{len(data)}"})
+                return
+            status = 206
+            content_range = f"bytes {start}-{end}/{len(data)}"
+
+        self.send_response(status)
+        self.send_header('Content-Type', 'audio/mpeg' if kind == 'mp3' else 'audio/flac')
+        self.send_header('Content-Length', str(end - start + 1))
+        self.send_header('Accept-Ranges', 'bytes')
+        if content_range:
+            self.send_header('Content-Range', content_range)
+        self.end_headers()
+        if self.command == 'HEAD':
+            return
+
+        view = memoryview(data)[start:end + 1]
+        if random.random() < self.config.drop_rate:
+            # 只发送一半数据后断开，模拟传输中断
+            view = view[:len(view) // 2]
+            self.close_connection = True
+        chunk = 64 * 1024
+        started = time.monotonic()
+        sent = 0
+        try:
+            for offset in range(0, len(view), chunk):
+                self.wfile.write(view[offset:offset + chunk])
+                sent += min(chunk, len(view) - offset)
+                if self.config.bandwidth:
+                    # 按单连接带宽上限限速
+                    delay = sent / self.config.bandwidth - (time.monotonic() - started)
+                    if delay > 0:
+                        time.sleep(delay)
+        except (BrokenPipeError, ConnectionResetError):
+            self.close_connection = True
+
+
+class FakeNeteaseServer:
+    """在后台线程运行的替身服务器"""
+
+    def __init__(self, config: Optional[FakeNeteaseConfig] = None, host: str = '127.0.0.1', port: int = 0):
+        self.httpd = ThreadingHTTPServer((host, port), FakeNeteaseHandler)
+        self.httpd.daemon_threads = True
+        self.httpd.config = config or FakeNeteaseConfig()
+        self.httpd.started_at = int(time.time() * 1000)
+        self.httpd.stats = {'api': 0, 'audio': 0}
+        self.httpd.request_times = deque()
+        self.httpd.rate_lock = threading.Lock()
+        self.httpd.over_rate_limit = self._over_rate_limit
+        self.thread: Optional[threading.Thread] = None
+
+    @property
+    def config(self) -> FakeNeteaseConfig:
+        return self.httpd.config
+
+    @property
+    def stats(self) -> Dict[str, int]:
+        """已处理的接口请求数和音频请求数"""
+        return self.httpd.stats
+
+    @property
+    def base_url(self) -> str:
+        host, port = self.httpd.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def _over_rate_limit(self) -> bool:
+        """滑动窗口统计最近一秒的接口请求数"""
+        if not self.config.rate_limit:
+            return False
+        now = time.monotonic()
+        with self.httpd.rate_lock:
+            times = self.httpd.request_times
+            while times and times[0] < now - 1:
+                times.popleft()
+            if len(times) >= self.config.rate_limit:
+                return True
+            times.append(now)
+            return False
+
+    def start(self) -> 'FakeNeteaseServer':
+        self.thread = threading.Thread(target=self.httpd.serve_forever, daemon=True)
+        self.thread.start()
+        return self
+
+    def stop(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+    def __enter__(self) -> 'FakeNeteaseServer':
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+
+def parse_size(text: str) -> int:
+    """解析 4MB、512KB、1048576 这类大小"""
+    match = re.fullmatch(r'(\d+(?:\.\d+)?)\s*([KMG]?)B?', text.strip().upper())
+    if not match:
+        raise argparse.ArgumentTypeError(f"无效的大小：{text}")
+    return int(float(match.group(1)) * {'': 1, 'K': 1024, 'M': MB, 'G': 1024 * MB}[match.group(2)])
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8163)
+    parser.add_argument('--tracks', type=int, default=200, help='每个歌单的歌曲数')
+    parser.add_argument('--mp3-size', type=parse_size, default=4 * MB)
+    parser.add_argument('--flac-size', type=parse_size, default=20 * MB)
+    parser.add_argument('--api-latency', type=float, default=0.0, help='接口延迟（秒）')
+    parser.add_argument('--file-latency', type=float, default=0.0, help='音频首字节延迟（秒）')
+    parser.add_argument('--bandwidth', type=parse_size, default=0, help='单连接带宽（每秒），0 不限速')
+    parser.add_argument('--error-rate', type=float, default=0.0, help='音频请求失败概率')
+    parser.add_argument('--drop-rate', type=float, default=0.0, help='音频传输中途断开的概率')
+    parser.add_argument('--api-error-rate', type=float, default=0.0, help='接口失败概率')
+    parser.add_argument('--rate-limit', type=float, default=0.0, help='接口每秒请求上限')
+    parser.add_argument('--url-expiry', type=int, default=1200, help='下载链接有效期（秒）')
+    args = parser.parse_args()
+
+    config = FakeNeteaseConfig(
+        tracks=args.tracks, mp3_size=args.mp3_size, flac_size=args.flac_size,
+        api_latency=args.api_latency, file_latency=args.file_latency, bandwidth=args.bandwidth,
+        error_rate=args.error_rate, drop_rate=args.drop_rate, api_error_rate=args.api_error_rate,
+        rate_limit=args.rate_limit, url_expiry=args.url_expiry
+    )
+    server = FakeNeteaseServer(config, args.host, args.port)
+    print(f"替身服务器已启动：{server.base_url}")
+    print(f"使用方法：{'set' if os.name == 'nt' else 'export'} DOWNLIST_API_BASE={server.base_url}")
+    try:
+        server.httpd.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.httpd.server_close()
+
+
+if __name__ == '__main__':
+    main()
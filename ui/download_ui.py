@@ -7,16 +7,22 @@ import threading
 import logging
 import uuid
 import time
-from concurrent.futures import ThreadPoolExecutor, as_completed
-from typing import List, Set, Dict, Any
+from typing import List, Set, Dict, Any, Optional
 from ui.base_ui import BaseUI
 from models.download_task import DownloadTask
 from managers.download_manager import DownloadProgressManager
+from managers.download_journal import get_download_journal
+from managers.cover_cache import get_cover_cache
 from managers.cookie_manager import CookieManager
-from api.netease_api import playlist_detail
+from api.netease_api import iter_playlist_detail
+from core.bandwidth import ScheduleRule, get_bandwidth_limiter
+from core.async_downloader import ASYNC_TRANSFER_WORKERS, AsyncDownloadCore, AsyncDownloadPipeline, async_engine_enabled
 from core.downloader import DownloadCore
-from utils.constants import QUALITY_OPTIONS, SORT_OPTIONS, DEFAULT_CONCURRENT_DOWNLOADS
-from utils.file_utils import extract_playlist_id, ensure_directory_exists
+from core.pipeline import DownloadPipeline
+from core.scheduler import PRIORITY_NORMAL, PRIORITY_USER
+from utils.constants import (QUALITY_OPTIONS, SORT_OPTIONS, DEFAULT_CONCURRENT_DOWNLOADS, BANDWIDTH_OPTIONS,
+                             NIGHT_UNLIMITED_START, NIGHT_UNLIMITED_END, COVER_THUMBNAIL_SIZE)
+from utils.file_utils import build_cover_url, extract_playlist_id, ensure_directory_exists
 
 
 class DownloadUI(BaseUI):
@@ -30,17 +36,25 @@ class DownloadUI(BaseUI):
         # 数据状态
         self.download_dir = "C:\\"
         self.tracks = []
+        self.playlist_name = ""
         self.selected_songs: Set[int] = set()
         self.filtered_tracks = []
         self.current_sort = "default"
+        # 歌单解析状态：逐批解析时全部下载可能在解析完成前开始，之后解析到的歌曲追加到下载中
+        self.tracks_cond = threading.Condition()
+        self.parse_generation = 0
+        self.parse_finished = True
         
-        # 下载管理
+        # 下载管理：设置 DOWNLIST_ASYNC_ENGINE=1 时解析和传输由 asyncio 引擎执行
+        self.async_engine = async_engine_enabled()
         self.download_progress_manager = DownloadProgressManager()
-        self.download_core = DownloadCore(self.download_progress_manager)
-        self.max_concurrent_downloads = DEFAULT_CONCURRENT_DOWNLOADS
-        self.thread_pool = None
-        self.download_futures = []
+        self.download_core = self._create_download_core()
+        self.max_concurrent_downloads = ASYNC_TRANSFER_WORKERS if self.async_engine else DEFAULT_CONCURRENT_DOWNLOADS
+        self.auto_concurrency = False
+        self.pipeline = None
         self.progress_update_timer = None
+        self.current_job_id = ""
+        self.journal_checked = False
         
         self.init_components()
 
@@ -62,13 +76,17 @@ class DownloadUI(BaseUI):
         )
 
         self.lyrics_checkbox = self.create_checkbox("📝 下载歌词", value=False)
+        # 短歌优先：按文件大小（解析前按时长估算）从小到大下载，尽早完成更多歌曲
+        self.shortest_first_checkbox = self.create_checkbox("⏱️ 短歌优先", value=False)
         
         # 并发控制 - Spotify风格
+        # asyncio 引擎的传输不占用线程，并发数上限更高
+        max_concurrency = self._pipeline_class().max_concurrency
         self.concurrent_slider = ft.Slider(
             min=1,
-            max=8,
-            divisions=7,
-            value=3,
+            max=max_concurrency,
+            divisions=max_concurrency - 1,
+            value=self.max_concurrent_downloads,
             label="并发数: {value}",
             width=220,
             active_color=self.primary_color,
@@ -77,11 +95,31 @@ class DownloadUI(BaseUI):
             on_change=self.on_concurrent_change
         )
         self.concurrent_text = self.create_text(
-            "🚀 并发下载: 3 个线程",
+            f"🚀 并发下载: {self.max_concurrent_downloads} 个线程",
             size=14,
             color=self.text_secondary_color
         )
+        # 自动并发：按总速度和失败率调整并发数，调整结果显示在滑块和文字上
+        self.auto_concurrency_checkbox = self.create_checkbox(
+            "🤖 自动",
+            value=False,
+            on_change=self.on_auto_concurrency_change
+        )
         
+        # 带宽限速，对所有下载立即生效
+        self.bandwidth_dropdown = self.create_dropdown(
+            "🌐 带宽限速",
+            BANDWIDTH_OPTIONS,
+            value="0",
+            width=180,
+            on_change=self.on_bandwidth_change
+        )
+        self.night_unlimited_checkbox = self.create_checkbox(
+            f"🌙 夜间不限速 ({NIGHT_UNLIMITED_START}-{NIGHT_UNLIMITED_END})",
+            value=False,
+            on_change=self.on_bandwidth_schedule_change
+        )
+
         # 按钮组件 - Spotify风格
         self.dir_button = self.create_elevated_button(
             "📁 选择目录",
@@ -264,6 +302,8 @@ class DownloadUI(BaseUI):
                     ft.Container(width=20),
                     self.lyrics_checkbox,
                     ft.Container(width=20),
+                    self.shortest_first_checkbox,
+                    ft.Container(width=20),
                     self.dir_button
                 ], alignment=ft.MainAxisAlignment.CENTER),
                 ft.Container(height=16),
@@ -272,7 +312,12 @@ class DownloadUI(BaseUI):
                 ft.Row([
                     self.concurrent_text,
                     ft.Container(width=20),
-                    self.concurrent_slider
+                    self.concurrent_slider,
+                    self.auto_concurrency_checkbox,
+                    ft.Container(width=20),
+                    self.bandwidth_dropdown,
+                    ft.Container(width=20),
+                    self.night_unlimited_checkbox
                 ], alignment=ft.MainAxisAlignment.CENTER)
             ], horizontal_alignment=ft.CrossAxisAlignment.CENTER),
             padding=24
@@ -370,6 +415,63 @@ class DownloadUI(BaseUI):
         )
         self.page.update()
 
+        # 首次显示时检查上次未完成的下载
+        if not self.journal_checked:
+            self.journal_checked = True
+            self.offer_resume_unfinished_job()
+
+    def offer_resume_unfinished_job(self):
+        """存在上次异常退出时未完成的下载任务时，询问是否继续"""
+        try:
+            jobs = get_download_journal().unfinished_jobs()
+        except Exception as e:
+            logging.error(f"读取下载任务日志失败：{str(e)}")
+            return
+        if not jobs:
+            return
+
+        # 只保留最近一批，更早的批次直接丢弃
+        job = jobs[0]
+        for stale in jobs[1:]:
+            get_download_journal().finish_job(stale['id'])
+
+        def on_resume(_):
+            self.page.close(resume_dialog)
+            self.resume_unfinished_job(job)
+
+        def on_discard(_):
+            self.page.close(resume_dialog)
+            get_download_journal().finish_job(job['id'])
+            logging.info(f"已放弃未完成的下载：{job['name']}")
+
+        resume_dialog = ft.AlertDialog(
+            modal=True,
+            title=ft.Text("继续未完成的下载", color=self.text_primary_color),
+            content=ft.Text(
+                f"上次的下载「{job['name']}」尚未完成（已完成 {job['completed']}/{job['total']}），是否继续？\n"
+                "已完成的歌曲会跳过，下载了一部分的歌曲从断点续传。",
+                color=self.text_secondary_color
+            ),
+            bgcolor=self.surface_color,
+            actions=[
+                ft.TextButton("放弃", on_click=on_discard),
+                ft.TextButton("继续下载", on_click=on_resume)
+            ],
+            actions_alignment=ft.MainAxisAlignment.END
+        )
+        self.page.open(resume_dialog)
+
+    def resume_unfinished_job(self, job: Dict[str, Any]):
+        """继续下载日志中未完成的一批任务"""
+        try:
+            self.cookie_manager.read_cookie()
+        except Exception as ex:
+            self.show_snackbar(f"❌ {str(ex)}", self.error_color)
+            logging.error(str(ex))
+            return
+
+        self._start_download_process([], is_selected_only=False, job=job)
+
     def create_song_list_section(self):
         """创建歌曲列表区域 - Spotify风格"""
         # Spotify风格搜索和排序控制栏
@@ -467,8 +569,46 @@ class DownloadUI(BaseUI):
         """并发数量变化处理"""
         self.max_concurrent_downloads = int(e.control.value)
         self.concurrent_text.value = f"🚀 并发下载: {self.max_concurrent_downloads} 个线程"
+        # 下载过程中调整时立即生效
+        pipeline = self.pipeline
+        if pipeline is not None:
+            pipeline.set_concurrency(self.max_concurrent_downloads)
+        self.page.update()
+
+    def on_auto_concurrency_change(self, e):
+        """自动并发开关变化处理"""
+        self.auto_concurrency = bool(e.control.value)
+        self.concurrent_slider.disabled = self.auto_concurrency
+        pipeline = self.pipeline
+        if pipeline is not None:
+            pipeline.set_auto_concurrency(self.auto_concurrency, self._on_auto_concurrency_update)
+            if not self.auto_concurrency:
+                pipeline.set_concurrency(self.max_concurrent_downloads)
+        if self.auto_concurrency:
+            workers = pipeline.concurrency if pipeline is not None else self.max_concurrent_downloads
+            self.concurrent_text.value = f"🚀 并发下载: 自动 ({workers} 个线程)"
+        else:
+            self.concurrent_slider.value = self.max_concurrent_downloads
+            self.concurrent_text.value = f"🚀 并发下载: {self.max_concurrent_downloads} 个线程"
+        self.page.update()
+
+    def _on_auto_concurrency_update(self, workers: int):
+        """自动并发调整后更新显示（在调整线程中调用）"""
+        self.concurrent_slider.value = workers
+        self.concurrent_text.value = f"🚀 并发下载: 自动 ({workers} 个线程)"
         self.page.update()
 
+    def on_bandwidth_change(self, e):
+        """带宽限速变化处理"""
+        rate = int(e.control.value or 0)
+        get_bandwidth_limiter().set_rate(rate)
+        logging.info(f"带宽限速：{rate // 1024} KB/s" if rate else "带宽限速：不限速")
+
+    def on_bandwidth_schedule_change(self, e):
+        """夜间不限速开关变化处理"""
+        schedule = [ScheduleRule.parse(NIGHT_UNLIMITED_START, NIGHT_UNLIMITED_END, 0)] if e.control.value else []
+        get_bandwidth_limiter().set_schedule(schedule)
+
     def on_search_change(self, e):
         """搜索内容变化处理"""
         search_text = e.control.value.lower().strip()
@@ -599,35 +739,66 @@ class DownloadUI(BaseUI):
         self.parse_button.disabled = True
         self.parse_button.text = "🔄 解析中..."
         self.page.update()
+        with self.tracks_cond:
+            self.parse_generation += 1
+            self.parse_finished = False
+            generation = self.parse_generation
 
         def parse_in_background():
             try:
-                cookies = self.cookie_manager.parse_cookie()
+                self.cookie_manager.apply_cookie()
                 playlist_id = extract_playlist_id(url)
-                playlist_info = playlist_detail(playlist_id, cookies)
-
-                if playlist_info['status'] != 200:
-                    self.parse_button.disabled = False
-                    self.parse_button.text = "🔍 解析歌单"
-                    self.show_snackbar(f"❌ 歌单解析失败：{playlist_info['msg']}", self.error_color)
-                    self.page.update()
-                    logging.error(f"歌单解析失败：{playlist_info['msg']}")
-                    return
-
-                self.tracks = playlist_info['playlist']['tracks']
-                self.filtered_tracks = self.tracks.copy()  # 初始化筛选列表
-                self.selected_songs.clear()  # 清空选择
-                self.update_song_list()
+                playlist_name = ""
+                missing = []
+                added, removed = [], []
+                first_batch = True
+
+                # 逐批接收曲目，首批到达即可浏览和下载
+                for chunk in iter_playlist_detail(playlist_id):
+                    if chunk['status'] != 200:
+                        self.parse_button.disabled = False
+                        self.parse_button.text = "🔍 解析歌单"
+                        self.show_snackbar(f"❌ 歌单解析失败：{chunk['msg']}", self.error_color)
+                        self.page.update()
+                        logging.error(f"歌单解析失败：{chunk['msg']}")
+                        return
+
+                    playlist_name = chunk['playlist']['name']
+                    total = chunk['playlist']['total']
+                    added = chunk['playlist']['added']
+                    removed = chunk['playlist']['removed']
+                    missing.extend(chunk['missing'])
+
+                    with self.tracks_cond:
+                        if first_batch:
+                            self.playlist_name = playlist_name
+                            self.tracks = []
+                        self.tracks.extend(chunk['tracks'])
+                        self.tracks_cond.notify_all()
+                    if first_batch:
+                        first_batch = False
+                        self.filtered_tracks = []
+                        self.selected_songs.clear()  # 清空选择
+                        self.song_list.controls.clear()
+                        self.download_all_button.disabled = False
+
+                    self.append_song_list(chunk['tracks'])
+                    if not self.download_core.is_downloading:
+                        self.total_progress_text.value = f"📊 总进度: 0/{len(self.tracks)}"
+                    self.parse_button.text = f"🔄 解析中 {len(self.tracks) + len(missing)}/{total}"
+                    self.update_selection_status()
 
-                self.total_progress_text.value = f"📊 总进度: 0/{len(self.tracks)}"
-                self.download_all_button.disabled = False
                 self.parse_button.disabled = False
                 self.parse_button.text = "🔍 解析歌单"
-                self.update_selection_status()
 
-                self.show_snackbar(f"✅ 成功解析歌单：{playlist_info['playlist']['name']}，共 {len(self.tracks)} 首歌曲", self.success_color)
+                if missing:
+                    self.show_snackbar(f"⚠️ 歌单 {playlist_name} 解析完成，{len(missing)} 首歌曲信息获取失败", self.warning_color)
+                elif added or removed:
+                    self.show_snackbar(f"✅ 歌单 {playlist_name} 已同步，共 {len(self.tracks)} 首歌曲（新增 {len(added)}，移除 {len(removed)}）", self.success_color)
+                else:
+                    self.show_snackbar(f"✅ 成功解析歌单：{playlist_name}，共 {len(self.tracks)} 首歌曲", self.success_color)
                 self.page.update()
-                logging.info(f"成功解析歌单：{playlist_info['playlist']['name']}，共 {len(self.tracks)} 首歌曲")
+                logging.info(f"成功解析歌单：{playlist_name}，共 {len(self.tracks)} 首歌曲")
 
             except Exception as ex:
                 self.parse_button.disabled = False
@@ -635,6 +806,11 @@ class DownloadUI(BaseUI):
                 self.show_snackbar(f"❌ 解析失败：{str(ex)}", self.error_color)
                 self.page.update()
                 logging.error(f"解析歌单失败：{str(ex)}")
+            finally:
+                with self.tracks_cond:
+                    if self.parse_generation == generation:
+                        self.parse_finished = True
+                    self.tracks_cond.notify_all()
 
         # 启动解析线程
         parse_thread = threading.Thread(target=parse_in_background, daemon=True)
@@ -647,102 +823,120 @@ class DownloadUI(BaseUI):
         tracks_to_show = self.filtered_tracks if hasattr(self, 'filtered_tracks') and self.filtered_tracks else self.tracks
 
         for i, track in enumerate(tracks_to_show):
-            # Spotify风格交替背景色
-            bg_color = self.surface_color if i % 2 == 0 else self.surface_variant_color
-
-            # Spotify风格复选框
-            checkbox = self.create_checkbox(
-                "",
-                value=track['id'] in self.selected_songs,
-                on_change=lambda e, track_id=track['id']: self.on_song_selection_change(e, track_id)
-            )
+            self.song_list.controls.append(self._create_song_row(i, track))
 
-            # Spotify风格封面图片
-            cover_image = ft.Container(
-                content=ft.Image(
-                    src=track['picUrl'] if track['picUrl'] else "https://via.placeholder.com/56x56?text=No+Image",
-                    width=56,
-                    height=56,
-                    fit=ft.ImageFit.COVER,
-                    border_radius=8
-                ),
-                width=56,
-                height=56,
-                shadow=ft.BoxShadow(
-                    spread_radius=0,
-                    blur_radius=4,
-                    color=ft.Colors.with_opacity(0.3, ft.Colors.BLACK),
-                    offset=ft.Offset(0, 2)
-                )
-            )
-
-            # Spotify风格歌曲信息
-            song_name = ft.Container(
-                content=self.create_text(
-                    track['name'],
-                    size=15,
-                    weight=ft.FontWeight.W_500,
-                    max_lines=2
-                ),
-                width=220,
-                padding=ft.padding.symmetric(horizontal=12)
-            )
+        self.page.update()
 
-            artist_name = ft.Container(
-                content=self.create_text(
-                    track['artists'],
-                    size=14,
-                    color=self.text_secondary_color,
-                    max_lines=1
-                ),
-                width=180,
-                padding=ft.padding.symmetric(horizontal=12)
-            )
+    def append_song_list(self, new_tracks: List[Dict[str, Any]]):
+        """追加一批歌曲到列表，有搜索或排序时重新筛选"""
+        search_text = self.search_input.value.lower().strip() if self.search_input.value else ""
+        if search_text or self.current_sort != "default":
+            self.filter_and_sort_tracks(search_text, self.current_sort)
+            return
 
-            album_name = ft.Container(
-                content=self.create_text(
-                    track['album'],
-                    size=14,
-                    color=self.text_secondary_color,
-                    max_lines=1
-                ),
-                width=180,
-                padding=ft.padding.symmetric(horizontal=12)
-            )
+        self.filtered_tracks.extend(new_tracks)
+        start = len(self.song_list.controls)
+        for i, track in enumerate(new_tracks, start):
+            self.song_list.controls.append(self._create_song_row(i, track))
+        self.page.update()
 
-            # 状态图标
-            status_icon = self.get_song_status_icon(track['id'])
+    def _create_song_row(self, i: int, track: Dict[str, Any]):
+        """创建单行歌曲控件"""
+        # Spotify风格交替背景色
+        bg_color = self.surface_color if i % 2 == 0 else self.surface_variant_color
 
-            # Spotify风格下载按钮
-            download_button = self.create_icon_button(
-                icon=ft.Icons.DOWNLOAD,
-                on_click=lambda e, track_data=track: self.download_single_song(track_data),
-                tooltip="下载此歌曲",
-                icon_color=self.primary_color,
-                size=44
-            )
+        # Spotify风格复选框
+        checkbox = self.create_checkbox(
+            "",
+            value=track['id'] in self.selected_songs,
+            on_change=lambda e, track_id=track['id']: self.on_song_selection_change(e, track_id)
+        )
 
-            # Spotify风格行容器
-            song_row = ft.Container(
-                content=ft.Row([
-                    ft.Container(content=checkbox, width=50),
-                    ft.Container(content=cover_image, width=70),
-                    song_name,
-                    artist_name,
-                    album_name,
-                    ft.Container(content=status_icon, width=100, alignment=ft.alignment.center),
-                    ft.Container(content=download_button, width=120, alignment=ft.alignment.center)
-                ], alignment=ft.MainAxisAlignment.START),
-                padding=ft.padding.symmetric(horizontal=20, vertical=12),
-                bgcolor=bg_color,
-                border=ft.border.only(bottom=ft.BorderSide(1, self.border_color)),
-                on_hover=lambda e, row_bg=bg_color: self.on_song_row_hover(e, row_bg),
+        # Spotify风格封面图片
+        cover_image = ft.Container(
+            content=ft.Image(
+                src=(build_cover_url(track['picUrl'], COVER_THUMBNAIL_SIZE) if track['picUrl']
+                     else "https://via.placeholder.com/56x56?text=No+Image"),
+                width=56,
+                height=56,
+                fit=ft.ImageFit.COVER,
                 border_radius=8
+            ),
+            width=56,
+            height=56,
+            shadow=ft.BoxShadow(
+                spread_radius=0,
+                blur_radius=4,
+                color=ft.Colors.with_opacity(0.3, ft.Colors.BLACK),
+                offset=ft.Offset(0, 2)
             )
+        )
 
-            self.song_list.controls.append(song_row)
+        # Spotify风格歌曲信息
+        song_name = ft.Container(
+            content=self.create_text(
+                track['name'],
+                size=15,
+                weight=ft.FontWeight.W_500,
+                max_lines=2
+            ),
+            width=220,
+            padding=ft.padding.symmetric(horizontal=12)
+        )
 
-        self.page.update()
+        artist_name = ft.Container(
+            content=self.create_text(
+                track['artists'],
+                size=14,
+                color=self.text_secondary_color,
+                max_lines=1
+            ),
+            width=180,
+            padding=ft.padding.symmetric(horizontal=12)
+        )
+
+        album_name = ft.Container(
+            content=self.create_text(
+                track['album'],
+                size=14,
+                color=self.text_secondary_color,
+                max_lines=1
+            ),
+            width=180,
+            padding=ft.padding.symmetric(horizontal=12)
+        )
+
+        # 状态图标
+        status_icon = self.get_song_status_icon(track['id'])
+
+        # Spotify风格下载按钮
+        download_button = self.create_icon_button(
+            icon=ft.Icons.DOWNLOAD,
+            on_click=lambda e, track_data=track: self.download_single_song(track_data),
+            tooltip="下载此歌曲",
+            icon_color=self.primary_color,
+            size=44
+        )
+
+        # Spotify风格行容器
+        song_row = ft.Container(
+            content=ft.Row([
+                ft.Container(content=checkbox, width=50),
+                ft.Container(content=cover_image, width=70),
+                song_name,
+                artist_name,
+                album_name,
+                ft.Container(content=status_icon, width=100, alignment=ft.alignment.center),
+                ft.Container(content=download_button, width=120, alignment=ft.alignment.center)
+            ], alignment=ft.MainAxisAlignment.START),
+            padding=ft.padding.symmetric(horizontal=20, vertical=12),
+            bgcolor=bg_color,
+            border=ft.border.only(bottom=ft.BorderSide(1, self.border_color)),
+            on_hover=lambda e, row_bg=bg_color: self.on_song_row_hover(e, row_bg),
+            border_radius=8
+        )
+
+        return song_row
 
     def get_song_status_icon(self, track_id):
         """获取歌曲状态图标"""
@@ -769,9 +963,9 @@ class DownloadUI(BaseUI):
         self.page.update()
 
     def download_single_song(self, track):
-        """下载单首歌曲"""
+        """下载单首歌曲，批量下载进行中时插队到排队任务之前"""
         if self.download_core.is_downloading:
-            self.show_snackbar("⚠️ 请等待当前下载完成", self.warning_color)
+            self._enqueue_single_song(track)
             return
 
         # 临时设置选择状态
@@ -785,6 +979,33 @@ class DownloadUI(BaseUI):
         self.selected_songs = original_selection
         self.update_selection_status()
 
+    def _enqueue_single_song(self, track):
+        """把歌曲加入正在进行的下载，优先于排队中的任务下载"""
+        pipeline = self.pipeline
+        if pipeline is None or pipeline.stopping:
+            self.show_snackbar("⚠️ 请等待当前下载完成", self.warning_color)
+            return
+
+        download_dir = os.path.join(self.download_dir, f"{self.playlist_name} (选中歌曲)")
+        ensure_directory_exists(download_dir)
+        task = DownloadTask(
+            id=str(uuid.uuid4()),
+            track=track,
+            quality=self.quality_dropdown.value,
+            download_lyrics=self.lyrics_checkbox.value,
+            download_dir=download_dir
+        )
+        get_download_journal().add_tasks(self.current_job_id, [task])
+        self.download_progress_manager.add_task(task)
+        self._create_download_task_ui([task])
+
+        if pipeline.submit(task, PRIORITY_USER):
+            self.show_snackbar(f"✅ 已优先下载：{track['name']}", self.success_color)
+        else:
+            # 提交时流水线恰好结束
+            self.download_progress_manager.update_task_status(task.id, "failed", "下载已结束，请重新下载")
+            self.show_snackbar("⚠️ 请等待当前下载完成", self.warning_color)
+
     def download_selected(self, e):
         """下载选中的歌曲"""
         if not self.selected_songs:
@@ -820,10 +1041,18 @@ class DownloadUI(BaseUI):
             logging.error(str(ex))
             return
 
-        self._start_download_process(self.tracks, is_selected_only=False)
-
-    def _start_download_process(self, tracks_to_download: List[Dict[str, Any]], is_selected_only: bool):
-        """启动下载进程"""
+        with self.tracks_cond:
+            tracks = list(self.tracks)
+            # 歌单仍在逐批解析时，之后解析到的歌曲追加到这次下载中
+            follow_parse = None if self.parse_finished else self.parse_generation
+        self._start_download_process(tracks, is_selected_only=False, follow_parse=follow_parse)
+
+    def _start_download_process(self, tracks_to_download: List[Dict[str, Any]], is_selected_only: bool,
+                                job: Optional[Dict[str, Any]] = None, follow_parse: Optional[int] = None):
+        """
+        启动下载进程，job 不为空时继续下载日志中未完成的一批任务
+        follow_parse 为下载开始时仍在进行的解析的编号，该次解析之后得到的歌曲追加到下载中
+        """
         # 更新UI状态
         self.download_selected_button.disabled = True
         self.download_all_button.disabled = True
@@ -833,66 +1062,98 @@ class DownloadUI(BaseUI):
 
         # 清空之前的下载任务
         self.download_progress_manager = DownloadProgressManager()
-        self.download_core = DownloadCore(self.download_progress_manager)
+        self.download_core = self._create_download_core()
         self.download_core.set_download_state(True, False)
         self.download_tasks_list.controls.clear()
 
         # 启动多线程下载
-        self._start_multithreaded_download(tracks_to_download, is_selected_only)
+        self._start_multithreaded_download(tracks_to_download, is_selected_only, job, follow_parse)
 
         # 启动进度更新定时器
         self._start_progress_timer()
 
-    def _start_multithreaded_download(self, tracks_to_download: List[Dict[str, Any]], is_selected_only: bool):
+    def _create_download_core(self) -> DownloadCore:
+        """按选择的下载引擎创建下载核心"""
+        if self.async_engine:
+            return AsyncDownloadCore(self.download_progress_manager)
+        return DownloadCore(self.download_progress_manager)
+
+    def _pipeline_class(self):
+        """按选择的下载引擎返回流水线类型"""
+        return AsyncDownloadPipeline if self.async_engine else DownloadPipeline
+
+    def _start_multithreaded_download(self, tracks_to_download: List[Dict[str, Any]], is_selected_only: bool,
+                                      job: Optional[Dict[str, Any]] = None, follow_parse: Optional[int] = None):
         """启动多线程下载"""
+        def create_tasks(tracks: List[Dict[str, Any]], download_dir: str) -> List[DownloadTask]:
+            return [
+                DownloadTask(
+                    id=str(uuid.uuid4()),
+                    track=track,
+                    quality=self.quality_dropdown.value,
+                    download_lyrics=self.lyrics_checkbox.value,
+                    download_dir=download_dir
+                )
+                for track in tracks
+            ]
+
         def download_worker():
+            pipeline = None
             try:
-                # 获取歌单信息
-                cookies = self.cookie_manager.parse_cookie()
-                playlist_id = extract_playlist_id(self.url_input.value.strip())
-                playlist_info = playlist_detail(playlist_id, cookies)
-
-                if playlist_info['status'] != 200:
-                    self.show_snackbar(f"❌ 歌单解析失败：{playlist_info['msg']}", self.error_color)
-                    return
+                self.cookie_manager.apply_cookie()
+                journal = get_download_journal()
+
+                if job:
+                    # 从日志恢复任务，已完成的保持完成状态
+                    job_id = job['id']
+                    playlist_name = job['name']
+                    tasks = journal.load_tasks(job_id)
+                    for download_dir in {task.download_dir for task in tasks}:
+                        ensure_directory_exists(download_dir)
+                else:
+                    # 使用解析时保存的歌单名称，无需再次请求歌单详情
+                    job_id = str(uuid.uuid4())
+                    playlist_name = self.playlist_name
+                    if is_selected_only:
+                        playlist_name += " (选中歌曲)"
+
+                    download_dir = os.path.join(self.download_dir, playlist_name)
+                    ensure_directory_exists(download_dir)
+
+                    # 创建下载任务
+                    tasks = create_tasks(tracks_to_download, download_dir)
+                    journal.create_job(job_id, playlist_name, tasks)
 
-                playlist_name = playlist_info['playlist']['name']
-                if is_selected_only:
-                    playlist_name += " (选中歌曲)"
-
-                download_dir = os.path.join(self.download_dir, playlist_name)
-                ensure_directory_exists(download_dir)
-
-                # 创建下载任务
-                tasks = []
-                for track in tracks_to_download:
-                    task = DownloadTask(
-                        id=str(uuid.uuid4()),
-                        track=track,
-                        quality=self.quality_dropdown.value,
-                        download_lyrics=self.lyrics_checkbox.value,
-                        download_dir=download_dir
-                    )
-                    tasks.append(task)
+                for task in tasks:
                     self.download_progress_manager.add_task(task)
+                self.download_progress_manager.attach_journal(journal, job_id)
+                self.current_job_id = job_id
 
                 # 创建任务UI
                 self._create_download_task_ui(tasks)
 
-                # 使用线程池执行下载
-                self.thread_pool = ThreadPoolExecutor(max_workers=self.max_concurrent_downloads)
-                self.download_futures = []
-
-                for task in tasks:
-                    if not self.download_core.is_downloading:
-                        break
-                    future = self.thread_pool.submit(self.download_core.download_single_task, task, cookies)
-                    self.download_futures.append(future)
-
-                # 等待所有任务完成
-                for future in as_completed(self.download_futures):
-                    if not self.download_core.is_downloading:
-                        break
+                pending_tasks = [task for task in tasks if task.status != "completed"]
+
+                # 解析、传输、后处理分阶段执行，并发下载数即传输线程数；取消后剩余任务会很快排空
+                pipeline = self._pipeline_class()(self.download_core,
+                                                  transfer_workers=self.max_concurrent_downloads,
+                                                  shortest_first=self.shortest_first_checkbox.value)
+                self.pipeline = pipeline
+                # 后台按调度顺序预取即将开始任务的下载链接，工作线程切换歌曲时无需等待接口
+                pipeline.start_url_prefetch()
+                if self.auto_concurrency:
+                    pipeline.set_auto_concurrency(True, self._on_auto_concurrency_update)
+                if follow_parse is None:
+                    pipeline.run(pending_tasks)
+                else:
+                    # 解析完成前流水线保持打开，之后解析到的歌曲继续提交
+                    pipeline.start()
+                    for task in pending_tasks:
+                        pipeline.submit(task, PRIORITY_NORMAL)
+                    self._follow_parse(pipeline, follow_parse, len(tracks_to_download), job_id,
+                                       lambda tracks: create_tasks(tracks, download_dir))
+                    pipeline.close()
+                    pipeline.join()
 
                 # 下载完成处理
                 if self.download_core.is_downloading and not self.download_core.is_paused:
@@ -902,12 +1163,43 @@ class DownloadUI(BaseUI):
                 self.show_snackbar(f"❌ 下载失败：{str(ex)}", self.error_color)
                 logging.error(f"下载失败：{str(ex)}")
             finally:
-                self._cleanup_download()
+                if pipeline is not None:
+                    self._cleanup_download(pipeline)
 
         # 启动下载线程
         download_thread = threading.Thread(target=download_worker, daemon=True)
         download_thread.start()
 
+    def _follow_parse(self, pipeline: DownloadPipeline, generation: int, start: int, job_id: str, create_tasks):
+        """
+        把第 generation 次解析中 start 之后得到的歌曲追加到下载中，直到解析结束、重新解析或下载取消
+        create_tasks 把曲目转换为下载任务
+        """
+        seen = start
+        while True:
+            with self.tracks_cond:
+                self.tracks_cond.wait_for(
+                    lambda: (len(self.tracks) > seen or self.parse_finished or self.parse_generation != generation
+                             or not self.download_core.is_downloading),
+                    timeout=1.0
+                )
+                if self.parse_generation != generation or not self.download_core.is_downloading:
+                    return
+                tracks = self.tracks[seen:]
+                seen = len(self.tracks)
+                finished = self.parse_finished
+
+            if tracks:
+                tasks = create_tasks(tracks)
+                get_download_journal().add_tasks(job_id, tasks)
+                for task in tasks:
+                    self.download_progress_manager.add_task(task)
+                self._create_download_task_ui(tasks)
+                for task in tasks:
+                    pipeline.submit(task, PRIORITY_NORMAL)
+            if finished:
+                return
+
     def _create_download_task_ui(self, tasks: List[DownloadTask]):
         """创建下载任务UI"""
         for task in tasks:
@@ -940,7 +1232,8 @@ class DownloadUI(BaseUI):
                 # 封面图片
                 ft.Container(
                     content=ft.Image(
-                        src=track['picUrl'] if track['picUrl'] else "https://via.placeholder.com/50x50?text=No+Image",
+                        src=(build_cover_url(track['picUrl'], COVER_THUMBNAIL_SIZE) if track['picUrl']
+                             else "https://via.placeholder.com/50x50?text=No+Image"),
                         width=50,
                         height=50,
                         fit=ft.ImageFit.COVER,
@@ -1000,7 +1293,8 @@ class DownloadUI(BaseUI):
 
             # 更新总进度
             self.total_progress.value = overall_progress
-            self.total_progress_text.value = f"📊 总进度: {completed}/{len(self.tracks)} (失败: {failed})"
+            total = len(self.download_progress_manager.get_all_tasks())
+            self.total_progress_text.value = f"📊 总进度: {completed}/{total} (失败: {failed})"
             self.speed_text.value = f"🚀 总速度: {total_speed:.1f} KB/s"
             self.status_text.value = f"📋 状态: 下载中 ({downloading} 个活跃任务)"
 
@@ -1038,6 +1332,12 @@ class DownloadUI(BaseUI):
                     speed_text.value = f"{task.speed:.1f} KB/s"
                     speed_text.color = self.primary_color
                     progress_bar.value = task.progress
+                elif task.status == "paused":
+                    status_icon.name = ft.Icons.PAUSE_CIRCLE
+                    status_icon.color = self.warning_color
+                    speed_text.value = "已暂停"
+                    speed_text.color = self.warning_color
+                    progress_bar.value = task.progress
                 elif task.status == "completed":
                     status_icon.name = ft.Icons.CHECK_CIRCLE
                     status_icon.color = self.success_color
@@ -1073,6 +1373,7 @@ class DownloadUI(BaseUI):
         """取消下载"""
         self.download_core.set_download_state(False, False)
         self._cleanup_download()
+        self._finish_current_job()
 
         # 重置UI状态
         self.download_all_button.disabled = len(self.tracks) == 0
@@ -1095,24 +1396,26 @@ class DownloadUI(BaseUI):
         self.show_snackbar("❌ 下载已取消", self.warning_color)
         logging.info("下载已取消")
 
-    def _cleanup_download(self):
-        """清理下载资源"""
-        try:
-            if self.thread_pool:
-                self.thread_pool.shutdown(wait=False)
-                self.thread_pool = None
-
-            # 取消所有未完成的futures
-            for future in self.download_futures:
-                future.cancel()
-            self.download_futures.clear()
-
-        except Exception as e:
-            logging.error(f"清理下载资源失败：{str(e)}")
+    def _cleanup_download(self, pipeline: Optional[DownloadPipeline] = None):
+        """
+        清理下载资源
+        pipeline 为结束的下载线程所用的流水线；取消后立即开始新一批下载时，
+        旧线程可能晚于新流水线创建才退出，此时不能清除新一批的流水线
+        """
+        # 流水线线程在会话取消后自行退出，这里只释放引用
+        if pipeline is None or self.pipeline is pipeline:
+            self.pipeline = None
+
+    def _finish_current_job(self):
+        """整批下载结束，从下载任务日志中移除"""
+        if self.current_job_id:
+            get_download_journal().finish_job(self.current_job_id)
+            self.current_job_id = ""
 
     def _on_download_complete(self, playlist_name: str):
         """下载完成处理"""
         self.download_core.set_download_state(False, False)
+        self._finish_current_job()
 
         # 获取最终统计
         _, _, completed, failed, _ = self.download_progress_manager.get_overall_progress()
@@ -1137,3 +1440,6 @@ class DownloadUI(BaseUI):
             self.show_snackbar(f"⚠️ 歌单 {playlist_name} 下载完成，{failed} 首歌曲失败", self.warning_color)
 
         logging.info(f"歌单 {playlist_name} 下载完成，成功: {completed}, 失败: {failed}")
+        cover_stats = get_cover_cache().stats()
+        logging.info(f"封面缓存：命中 {cover_stats['hits']}，磁盘命中 {cover_stats['disk_hits']}，"
+                     f"未命中 {cover_stats['misses']}，命中率 {cover_stats['hit_rate']:.0%}")
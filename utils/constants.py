@@ -37,6 +37,24 @@ SORT_OPTIONS = [
     ("album", "按专辑")
 ]
 
+# 带宽限速选项（字节/秒，"0" 表示不限速）
+BANDWIDTH_OPTIONS = [
+    ("0", "不限速"),
+    (str(512 * 1024), "512 KB/s"),
+    (str(1024 * 1024), "1 MB/s"),
+    (str(2 * 1024 * 1024), "2 MB/s"),
+    (str(5 * 1024 * 1024), "5 MB/s"),
+    (str(10 * 1024 * 1024), "10 MB/s"),
+    (str(20 * 1024 * 1024), "20 MB/s")
+]
+
+# 夜间不限速时段
+NIGHT_UNLIMITED_START = "23:00"
+NIGHT_UNLIMITED_END = "07:00"
+
+# 列表封面缩略图的请求边长（显示尺寸的两倍，高分屏下保持清晰）
+COVER_THUMBNAIL_SIZE = 112
+
 # 文件名无效字符
 INVALID_FILENAME_CHARS = '<>:"/\\|?*'
 
@@ -2,10 +2,17 @@
 文件处理工具函数
 """
 import os
+from typing import Optional, Tuple
+from urllib.parse import parse_qsl, urlencode, urlsplit, urlunsplit
 
 # 文件名无效字符 - 直接定义避免循环导入
 INVALID_FILENAME_CHARS = '<>:"/\\|?*'
 
+# 返回 MP3 的音质，其余音质（无损、Hi-Res、环绕声、母带）返回 FLAC
+MP3_QUALITIES = {'standard', 'higher', 'exhigh'}
+# 下载链接返回的文件类型对应的扩展名
+AUDIO_EXTENSIONS = {'mp3': '.mp3', 'flac': '.flac'}
+
 
 def clean_filename(filename: str) -> str:
     """清理文件名中的无效字符"""
@@ -22,21 +29,37 @@ def extract_playlist_id(url: str) -> str:
     return url
 
 
+def build_cover_url(cover_url: str, size: int) -> str:
+    """为封面链接加上 CDN 的缩放参数 param=宽y高，只下载所需尺寸的图片"""
+    if not cover_url:
+        return cover_url
+    parts = urlsplit(cover_url)
+    query = [(key, value) for key, value in parse_qsl(parts.query) if key != 'param']
+    query.append(('param', f"{size}y{size}"))
+    return urlunsplit(parts._replace(query=urlencode(query)))
+
+
 def ensure_directory_exists(directory: str):
     """确保目录存在"""
     os.makedirs(directory, exist_ok=True)
 
 
-def get_file_extension(quality: str) -> str:
-    """根据音质获取文件扩展名"""
-    return '.flac' if quality == 'lossless' else '.mp3'
+def get_file_extension(quality: str, audio_type: str = '') -> str:
+    """
+    获取文件扩展名：优先使用下载链接返回的文件类型，未知时按音质推测（标准和极高音质为 MP3，其余为 FLAC）
+    实际格式以下载数据开头的标识为准，见 core.inline_tags.detect_audio_extension
+    """
+    audio_type = (audio_type or '').lower()
+    if audio_type in AUDIO_EXTENSIONS:
+        return AUDIO_EXTENSIONS[audio_type]
+    return '.mp3' if quality in MP3_QUALITIES else '.flac'
 
 
-def build_file_path(download_dir: str, song_name: str, artists: str, quality: str) -> str:
-    """构建文件路径"""
+def build_file_path(download_dir: str, song_name: str, artists: str, quality: str, audio_type: str = '') -> str:
+    """构建文件路径，audio_type 为下载链接返回的文件类型"""
     clean_song_name = clean_filename(song_name)
     clean_artists = clean_filename(artists)
-    file_extension = get_file_extension(quality)
+    file_extension = get_file_extension(quality, audio_type)
     return os.path.join(download_dir, f"{clean_song_name} - {clean_artists}{file_extension}")
 
 
@@ -45,3 +68,24 @@ def build_lyric_path(download_dir: str, song_name: str, artists: str) -> str:
     clean_song_name = clean_filename(song_name)
     clean_artists = clean_filename(artists)
     return os.path.join(download_dir, f"{clean_song_name} - {clean_artists}.lrc")
+
+
+def build_part_path(file_path: str) -> str:
+    """构建下载中的临时文件路径，下载完成后再重命名为正式文件"""
+    return f"{file_path}.part"
+
+
+def parse_content_range(content_range: str) -> Tuple[Optional[int], Optional[int], Optional[int]]:
+    """
+    解析 Content-Range 响应头
+    返回: (起始位置, 结束位置, 文件总大小)，未知部分为 None
+    """
+    try:
+        unit_range, total = content_range.split(' ', 1)[1].split('/')
+        total_size = None if total == '*' else int(total)
+        if unit_range == '*':
+            return None, None, total_size
+        start, end = unit_range.split('-')
+        return int(start), int(end), total_size
+    except (AttributeError, IndexError, ValueError):
+        return None, None, None